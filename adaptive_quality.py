@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Adaptive Per-client Quality
+
+A small ladder of JPEG variants (quality and resolution). Each frame is
+encoded once per rung that at least one client currently needs (see
+simulcast.VariantEncoder), and every client gets the rung its connection
+can carry.
+
+RungController watches how long each send takes to drain and how often the
+client's queue overflows, steps down quickly when the client falls behind,
+and steps back up slowly once sends are comfortably faster than the frame
+interval. A step up that has to be undone soon after doubles the wait
+before the next attempt, so a link sitting between two rungs does not
+flap. A client on LTE gets smaller frames at a steady frame rate without
+slowing LAN clients.
+"""
+
+
+class QualityRung:
+    def __init__(self, name, quality, scale):
+        """
+        quality: JPEG quality
+        scale: fraction of the source resolution
+        """
+        self.name = name
+        self.quality = quality
+        self.scale = scale
+
+    def resolution(self, width, height):
+        """Output size for a source size (even dimensions)"""
+        return max(2, int(width * self.scale) // 2 * 2), max(2, int(height * self.scale) // 2 * 2)
+
+
+# Best first
+DEFAULT_LADDER = [
+    QualityRung("high", 85, 1.0),
+    QualityRung("medium", 70, 0.75),
+    QualityRung("low", 55, 0.5),
+    QualityRung("minimal", 45, 0.33),
+]
+
+
+class RungController:
+    """Chooses a client's rung from send drain time and queue overflows"""
+
+    def __init__(self, rungs, frame_interval=1 / 30, down_ratio=0.8, up_ratio=0.35,
+                 up_after=45, settle=10):
+        """
+        rungs: number of rungs in the ladder
+        frame_interval: seconds between frames; sends are judged against it
+        down_ratio: step down when sends average more than this share of the interval
+        up_ratio: sends faster than this share of the interval count as headroom
+        up_after: consecutive headroom frames before stepping up (doubles after a failed step up)
+        settle: frames to ignore after a change, while the new size takes effect
+        """
+        self.rungs = rungs
+        self.frame_interval = frame_interval
+        self.down_ratio = down_ratio
+        self.up_ratio = up_ratio
+        self.up_after = up_after
+        self.settle = settle
+        self.rung = 0
+        self.send_time = None  # Moving average of seconds per send
+        self.headroom = 0
+        self.cooldown = 0
+        self.changes = 0
+        self.probe_wait = up_after  # Headroom needed for the next step up
+        self.since_up = None        # Frames since the last step up
+
+    def sent(self, seconds):
+        """Record how long one send took to drain"""
+        if self.since_up is not None:
+            self.since_up += 1
+            if self.since_up > 4 * self.probe_wait:
+                # The last step up held: probe at the normal pace again
+                self.probe_wait = self.up_after
+                self.since_up = None
+        if self.send_time is None:
+            self.send_time = seconds
+        else:
+            self.send_time += 0.2 * (seconds - self.send_time)
+        if self.cooldown:
+            self.cooldown -= 1
+            return
+        if self.send_time > self.down_ratio * self.frame_interval:
+            self._step(1)
+        elif self.send_time < self.up_ratio * self.frame_interval:
+            self.headroom += 1
+            if self.headroom >= self.probe_wait:
+                self._step(-1)
+        else:
+            self.headroom = 0
+
+    def dropped(self):
+        """A queued frame was displaced: the client is not keeping up"""
+        if not self.cooldown:
+            self._step(1)
+
+    def _step(self, direction):
+        rung = min(max(self.rung + direction, 0), self.rungs - 1)
+        self.headroom = 0
+        if rung != self.rung:
+            if direction > 0 and self.since_up is not None:
+                # Stepped up too early: wait longer before trying again
+                self.probe_wait = min(self.probe_wait * 2, 16 * self.up_after)
+            self.since_up = 0 if direction < 0 else None
+            self.rung = rung
+            self.cooldown = self.settle
+            self.send_time = None
+            self.changes += 1
+
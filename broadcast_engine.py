@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Concurrent Broadcast Engine
+
+Fans a single pre-serialized payload out to many WebSocket connections at
+once. Every send gets its own timeout, so one slow peer can no longer delay
+delivery to the rest of the room, and per-recipient latency is reported back
+to the caller.
+"""
+
+import asyncio
+import time
+import logging
+from websockets.exceptions import ConnectionClosed
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastReport:
+    """Outcome of a single broadcast"""
+
+    def __init__(self):
+        self.latencies = {}      # websocket -> seconds until send completed
+        self.timed_out = []      # websockets that did not finish within the timeout
+        self.failed = []         # websockets whose connection is gone
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    @property
+    def delivered(self):
+        return len(self.latencies)
+
+    @property
+    def fastest(self):
+        return min(self.latencies.values()) if self.latencies else None
+
+    @property
+    def slowest(self):
+        return max(self.latencies.values()) if self.latencies else None
+
+    def summary(self):
+        """Short human-readable summary for logging"""
+        if not self.latencies:
+            return f"0 delivered, {len(self.timed_out)} timed out, {len(self.failed)} failed"
+        return (f"{self.delivered} delivered in {self.elapsed * 1000:.1f}ms "
+                f"(fastest {self.fastest * 1000:.1f}ms, slowest {self.slowest * 1000:.1f}ms), "
+                f"{len(self.timed_out)} timed out, {len(self.failed)} failed")
+
+
+class BroadcastEngine:
+    def __init__(self, send_timeout=5.0):
+        self.send_timeout = send_timeout
+
+    async def _send_one(self, websocket, payload, report):
+        """Send to one recipient and record how long it took"""
+        start = time.monotonic()
+        try:
+            if self.send_timeout:
+                await asyncio.wait_for(websocket.send(payload), self.send_timeout)
+            else:
+                await websocket.send(payload)
+            report.latencies[websocket] = time.monotonic() - start
+        except asyncio.TimeoutError:
+            report.timed_out.append(websocket)
+        except ConnectionClosed:
+            report.failed.append(websocket)
+        except Exception as e:
+            logger.error(f"Error sending message to user: {e}")
+            report.failed.append(websocket)
+
+    async def send(self, recipients, payload):
+        """Send an already serialized payload to all recipients concurrently"""
+        return await self.send_batches([(recipients, payload)])
+
+    async def send_batches(self, batches):
+        """Send several (recipients, payload) groups concurrently, e.g. one per wire codec"""
+        report = BroadcastReport()
+        sends = [(ws, payload) for recipients, payload in batches for ws in recipients]
+        if len(sends) == 1:
+            await self._send_one(sends[0][0], sends[0][1], report)
+        elif sends:
+            await asyncio.gather(*(self._send_one(ws, payload, report) for ws, payload in sends))
+        report.elapsed = time.monotonic() - report.started
+        return report
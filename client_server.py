@@ -6,11 +6,33 @@ Serves the sample client HTML file for testing P2P connections.
 This allows you to easily test connections from different devices/browsers.
 """
 
-from flask import Flask, send_file
+from flask import Flask, Response, g, request, send_file
 import os
+import time
+from metrics import REGISTRY
 
 app = Flask(__name__)
 
+REQUESTS = REGISTRY.counter('http_requests', "HTTP requests served, by route and status", ('route', 'status'))
+REQUEST_SECONDS = REGISTRY.histogram('http_request_seconds', "Time to serve an HTTP request")
+
+@app.before_request
+def start_timer():
+    g.request_start = time.monotonic()
+
+@app.after_request
+def record_request(response):
+    # The matched rule, not the raw path, so unknown URLs share one series
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    REQUESTS.labels(route, str(response.status_code)).inc()
+    REQUEST_SECONDS.observe(time.monotonic() - g.get('request_start', time.monotonic()))
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/')
 def client():
     """Serve the test info page as default"""
@@ -134,6 +156,7 @@ if __name__ == '__main__':
     print("📱 Mobile Client: http://localhost:5001/mobile")
     print("🐛 Debug Client: http://localhost:5001/debug")
     print("📋 Test Instructions: http://localhost:5001/test")
+    print("📈 Metrics: http://localhost:5001/metrics")
     print("🔧 Press Ctrl+C to stop")
     
     app.run(debug=True, host='0.0.0.0', port=5001)
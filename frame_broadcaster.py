@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Multi-consumer Frame Broadcaster
+
+Shared by the OAK camera, raw frame and video file bridges. Each frame is
+encoded once by the producer and handed to every client through a small
+bounded queue that a dedicated sender task drains. When a client falls
+behind, its oldest queued frame is dropped (latest frame wins), so a
+congested client never stalls the producer or the other viewers.
+
+Compressed video packets depend on the frames before them. Those are
+published with keyframe=False, and a client that loses one skips ahead to
+the next keyframe instead of receiving a stream it cannot decode.
+
+Frames can also be published as variants keyed by (layer, rung): the
+client's simulcast layer subscription (see simulcast.py) and the quality
+rung its controller picked from send drain times and queue overflows (see
+adaptive_quality.py).
+
+Frames carry an optional FrameTiming: the broadcaster stamps when they
+are published and when each client's send completes, feeding a
+LatencyTracker, and appends a timing trailer for clients that asked for
+one (see frame_timing.py).
+
+A frame may be a list of buffers (e.g. a header and a memoryview of the
+pixels): they go out as fragments of one WebSocket message, so producers
+never have to concatenate them.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+import websockets
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+FRAMES_PUBLISHED = REGISTRY.counter('bridge_frames_published', "Frames handed to the client queues")
+FRAMES_SENT = REGISTRY.counter('bridge_frames_sent', "Frames sent to clients")
+FRAMES_DROPPED = REGISTRY.counter('bridge_frames_dropped', "Frames dropped for clients that fell behind")
+CLIENT_BYTES_SENT = REGISTRY.counter('bridge_client_bytes_sent', "Bytes sent to each connected client", ('client',))
+
+
+def client_label(websocket):
+    """host:port of a client, for per-client metrics"""
+    address = websocket.remote_address
+    return f"{address[0]}:{address[1]}" if address else "unknown"
+
+
+def frame_size(frame):
+    """Bytes in a frame, or in all parts of a fragmented one"""
+    if isinstance(frame, (list, tuple)):
+        return sum(memoryview(part).nbytes for part in frame)
+    return memoryview(frame).nbytes
+
+
+class ClientChannel:
+    """Per-client frame queue and delivery counters"""
+
+    def __init__(self, websocket, queue_size, controller=None, layer=None):
+        self.websocket = websocket
+        self.controller = controller  # Optional RungController
+        self.layer = layer            # Simulcast layer, None for the source resolution
+        self.queue = deque(maxlen=queue_size)
+        self.ready = asyncio.Event()
+        self.task = None
+        self.timing_trailer = False  # Append a FrameTiming trailer to every frame
+        self.awaiting_keyframe = True
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.bytes_sent = 0
+        self.client_label = client_label(websocket)
+        self.bytes_metric = CLIENT_BYTES_SENT.labels(self.client_label)
+
+    def offer(self, frame, keyframe=True, timing=None):
+        """Queue a frame, displacing the oldest one if the client is behind"""
+        if self.awaiting_keyframe:
+            if not keyframe:
+                self.frames_dropped += 1
+                FRAMES_DROPPED.inc()
+                return
+            self.awaiting_keyframe = False
+        if len(self.queue) == self.queue.maxlen:
+            if not keyframe:
+                # Dropping part of a predicted run breaks the chain: resync on the next keyframe
+                self.frames_dropped += len(self.queue) + 1
+                FRAMES_DROPPED.inc(len(self.queue) + 1)
+                self.queue.clear()
+                self.awaiting_keyframe = True
+                return
+            # The oldest queued frame goes; if any queued frame is predicted, its reference may be
+            # the one going, so the whole run goes and the client restarts from this keyframe
+            dropped = len(self.queue) if any(not queued[2] for queued in self.queue) else 1
+            if dropped > 1:
+                self.queue.clear()
+            self.frames_dropped += dropped
+            FRAMES_DROPPED.inc(dropped)
+            if self.controller:
+                self.controller.dropped()
+        self.queue.append((frame, timing, keyframe))
+        self.ready.set()
+
+    @property
+    def variant(self):
+        """(layer, rung) this client should receive"""
+        return self.layer, self.controller.rung if self.controller else 0
+
+
+class FrameBroadcaster:
+    def __init__(self, queue_size=1, on_disconnect=None, controller_factory=None, latency=None):
+        """
+        queue_size: frames buffered per client before the oldest is dropped
+        on_disconnect: optional callable(websocket) when a client's send fails
+        controller_factory: optional callable() -> per-client RungController
+        latency: optional LatencyTracker fed with the timing of published frames
+        """
+        self.queue_size = queue_size
+        self.on_disconnect = on_disconnect
+        self.controller_factory = controller_factory
+        self.latency = latency
+        self.channels = {}
+        self.frames_published = 0
+
+    def add_client(self, websocket):
+        """Start delivering frames to a client"""
+        if websocket in self.channels:
+            return
+        controller = self.controller_factory() if self.controller_factory else None
+        channel = ClientChannel(websocket, self.queue_size, controller)
+        channel.task = asyncio.create_task(self._sender(channel))
+        self.channels[websocket] = channel
+
+    def remove_client(self, websocket):
+        """Stop delivering frames to a client"""
+        channel = self.channels.pop(websocket, None)
+        if channel:
+            CLIENT_BYTES_SENT.remove(channel.client_label)
+        if channel and channel.task and channel.task is not asyncio.current_task():
+            channel.task.cancel()
+        return channel
+
+    def publish(self, frame, keyframe=True, timing=None):
+        """Hand an encoded frame to every client without waiting for any send
+
+        keyframe: False for frames that can only be decoded after the ones before them
+        timing: optional FrameTiming of the frame
+        """
+        self._stamp(timing)
+        for channel in self.channels.values():
+            channel.offer(frame, keyframe, timing)
+
+    def publish_variants(self, variants, keyframe=True, timing=None):
+        """Hand each client the variant of a frame for its layer and rung
+
+        variants: {(layer, rung): encoded frame}
+        """
+        self._stamp(timing)
+        for channel in self.channels.values():
+            layer, rung = channel.variant
+            frame = variants.get((layer, rung))
+            if frame is None:
+                # Encoded before the client changed rung: use the closest rung of its layer
+                rungs = [index for variant_layer, index in variants if variant_layer == layer]
+                if not rungs:
+                    continue  # Layer not encoded yet: it is in the next frames
+                frame = variants[(layer, min(rungs, key=lambda index: abs(index - rung)))]
+            channel.offer(frame, keyframe, timing)
+
+    def _stamp(self, timing):
+        self.frames_published += 1
+        FRAMES_PUBLISHED.inc()
+        if timing is not None:
+            timing.published = time.monotonic()
+            if self.latency:
+                self.latency.published(timing)
+
+    def set_timing_trailer(self, websocket, enabled):
+        """Turn a client's per-frame timing trailer on or off"""
+        channel = self.channels.get(websocket)
+        if channel:
+            channel.timing_trailer = enabled
+
+    def subscribe(self, websocket, layer):
+        """Switch a client to another simulcast layer (None for the source resolution)"""
+        channel = self.channels.get(websocket)
+        if channel:
+            channel.layer = layer
+
+    def active_variants(self):
+        """(layer, rung) variants some client currently needs"""
+        return {channel.variant for channel in self.channels.values()} or {(None, 0)}
+
+    @property
+    def client_count(self):
+        return len(self.channels)
+
+    def stats(self):
+        """Per-client delivery counters"""
+        return {
+            channel.websocket.remote_address: {
+                'sent': channel.frames_sent,
+                'dropped': channel.frames_dropped,
+                'bytes': channel.bytes_sent,
+                'queued': len(channel.queue),
+                'layer': channel.layer,
+                'rung': channel.controller.rung if channel.controller else 0
+            }
+            for channel in self.channels.values()
+        }
+
+    async def close(self):
+        """Stop every sender task"""
+        for websocket in list(self.channels):
+            self.remove_client(websocket)
+
+    async def _sender(self, channel):
+        websocket = channel.websocket
+        try:
+            while True:
+                await channel.ready.wait()
+                while channel.queue:
+                    frame, timing, _ = channel.queue.popleft()
+                    start = time.monotonic()
+                    if channel.timing_trailer and timing is not None:
+                        # Sent as one more fragment: the frame itself is not copied
+                        trailer = timing.trailer(start)
+                        frame = [*frame, trailer] if isinstance(frame, (list, tuple)) else [frame, trailer]
+                    await websocket.send(frame)
+                    end = time.monotonic()
+                    if channel.controller:
+                        channel.controller.sent(end - start)
+                    if timing is not None and self.latency:
+                        self.latency.sent(timing, start, end)
+                    size = frame_size(frame)
+                    channel.frames_sent += 1
+                    channel.bytes_sent += size
+                    channel.bytes_metric.inc(size)
+                    FRAMES_SENT.inc()
+                channel.ready.clear()
+        except asyncio.CancelledError:
+            pass
+        except websockets.exceptions.ConnectionClosed:
+            self._drop(websocket)
+        except Exception as e:
+            logger.warning(f"⚠️ Error sending frame to client: {e}")
+            self._drop(websocket)
+
+    def _drop(self, websocket):
+        self.remove_client(websocket)
+        if self.on_disconnect:
+            self.on_disconnect(websocket)
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Encoded Frame Cache
+
+Looping file playback decodes and JPEG-encodes the same frames on every pass.
+The video file bridge records the encoded frames of the first complete loop
+here, keyed by (file, mtime, quality, resolution), and plays every later loop
+and every later stream of that file straight from the cache.
+
+Two modes:
+- memory: clips are kept in RAM under a byte budget, least recently used
+  clips are evicted first (across all files)
+- disk: clips are written to a cache directory (one file per clip, same byte
+  budget and LRU order) and read back frame by frame, so they survive
+  restarts and are shared by bridges on the same host
+"""
+
+import hashlib
+import logging
+import os
+import struct
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+CLIP_MAGIC = b'WFC1'
+CLIP_SUFFIX = '.frames'
+FOOTER = struct.Struct('<I4s')  # frame count, magic
+
+
+class MemoryClip:
+    """Encoded frames held in RAM"""
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.nbytes = sum(len(frame) for frame in frames)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def frame(self, index):
+        return self.frames[index]
+
+    def close(self):
+        pass
+
+
+class DiskClip:
+    """Encoded frames read back from a cache file
+
+    Layout: the frame payloads back to back, then one uint32 length per
+    frame, then the frame count and magic.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        try:
+            self.file.seek(-FOOTER.size, os.SEEK_END)
+            count, magic = FOOTER.unpack(self.file.read(FOOTER.size))
+            if magic != CLIP_MAGIC:
+                raise ValueError(f"Not a frame cache file: {path}")
+            self.file.seek(-FOOTER.size - 4 * count, os.SEEK_END)
+            lengths = struct.unpack(f'<{count}I', self.file.read(4 * count))
+        except Exception:
+            self.file.close()
+            raise
+        self.offsets = []
+        offset = 0
+        for length in lengths:
+            self.offsets.append((offset, length))
+            offset += length
+        self.nbytes = offset
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def frame(self, index):
+        offset, length = self.offsets[index]
+        self.file.seek(offset)
+        return self.file.read(length)
+
+    def close(self):
+        self.file.close()
+
+
+class FrameRecorder:
+    """Collects the encoded frames of one loop and stores them when complete"""
+
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.key = key
+        self.count = 0
+        self.nbytes = 0
+        self.frames = []
+        self.lengths = []
+        self.file = None
+        self.temp_path = None
+        if cache.directory:
+            self.temp_path = f"{cache.clip_path(key)}.{os.getpid()}.tmp"
+            self.file = open(self.temp_path, 'wb')
+
+    def __len__(self):
+        return self.count
+
+    def add(self, frame):
+        """Record the next frame; returns False once the clip outgrows the budget"""
+        if self.nbytes + len(frame) > self.cache.max_bytes:
+            logger.info("💾 Clip is larger than the frame cache budget, not caching it")
+            self.abort()
+            return False
+        if self.file:
+            self.file.write(frame)
+            self.lengths.append(len(frame))
+        else:
+            self.frames.append(frame)
+        self.count += 1
+        self.nbytes += len(frame)
+        return True
+
+    def finish(self):
+        """Store the recorded loop; returns the cached clip"""
+        if self.file:
+            self.file.write(struct.pack(f'<{len(self.lengths)}I', *self.lengths))
+            self.file.write(FOOTER.pack(len(self.lengths), CLIP_MAGIC))
+            self.file.close()
+            self.file = None
+            os.replace(self.temp_path, self.cache.clip_path(self.key))
+            self.temp_path = None
+        else:
+            self.cache.put(self.key, self.frames)
+            self.frames = []
+        self.cache.evict()
+        return self.cache.get(self.key)
+
+    def abort(self):
+        """Throw away a partial recording"""
+        self.frames = []
+        self.lengths = []
+        if self.file:
+            self.file.close()
+            self.file = None
+        if self.temp_path:
+            try:
+                os.remove(self.temp_path)
+            except OSError:
+                pass
+            self.temp_path = None
+
+
+class FrameCache:
+    def __init__(self, max_bytes=256 * 1024 * 1024, directory=None):
+        """
+        max_bytes: budget for all cached clips together
+        directory: store clips on disk here instead of in memory
+        """
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.clips = OrderedDict()  # memory mode: key -> MemoryClip, oldest use first
+        self.hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @property
+    def mode(self):
+        return 'disk' if self.directory else 'memory'
+
+    @staticmethod
+    def make_key(path, quality, resolution):
+        """Cache key for a file's encoded frames; None if the file cannot be stat'ed"""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        return (os.path.abspath(path), mtime, quality, tuple(resolution))
+
+    def clip_path(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:20]
+        return os.path.join(self.directory, digest + CLIP_SUFFIX)
+
+    def get(self, key):
+        """Cached clip for a key, or None"""
+        if key is None:
+            return None
+        if self.directory:
+            path = self.clip_path(key)
+            try:
+                clip = DiskClip(path)
+                os.utime(path)  # Mark as recently used for eviction
+            except (OSError, ValueError, struct.error):
+                clip = None
+        else:
+            clip = self.clips.get(key)
+            if clip is not None:
+                self.clips.move_to_end(key)
+        if clip is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return clip
+
+    def put(self, key, frames):
+        """Store a list of encoded frames (memory mode)"""
+        clip = MemoryClip(frames)
+        if clip.nbytes > self.max_bytes:
+            return None
+        self.clips[key] = clip
+        self.clips.move_to_end(key)
+        return clip
+
+    def recorder(self, key):
+        """Start recording the frames for a key"""
+        return FrameRecorder(self, key)
+
+    def evict(self):
+        """Drop least recently used clips until the cache fits its budget"""
+        if self.directory:
+            entries = []
+            for name in os.listdir(self.directory):
+                if name.endswith(CLIP_SUFFIX):
+                    path = os.path.join(self.directory, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+            entries.sort()
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                    logger.info(f"💾 Evicted cached clip {path}")
+                except OSError:
+                    pass
+        else:
+            total = self.nbytes
+            while total > self.max_bytes and self.clips:
+                key, clip = self.clips.popitem(last=False)
+                total -= clip.nbytes
+                logger.info(f"💾 Evicted cached clip for {key[0]}")
+
+    @property
+    def nbytes(self):
+        if self.directory:
+            return sum(
+                os.path.getsize(os.path.join(self.directory, name))
+                for name in os.listdir(self.directory) if name.endswith(CLIP_SUFFIX)
+            )
+        return sum(clip.nbytes for clip in self.clips.values())
+
+    def stats(self):
+        return {
+            'mode': self.mode,
+            'bytes': self.nbytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses
+        }
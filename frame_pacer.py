@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Deadline-based Frame Pacing
+
+Replaces "do the work, then sleep one frame interval" loops, whose real frame
+rate is always below target and drifts with load. Frame deadlines are
+absolute ticks on the monotonic clock; when the loop falls behind, the
+missed ticks are skipped (and reported) instead of accumulating lag.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+
+
+class FramePacer:
+    def __init__(self, fps, window=60):
+        """
+        fps: target frame rate
+        window: number of recent frames used for achieved fps / jitter
+        """
+        self.set_fps(fps)
+        self.next_deadline = None
+        self.frames = 0
+        self.skipped = 0
+        self.emit_times = deque(maxlen=window)
+
+    def set_fps(self, fps):
+        """Change the target rate (e.g. after switching video files)"""
+        self.fps = fps if fps and fps > 0 else 30.0
+        self.interval = 1.0 / self.fps
+        self.next_deadline = None
+
+    def reset(self):
+        """Start a fresh timeline from now"""
+        self.next_deadline = None
+
+    async def wait(self):
+        """Sleep until the next frame deadline; returns how many ticks were missed"""
+        now = time.monotonic()
+        if self.next_deadline is None:
+            self.next_deadline = now
+
+        missed = 0
+        delay = self.next_deadline - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+        elif -delay >= self.interval:
+            # Behind by at least a whole frame: skip ahead rather than build up lag
+            missed = int(-delay // self.interval)
+            self.next_deadline += missed * self.interval
+            self.skipped += missed
+
+        self.emit_times.append(time.monotonic())
+        self.frames += 1
+        self.next_deadline += self.interval
+        return missed
+
+    def achieved_fps(self):
+        """Frame rate over the recent window"""
+        if len(self.emit_times) < 2:
+            return 0.0
+        span = self.emit_times[-1] - self.emit_times[0]
+        return (len(self.emit_times) - 1) / span if span > 0 else 0.0
+
+    def jitter_ms(self):
+        """Standard deviation of recent frame intervals, in milliseconds"""
+        if len(self.emit_times) < 3:
+            return 0.0
+        times = list(self.emit_times)
+        intervals = [b - a for a, b in zip(times, times[1:])]
+        mean = sum(intervals) / len(intervals)
+        variance = sum((i - mean) ** 2 for i in intervals) / len(intervals)
+        return math.sqrt(variance) * 1000
+
+    def stats(self):
+        return {
+            'target_fps': round(self.fps, 2),
+            'achieved_fps': round(self.achieved_fps(), 2),
+            'jitter_ms': round(self.jitter_ms(), 2),
+            'frames': self.frames,
+            'skipped': self.skipped
+        }
+
+    def summary(self):
+        """Short human-readable summary for logging"""
+        return (f"{self.achieved_fps():.1f}/{self.fps:.1f} fps, "
+                f"jitter {self.jitter_ms():.1f}ms, {self.skipped} ticks skipped")
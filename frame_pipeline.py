@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Capture and Encode Pipeline
+
+Keeps blocking OpenCV/DepthAI work off the asyncio event loop. Frames are
+read on a dedicated capture thread and JPEG-encoded on a configurable thread
+or process pool (OpenCV releases the GIL while encoding), then delivered in
+capture order to the async sender. Pings, client messages and sends keep
+flowing while a frame is being captured or encoded.
+
+Each frame's capture, dequeue and encode times are recorded; after get()
+returns a frame, `timing` holds its FrameTiming (see frame_timing.py).
+
+max_pending is how far the pipeline reads ahead of its consumer. File
+playback reads several frames ahead so a slow decode (a large I-frame, a
+disk stall) is absorbed before it reaches the output; readers can decode
+into a FrameRing of preallocated buffers instead of allocating a frame
+each time. Each get() records how many frames were ready ahead and whether
+the consumer had to wait (an underrun).
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import threading
+import time
+import cv2
+import numpy as np
+
+from frame_timing import Captured, FrameTiming
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+FRAMES_ENCODED = REGISTRY.counter('frames_encoded', "Frames captured and encoded by frame pipelines")
+FRAMES_SKIPPED = REGISTRY.counter('frames_skipped', "Frames read past without encoding to stay on the timeline")
+UNDERRUNS = REGISTRY.counter('frame_pipeline_underruns', "Times a consumer asked for a frame before one was ready",
+                             ('pipeline',))
+READ_AHEAD = REGISTRY.histogram('frame_pipeline_read_ahead_frames', "Frames read ahead when the consumer asks for one",
+                                ('pipeline',), buckets=[0, 1, 2, 4, 8, 16, 32, 64, 128])
+
+
+def encode_jpeg(frame, quality=85):
+    """Encode a BGR frame as JPEG bytes (top-level so process pools can pickle it)"""
+    ok, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return buffer.tobytes()
+
+
+def jpeg_encoder(quality=85):
+    """Picklable JPEG encode function with a fixed quality"""
+    return functools.partial(encode_jpeg, quality=quality)
+
+
+def _timed_encode(encode_frame, frame):
+    """Run an encode and report when it started and ended (runs on the pool)"""
+    start = time.monotonic()
+    result = encode_frame(frame)
+    return result, start, time.monotonic()
+
+
+class FrameRing:
+    """Preallocated frame buffers a reader decodes into in turn
+
+    A buffer is reused `size` reads later. Size the ring to the pipeline's
+    max_pending + workers + 1: a frame is then never overwritten while it can
+    still be waiting for or in an encode.
+    """
+
+    def __init__(self, size, shape, dtype=np.uint8):
+        self.buffers = [np.empty(shape, dtype) for _ in range(size)]
+        self.index = 0
+
+    def read(self, capture):
+        """capture.read() into the next buffer; returns (ok, frame)"""
+        ret, frame = capture.read(self.buffers[self.index])
+        if ret:
+            # OpenCV allocates a new frame if the decoded size differs; that one is reused from then on
+            self.buffers[self.index] = frame
+            self.index = (self.index + 1) % len(self.buffers)
+        return ret, frame
+
+
+class FramePipeline:
+    def __init__(self, read_frame, encode_frame, workers=2, use_processes=False, max_pending=None,
+                 name="capture"):
+        """
+        read_frame: blocking callable returning the next frame (optionally wrapped in
+                    frame_timing.Captured), or None at end of stream
+        encode_frame: callable(frame) -> bytes; must be picklable when use_processes is set
+        workers: encode pool size
+        max_pending: frames captured but not yet consumed, i.e. the read-ahead (bounds memory and latency)
+        name: pipeline label of the underrun and read-ahead metrics
+        """
+        self.read_frame = read_frame
+        self.encode_frame = encode_frame
+        self.workers = max(1, workers)
+        self.use_processes = use_processes
+        self.max_pending = max_pending or self.workers + 1
+        self.executor = None
+        self.thread = None
+        self.loop = None
+        self.ready = None
+        self.slots = threading.Semaphore(self.max_pending)
+        self.stop_event = threading.Event()
+        self.stopped = False
+        self.skip_frames = 0
+        self.frames_skipped = 0
+        self.generation = 0  # Bumped by flush(); frames captured under an older one are dropped
+        self.frames_captured = 0
+        self.frames_delivered = 0
+        self.underruns = 0
+        self.underrun_metric = UNDERRUNS.labels(name)
+        self.read_ahead_metric = READ_AHEAD.labels(name)
+        self.timing = None  # FrameTiming of the frame last returned by get()
+
+    def start(self):
+        """Start capturing; call from the event loop that will consume frames"""
+        self.loop = asyncio.get_running_loop()
+        self.ready = asyncio.Queue()
+        if self.use_processes:
+            self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers)
+        else:
+            self.executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="frame-encode"
+            )
+        self.thread = threading.Thread(target=self._capture_loop, name="frame-capture", daemon=True)
+        self.thread.start()
+        logger.info(f"🧵 Frame pipeline started: {self.workers} encode "
+                    f"{'processes' if self.use_processes else 'threads'}")
+
+    def _capture_loop(self):
+        """Capture thread: read frames and submit them for encoding, in order"""
+        try:
+            while not self.stop_event.is_set():
+                if not self.slots.acquire(timeout=0.1):
+                    continue  # Consumer is behind; wait without busy looping
+                generation = self.generation
+                frame = self.read_frame()
+                dequeued = time.monotonic()
+                if frame is None or self.stop_event.is_set():
+                    self.slots.release()
+                    break
+                if isinstance(frame, Captured) and frame.generation is not None:
+                    # First frame after a repositioning the reader applied: it belongs to that flush
+                    generation = frame.generation
+                if self.skip_frames > 0:
+                    # Consumer fell behind the timeline: read past this frame without encoding it
+                    self.skip_frames -= 1
+                    self.frames_skipped += 1
+                    FRAMES_SKIPPED.inc()
+                    self.slots.release()
+                    continue
+                self.frames_captured += 1
+                if isinstance(frame, Captured):
+                    timing = FrameTiming(self.frames_captured, frame.capture_time or dequeued, dequeued,
+                                         frame.media_time)
+                    frame = frame.frame
+                else:
+                    timing = FrameTiming(self.frames_captured, dequeued)
+                future = self.executor.submit(_timed_encode, self.encode_frame, frame)
+                self.loop.call_soon_threadsafe(self.ready.put_nowait, (future, timing, generation))
+        except Exception as e:
+            if not self.stop_event.is_set():
+                logger.error(f"❌ Frame capture error: {e}")
+        finally:
+            if not self.loop.is_closed():
+                self.loop.call_soon_threadsafe(self.ready.put_nowait, None)
+
+    async def get(self):
+        """Next encoded frame in capture order, or None once the pipeline has ended"""
+        if self.stopped:
+            return None
+        ready = self.ready.qsize()
+        self.read_ahead_metric.observe(ready)
+        item = await self.ready.get()
+        while item is not None and item[2] != self.generation:
+            # Captured before a flush: never delivered
+            item[0].cancel()
+            self.slots.release()
+            item = await self.ready.get()
+        if item is None:
+            return None
+        future, timing, _ = item
+        if self.frames_delivered and (not ready or not future.done()):
+            # The frame was not decoded and encoded yet: the consumer had to wait for it
+            self.underruns += 1
+            self.underrun_metric.inc()
+        try:
+            frame, timing.encode_start, timing.encode_end = await asyncio.wrap_future(future)
+            self.timing = timing
+            self.frames_delivered += 1
+            FRAMES_ENCODED.inc()
+            return frame
+        except concurrent.futures.CancelledError:
+            if self.stopped:
+                return None
+            raise
+        finally:
+            self.slots.release()
+
+    def skip(self, count):
+        """Drop the next `count` frames: first those already read ahead, then read past the rest without encoding them"""
+        while count > 0 and self.ready is not None and self.ready.qsize():
+            item = self.ready.get_nowait()
+            if item is None:
+                self.ready.put_nowait(None)  # End of stream stays last
+                break
+            item[0].cancel()
+            self.slots.release()
+            self.frames_skipped += 1
+            FRAMES_SKIPPED.inc()
+            count -= 1
+        if count > 0:
+            self.skip_frames += count
+
+    @property
+    def read_ahead(self):
+        """Frames read and queued ahead of the consumer right now"""
+        return self.ready.qsize() if self.ready is not None else 0
+
+    def stats(self):
+        return {
+            'read_ahead': self.read_ahead,
+            'max_read_ahead': self.max_pending,
+            'underruns': self.underruns,
+            'delivered': self.frames_delivered,
+            'skipped': self.frames_skipped
+        }
+
+    def flush(self):
+        """Drop every frame captured so far, e.g. after the source was repositioned
+
+        Call from the event loop; a frame the capture thread is reading right now is dropped too.
+        Returns the new generation: a reader that applies the repositioning itself returns its
+        first frame as Captured(..., generation=...) so that frame is kept.
+        """
+        self.generation += 1
+        self.skip_frames = 0
+        return self.generation
+
+    def stop(self):
+        """Stop capturing without waiting (call from the event loop)
+
+        The capture thread leaves read_frame on its own; join() waits for that,
+        e.g. before the source it reads is released, and blocks, so run it off the loop.
+        """
+        if self.stopped:
+            return
+        self.stopped = True
+        self.stop_event.set()
+        self.slots.release()
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.ready is not None:
+            self.ready.put_nowait(None)
+
+    def join(self, timeout=1.0):
+        """Wait for a stopped pipeline's capture thread to leave read_frame (blocking; safe from any thread)"""
+        if timeout and self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Frame Latency Timing
+
+Every frame carries a FrameTiming from the moment it is captured to the
+moment each client's send completes. All times are on the monotonic clock;
+the OAK device timestamps its frames on the same host-synchronized clock,
+so capture is the time the sensor delivered the frame. File frames use the
+time they were decoded and also carry their media timestamp (PTS).
+
+    capture -> dequeued       device/decoder to host (capture thread)
+    dequeued -> encode_start  waiting for an encode worker
+    encode_start -> encode_end
+    encode_end -> published   pacing hold before the frame is handed out
+    published -> send_start   waiting in the client's queue
+    send_start -> sent        websocket send (drain) time
+    capture -> sent           end to end, per client
+
+LatencyTracker keeps a histogram per stage, served as percentiles at
+/latency and as frame_latency_seconds{stage=...} at /metrics.
+Clients can also ask for a per-frame trailer with {"type": "frame_timing",
+"enabled": true}. It is appended to every binary frame:
+
+    offset from end  size  field
+    -38              4     frame id (uint32 LE)
+    -34              8     media timestamp in microseconds (int64 LE, -1 if none)
+    -26              20    5 x uint32 LE microseconds after capture: dequeued,
+                           encode start, encode end, published, send start
+    -6               2     trailer length, 38 (uint16 LE)
+    -4               4     magic b"FTIM"
+
+Add the client's own receive time to get a glass-to-glass budget.
+"""
+
+import struct
+import time
+
+from metrics import Histogram
+
+TRAILER_MAGIC = b'FTIM'
+TRAILER = struct.Struct('<Iq5IH4s')
+
+STAGES = ('capture_to_dequeue', 'queue_wait', 'encode', 'pacing_hold', 'client_queue', 'send', 'capture_to_sent')
+
+
+class Captured:
+    """A frame returned by a pipeline reader together with when it was captured"""
+
+    __slots__ = ('frame', 'capture_time', 'media_time', 'generation')
+
+    def __init__(self, frame, capture_time=None, media_time=None, generation=None):
+        self.frame = frame
+        self.capture_time = capture_time  # Monotonic seconds; None for "when it was read"
+        self.media_time = media_time      # Seconds on the media timeline (file PTS)
+        self.generation = generation      # Pipeline flush() this frame follows, when the reader applied it
+
+
+class FrameTiming:
+    __slots__ = ('frame_id', 'media_time', 'capture', 'dequeued', 'encode_start', 'encode_end', 'published')
+
+    def __init__(self, frame_id, capture, dequeued=None, media_time=None):
+        self.frame_id = frame_id
+        self.media_time = media_time
+        self.capture = capture
+        self.dequeued = dequeued if dequeued is not None else capture
+        self.encode_start = self.dequeued
+        self.encode_end = self.dequeued
+        self.published = None
+
+    @classmethod
+    def now(cls, frame_id, media_time=None):
+        """Timing for a frame that is ready right away (cached or pre-encoded)"""
+        return cls(frame_id, time.monotonic(), media_time=media_time)
+
+    def trailer(self, send_start):
+        """Per-frame trailer for clients that asked for one"""
+        capture = self.capture
+
+        def offset(moment):
+            return min(max(0, int((moment - capture) * 1_000_000)), 0xFFFFFFFF)
+
+        return TRAILER.pack(
+            self.frame_id & 0xFFFFFFFF,
+            int(self.media_time * 1_000_000) if self.media_time is not None else -1,
+            offset(self.dequeued), offset(self.encode_start), offset(self.encode_end),
+            offset(self.published or send_start), offset(send_start),
+            TRAILER.size, TRAILER_MAGIC
+        )
+
+
+class LatencyTracker:
+    """Latency histograms per pipeline stage"""
+
+    def __init__(self):
+        self.histogram = Histogram('frame_latency_seconds', "Frame latency per pipeline stage", ('stage',))
+        self.histograms = {stage: self.histogram.labels(stage) for stage in STAGES}
+
+    def published(self, timing):
+        """Record the producer side once a frame has been handed to the clients"""
+        histograms = self.histograms
+        histograms['capture_to_dequeue'].observe(timing.dequeued - timing.capture)
+        histograms['queue_wait'].observe(timing.encode_start - timing.dequeued)
+        histograms['encode'].observe(timing.encode_end - timing.encode_start)
+        histograms['pacing_hold'].observe(timing.published - timing.encode_end)
+
+    def sent(self, timing, send_start, send_end):
+        """Record one client's delivery of a frame"""
+        histograms = self.histograms
+        histograms['client_queue'].observe(send_start - timing.published)
+        histograms['send'].observe(send_end - send_start)
+        histograms['capture_to_sent'].observe(send_end - timing.capture)
+
+    def snapshot(self):
+        """p50/p95/p99 per stage, as served at /latency"""
+        return {stage: histogram.summary() for stage, histogram in self.histograms.items()}
+
+    def summary(self):
+        """Short end-to-end summary for the periodic status log"""
+        total = self.histograms['capture_to_sent']
+        if not total.count:
+            return "no frames sent"
+        return (f"capture to sent p50 {total.percentile(0.5) * 1000:.1f}ms, "
+                f"p99 {total.percentile(0.99) * 1000:.1f}ms")
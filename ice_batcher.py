@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+ICE Candidate Batcher
+
+Coalesces the burst of ICE candidates a browser produces while gathering into
+a single `ice_candidates` frame per sender (and target peer). Candidates are
+held for a short window (typically 10-50 ms) and flushed immediately when the
+sender signals end-of-candidates.
+"""
+
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def is_end_of_candidates(candidate):
+    """True if a candidate payload marks the end of ICE gathering"""
+    if candidate is None or candidate == '':
+        return True
+    if isinstance(candidate, dict):
+        return not candidate.get('candidate')
+    return False
+
+
+class IceCandidateBatcher:
+    def __init__(self, window, flush_callback):
+        """
+        window: seconds to hold candidates before forwarding them
+        flush_callback: async callable(sender_ws, to_user, candidates, end_of_candidates)
+        """
+        self.window = window
+        self.flush_callback = flush_callback
+        self.pending = {}  # (sender_ws, to_user) -> list of candidates
+        self.timers = {}   # (sender_ws, to_user) -> TimerHandle
+
+    async def add(self, sender, to_user, candidate):
+        """Queue a candidate; flushes straight away on end-of-candidates"""
+        key = (sender, to_user)
+        if is_end_of_candidates(candidate):
+            await self.flush(key, end_of_candidates=True)
+            return
+
+        self.pending.setdefault(key, []).append(candidate)
+        if key not in self.timers:
+            loop = asyncio.get_running_loop()
+            self.timers[key] = loop.call_later(
+                self.window, lambda: asyncio.ensure_future(self.flush(key))
+            )
+
+    async def flush(self, key, end_of_candidates=False):
+        """Forward everything pending for one sender/target pair"""
+        timer = self.timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        candidates = self.pending.pop(key, [])
+        if not candidates and not end_of_candidates:
+            return
+
+        sender, to_user = key
+        try:
+            await self.flush_callback(sender, to_user, candidates, end_of_candidates)
+        except Exception as e:
+            logger.error(f"Error flushing ICE candidate batch: {e}")
+
+    async def flush_sender(self, sender):
+        """Flush every pending batch from one sender (e.g. before a new offer)"""
+        for key in [k for k in self.pending if k[0] is sender]:
+            await self.flush(key)
+
+    def discard_sender(self, sender):
+        """Drop pending candidates from a sender that has gone away"""
+        for key in [k for k in self.pending if k[0] is sender]:
+            timer = self.timers.pop(key, None)
+            if timer:
+                timer.cancel()
+            del self.pending[key]
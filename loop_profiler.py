@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Event Loop Profiler
+
+Finds what blocks the asyncio event loop when pings start timing out under
+load. While profiling is on, a heartbeat task ticks on the loop and a
+watchdog thread checks on it. When the loop has not come back for longer
+than the threshold, the watchdog samples the loop thread's stack every few
+milliseconds until it does. Each stall is recorded with its duration and
+its most frequent stacks, which point at the callback that held the loop.
+
+Every asyncio server entry point installs a profiler:
+
+    --profile                start with profiling on
+    --slow-callback-ms 50    stall threshold
+
+and it can be switched at runtime:
+
+    kill -USR1 <pid>         toggle; turning it off logs the report
+    {"type": "profiler", "action": "start" | "stop" | "report", "token": "..."}
+
+The control message is only accepted when the server runs with the
+WEBRTC_ADMIN_TOKEN environment variable set and the token matches.
+Profiling costs nothing while it is off.
+"""
+
+import asyncio
+import collections
+import hmac
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+ADMIN_TOKEN_ENV = "WEBRTC_ADMIN_TOKEN"
+
+
+class Stall:
+    """One period during which the loop did not run anything else"""
+
+    def __init__(self, started):
+        self.started = started
+        self.duration = 0.0
+        self.samples = collections.Counter()  # Stack (tuple of lines) -> times seen
+
+    def report(self, top=3):
+        return {
+            "at": time.strftime("%H:%M:%S", time.localtime(time.time() - (time.monotonic() - self.started))),
+            "duration_ms": round(self.duration * 1000, 1),
+            "samples": sum(self.samples.values()),
+            "stacks": [
+                {"count": count, "stack": list(stack)}
+                for stack, count in self.samples.most_common(top)
+            ]
+        }
+
+
+class LoopProfiler:
+    def __init__(self, loop, threshold=0.05, sample_interval=0.005, keep=50, stack_depth=12):
+        """
+        threshold: seconds the loop may be busy before it counts as a stall
+        sample_interval: seconds between stack samples during a stall
+        keep: longest stalls kept for the report
+        """
+        self.loop = loop
+        self.threshold = threshold
+        self.sample_interval = sample_interval
+        self.keep = keep
+        self.stack_depth = stack_depth
+        self.tick = max(0.005, threshold / 4)
+        self.loop_thread_id = None
+        self.running = False
+        self.started = None
+        self.heartbeat = None
+        self.task = None
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.lag = Histogram()
+        self.stalls = []
+        self.stall_count = 0
+
+    def start(self):
+        """Start profiling; call on the loop's thread"""
+        if self.running:
+            return
+        if self.thread is not None:
+            # The last run's watchdog must be gone before stop_event is cleared, or two would sample
+            self.thread.join(self.sample_interval * 10)
+            if self.thread.is_alive():
+                logger.warning("🩺 Previous profiler watchdog still running, not restarting")
+                return
+            self.thread = None
+        self.loop_thread_id = threading.get_ident()
+        self.running = True
+        self.started = time.monotonic()
+        self.heartbeat = self.started
+        self.lag = Histogram()
+        self.stalls = []
+        self.stall_count = 0
+        self.stop_event.clear()
+        self.task = self.loop.create_task(self._beat())
+        self.thread = threading.Thread(target=self._watch, name="loop-profiler", daemon=True)
+        self.thread.start()
+        logger.info(f"🩺 Event loop profiler on (stalls over {self.threshold * 1000:.0f}ms are sampled)")
+
+    def stop(self):
+        """Stop profiling; the report stays available until the next start"""
+        if not self.running:
+            return
+        self.running = False
+        self.stop_event.set()
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        if self.thread is not None:
+            # It wakes every sample_interval; a stack sample in progress is the most it can hold us up
+            self.thread.join(self.sample_interval * 10)
+        logger.info("🩺 Event loop profiler off")
+
+    def toggle(self):
+        """Signal handler: start, or stop and log the report"""
+        if self.running:
+            self.stop()
+            logger.warning(self.format_report())
+        else:
+            self.start()
+
+    async def _beat(self):
+        while True:
+            expected = time.monotonic() + self.tick
+            await asyncio.sleep(self.tick)
+            now = time.monotonic()
+            self.lag.observe(max(0.0, now - expected))
+            self.heartbeat = now
+
+    def _watch(self):
+        """Watchdog thread: sample the loop thread's stack while it is stalled"""
+        stall = None
+        last_beat = self.heartbeat
+        while not self.stop_event.wait(self.sample_interval):
+            beat = self.heartbeat
+            now = time.monotonic()
+            if stall is not None and beat != last_beat:
+                # The loop ran again: the stall is over
+                stall.duration = beat - last_beat - self.tick
+                self._record(stall)
+                stall = None
+            last_beat = beat
+            if now - beat - self.tick < self.threshold:
+                continue
+            if stall is None:
+                stall = Stall(beat + self.tick)
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is not None:
+                stack = traceback.extract_stack(frame)[-self.stack_depth:]
+                stall.samples[tuple(f"{entry.filename}:{entry.lineno} {entry.name}" for entry in stack)] += 1
+                del frame
+
+    def _record(self, stall):
+        self.stall_count += 1
+        self.stalls.append(stall)
+        if len(self.stalls) > self.keep:
+            # Keep the longest ones
+            self.stalls.sort(key=lambda entry: entry.duration, reverse=True)
+            del self.stalls[self.keep:]
+
+    def report(self, top=10):
+        """Lag percentiles and the longest stalls with their most frequent stacks"""
+        stalls = sorted(self.stalls, key=lambda entry: entry.duration, reverse=True)[:top]
+        return {
+            "running": self.running,
+            "profiled_s": round(time.monotonic() - self.started, 1) if self.started else 0,
+            "threshold_ms": self.threshold * 1000,
+            "lag": self.lag.summary(),
+            "stalls": self.stall_count,
+            "longest": [stall.report() for stall in stalls]
+        }
+
+    def format_report(self, top=5):
+        """Report as text for the log"""
+        report = self.report(top)
+        lines = [f"🩺 Event loop report: {report['stalls']} stalls over {report['threshold_ms']:.0f}ms "
+                 f"in {report['profiled_s']}s, lag {report['lag']}"]
+        for stall in report["longest"]:
+            lines.append(f"  {stall['at']} blocked {stall['duration_ms']}ms ({stall['samples']} samples)")
+            if stall["stacks"]:
+                for line in stall["stacks"][0]["stack"]:
+                    lines.append(f"      {line}")
+        return "\n".join(lines)
+
+
+_profiler = None
+
+
+def install_profiler(enabled=False, threshold=0.05):
+    """Create the profiler for the running loop and toggle it on SIGUSR1"""
+    global _profiler
+    loop = asyncio.get_running_loop()
+    _profiler = LoopProfiler(loop, threshold)
+    if hasattr(signal, "SIGUSR1"):
+        try:
+            loop.add_signal_handler(signal.SIGUSR1, _profiler.toggle)
+        except (NotImplementedError, RuntimeError, ValueError):
+            pass  # Not on the main thread, or no signal support on this platform
+    if enabled:
+        _profiler.start()
+    return _profiler
+
+
+def profiler_command(data):
+    """Reply to a {"type": "profiler"} admin message"""
+    token = os.environ.get(ADMIN_TOKEN_ENV)
+    if not token:
+        return {"type": "error", "message": "Profiler control is disabled"}
+    if not hmac.compare_digest(str(data.get("token", "")), token):
+        return {"type": "error", "message": "Invalid admin token"}
+    if _profiler is None:
+        return {"type": "error", "message": "No profiler installed"}
+    action = data.get("action")
+    if action == "start":
+        _profiler.start()
+    elif action == "stop":
+        _profiler.stop()
+    elif action != "report":
+        return {"type": "error", "message": f"Unknown profiler action: {action}"}
+    return {"type": "profiler", "report": _profiler.report()}
+
+
+def add_profiler_arguments(parser):
+    parser.add_argument("--profile", action="store_true",
+                        help="Start with the event loop profiler on (toggle at runtime with SIGUSR1)")
+    parser.add_argument("--slow-callback-ms", type=float, default=50,
+                        help="Event loop stalls longer than this are sampled by the profiler")
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Lightweight Metrics
+
+Counters, gauges and latency histograms for every server, exposed in the
+Prometheus text format. Recording is a plain attribute update (histograms:
+one bisect and two additions), so metrics can sit on per-frame and
+per-message hot paths; gauges backed by a function cost nothing until they
+are scraped. Updates are not locked: the async servers record from a single
+thread, and an increment lost between Flask request threads is acceptable.
+
+Histograms have fixed log-spaced buckets; percentiles are read from the
+buckets (accurate to one bucket, about 20%).
+
+The WebSocket servers serve metrics over plain HTTP on their own port,
+through websockets' process_request hook:
+
+    async with websockets.serve(handler, host, port,
+                                process_request=http_routes({"/metrics": REGISTRY.render})):
+
+start_http_server() serves the same routes on a separate port, for
+processes that share their WebSocket port (signaling shards).
+"""
+
+import asyncio
+import bisect
+import http
+import json
+import logging
+import math
+
+logger = logging.getLogger(__name__)
+
+
+def log_buckets(low=0.0001, high=30.0, factor=1.2):
+    """Upper bounds from `low` to at least `high` seconds, each `factor` times the one before"""
+    count = math.ceil(math.log(high / low, factor)) + 1
+    return [low * factor ** i for i in range(count)]
+
+
+DEFAULT_BUCKETS = log_buckets()
+
+
+class Metric:
+    """Common naming and labelling; labelled metrics hold one child per label value tuple"""
+
+    kind = None
+
+    def __init__(self, name=None, help="", labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+
+    @property
+    def family(self):
+        """Name used in the text format"""
+        return self.name
+
+    def labels(self, *values):
+        """Child metric for a combination of label values (cache it on hot paths)"""
+        child = self.children.get(values)
+        if child is None:
+            child = self.children[values] = self._child()
+        return child
+
+    def remove(self, *values):
+        """Forget a label combination, e.g. a disconnected client"""
+        self.children.pop(values, None)
+
+    def _child(self):
+        raise NotImplementedError
+
+    def samples(self):
+        """(suffix, labels, value) for the text format"""
+        if not self.labelnames:
+            return list(self._samples(()))
+        return [
+            sample
+            for values, child in list(self.children.items())
+            for sample in child._samples(tuple(zip(self.labelnames, values)))
+        ]
+
+
+class Counter(Metric):
+    """Monotonic count; name it without the _total suffix, which is added when rendered"""
+
+    kind = "counter"
+
+    def __init__(self, name=None, help="", labelnames=()):
+        super().__init__(name, help, labelnames)
+        self.value = 0
+
+    @property
+    def family(self):
+        return self.name + "_total"
+
+    def _child(self):
+        return Counter()
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def _samples(self, labels):
+        yield "", labels, self.value
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name=None, help="", labelnames=(), function=None):
+        """function: optional callable() -> value, read at scrape time"""
+        super().__init__(name, help, labelnames)
+        self.value = 0
+        self.function = function
+
+    def _child(self):
+        return Gauge()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def get(self):
+        return self.function() if self.function else self.value
+
+    def _samples(self, labels):
+        yield "", labels, self.get()
+
+
+class Histogram(Metric):
+    """Distribution of observed values (seconds)"""
+
+    kind = "histogram"
+
+    def __init__(self, name=None, help="", labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.bounds = list(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)  # Last bucket: above the highest bound
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def _child(self):
+        return Histogram(buckets=self.bounds)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of observations; None when empty"""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self):
+        """Count, mean and p50/p95/p99/max in milliseconds"""
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean_ms": round(self.sum / self.count * 1000, 3),
+            "p50_ms": round(self.percentile(0.50) * 1000, 3),
+            "p95_ms": round(self.percentile(0.95) * 1000, 3),
+            "p99_ms": round(self.percentile(0.99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3)
+        }
+
+    def _samples(self, labels):
+        cumulative = 0
+        for bound, bucket_count in zip(self.bounds, self.counts):
+            cumulative += bucket_count
+            if bucket_count:  # Empty buckets add nothing a cumulative reader cannot infer
+                yield "_bucket", labels + (("le", f"{bound:.6g}"),), cumulative
+        yield "_bucket", labels + (("le", "+Inf"),), self.count
+        yield "_sum", labels, self.sum
+        yield "_count", labels, self.count
+
+
+class Registry:
+    """Named metrics of one process, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        """Add a metric; one registered later under the same name replaces it"""
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=(), function=None):
+        return self.register(Gauge(name, help, labelnames, function))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in list(self.metrics.values()):
+            family = metric.family
+            lines.append(f"# HELP {family} {metric.help}")
+            lines.append(f"# TYPE {family} {metric.kind}")
+            for suffix, labels, value in metric.samples():
+                label_text = ",".join(f'{key}="{_escape(value_)}"' for key, value_ in labels)
+                lines.append(f"{family}{suffix}{{{label_text}}} {value}" if labels
+                             else f"{family}{suffix} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+# Process-wide registry: each server runs in its own process
+REGISTRY = Registry()
+
+
+async def monitor_loop_lag(histogram, interval=0.25):
+    """Observe how late the event loop wakes up from a timer, until cancelled"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        histogram.observe(max(0.0, loop.time() - start - interval))
+
+
+def start_loop_lag_monitor(registry=REGISTRY, interval=0.25):
+    """Track event loop lag as event_loop_lag_seconds; returns the monitoring task"""
+    histogram = registry.histogram("event_loop_lag_seconds", "Delay of event loop timers beyond their due time")
+    return asyncio.create_task(monitor_loop_lag(histogram, interval))
+
+
+def _respond(route):
+    """(status, headers, body) for a route's output"""
+    try:
+        body = route()
+    except Exception as e:
+        return http.HTTPStatus.INTERNAL_SERVER_ERROR, [("Content-Type", "text/plain")], str(e).encode()
+    if isinstance(body, str):
+        # Prometheus text exposition format
+        return http.HTTPStatus.OK, [("Content-Type", "text/plain; version=0.0.4; charset=utf-8")], body.encode('utf-8')
+    return http.HTTPStatus.OK, [("Content-Type", "application/json")], json.dumps(body).encode('utf-8')
+
+
+def http_routes(routes):
+    """websockets process_request hook answering GET on the given paths
+
+    routes: {path: callable() -> dict (sent as JSON) or str (sent as text)}
+    Any other path continues with the WebSocket handshake.
+    """
+    def process_request(path, request_headers):
+        route = routes.get(path.split('?', 1)[0])
+        if route is None:
+            return None
+        return _respond(route)
+    return process_request
+
+
+async def start_http_server(host, port, routes):
+    """Minimal HTTP/1.0 server for the given routes on a port of its own"""
+    async def handle(reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            while (await asyncio.wait_for(reader.readline(), 5)).strip():
+                pass  # Headers are not needed
+            parts = request_line.decode('latin-1').split()
+            route = routes.get(parts[1].split('?', 1)[0]) if len(parts) >= 2 else None
+            if route is None:
+                status, headers, body = http.HTTPStatus.NOT_FOUND, [("Content-Type", "text/plain")], b"Not found\n"
+            else:
+                status, headers, body = _respond(route)
+            head = [f"HTTP/1.0 {status.value} {status.phrase}", f"Content-Length: {len(body)}"]
+            head += [f"{key}: {value}" for key, value in headers]
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logger.info(f"📈 Metrics: http://{host}:{port}/metrics")
+    return server
@@ -3,30 +3,118 @@
 OAK Camera WebSocket Bridge
 
 Streams OAK-D camera frames to WebSocket clients for WebRTC integration.
+
+By default preview frames are JPEG-encoded on the host. With --encoder
+mjpeg/h264/h265 the camera's hardware VideoEncoder does the work and the
+bridge only forwards its bitstream (MJPEG as plain JPEG frames, H.264/H.265
+as packets for WebCodecs, see packet_passthrough.py).
+
+Booting the camera takes seconds, so the device is opened on a worker
+thread while the event loop keeps serving, and clients that arrive during
+the boot wait for the same open. When the last client leaves, streaming
+stops but the device stays open for --linger seconds, so a client that
+reconnects gets frames within a frame interval; --always-warm opens it at
+startup and never closes it. Boot time and time from a client's arrival
+to its first frame are exported at /metrics.
 """
 
 import asyncio
 import websockets
 import depthai as dai
-import cv2
-import json
 import logging
 import time
-import threading
-from concurrent.futures import ThreadPoolExecutor
+import argparse
+import functools
+from frame_broadcaster import FrameBroadcaster
+from frame_pipeline import FramePipeline, jpeg_encoder
+from frame_pacer import FramePacer
+from frame_timing import Captured, LatencyTracker
+from metrics import REGISTRY, http_routes, start_loop_lag_monitor
+from loop_profiler import add_profiler_arguments, install_profiler, profiler_command
+from packet_passthrough import encode_packet, is_annexb_keyframe
+from adaptive_quality import DEFAULT_LADDER, RungController
+from simulcast import VariantEncoder, describe_layers, parse_layers, resolve_layer
+from signaling_codec import get_codec, codec_for_subprotocol, supported_subprotocols
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# On-device encoder modes: (VideoEncoder profile, WebCodecs codec string for Annex B output)
+DEVICE_ENCODERS = {
+    "mjpeg": (dai.VideoEncoderProperties.Profile.MJPEG, None),
+    "h264": (dai.VideoEncoderProperties.Profile.H264_MAIN, "avc1.4d401f"),
+    "h265": (dai.VideoEncoderProperties.Profile.H265_MAIN, "hev1.1.6.L93.B0"),
+}
+
+# Device states for the oak_device_state gauge
+DEVICE_CLOSED, DEVICE_BOOTING, DEVICE_IDLE, DEVICE_STREAMING = range(4)
+
+BOOT_SECONDS = REGISTRY.histogram('oak_device_boot_seconds', "Time to open the OAK device")
+FIRST_FRAME_SECONDS = REGISTRY.histogram('oak_time_to_first_frame_seconds',
+                                         "Time from a client starting the stream to the first frame published",
+                                         labelnames=("start",))
+
+
+def mjpeg_frame(data):
+    """MJPEG bitstream packets are complete JPEG frames"""
+    return data, True
+
+
 class OAKCameraBridge:
-    def __init__(self, port=8766):
+    def __init__(self, port=8766, encode_workers=2, encode_processes=False, encoder="jpeg",
+                 bitrate_kbps=4000, device_factory=None, adaptive=False, layers=None,
+                 linger=10.0, always_warm=False):
+        """
+        encoder: 'jpeg' encodes preview frames on the host; 'mjpeg', 'h264' or 'h265'
+                 use the camera's hardware encoder
+        device_factory: callable(pipeline) -> device, dai.Device by default
+                        (oak_mock_device.MockDevice for tests)
+        adaptive: per-client quality ladder for host JPEG encoding
+        layers: simulcast layers clients can subscribe to (host JPEG encoding only)
+        linger: seconds the device stays open after the last client leaves (0 closes it at once)
+        always_warm: open the device when the server starts and keep it open
+        """
         self.port = port
         self.clients = set()
+        self.encoder = encoder
+        self.bitrate_kbps = bitrate_kbps
+        self.device_factory = device_factory or dai.Device
+        self.layers = layers if encoder == "jpeg" else None
+        self.variant_encoder = None
+        if encoder == "jpeg" and (adaptive or self.layers):
+            self.variant_encoder = VariantEncoder(self.layers, DEFAULT_LADDER if adaptive else None, quality=85)
+        controller_factory = None
+        if adaptive and self.variant_encoder:
+            controller_factory = functools.partial(RungController, len(DEFAULT_LADDER), frame_interval=1 / 30)
+        self.latency = LatencyTracker()  # Capture-to-send latency per stage, served at /latency
+        REGISTRY.register(self.latency.histogram)
+        REGISTRY.gauge('bridge_clients', "Connected WebSocket clients", function=lambda: len(self.clients))
+        # H.264/H.265 packets need some slack: a dropped packet costs a wait for the next keyframe
+        self.broadcaster = FrameBroadcaster(queue_size=8 if encoder in ("h264", "h265") else 1,
+                                            on_disconnect=self.clients.discard,
+                                            controller_factory=controller_factory,
+                                            latency=self.latency)
+        self.codec = get_codec()  # Control replies are always text; binary frames carry video
         self.pipeline = None
         self.device = None
+        self.device_lock = asyncio.Lock()  # One boot or close at a time
+        self.booting = False
+        self.linger = max(0.0, linger)
+        self.linger_task = None
+        self.always_warm = always_warm
+        self.boot_seconds = None
         self.streaming = False
         self.frame_queue = None
+        self.encode_workers = encode_workers
+        self.encode_processes = encode_processes
+        self.frame_pipeline = None
+        self.pacer = FramePacer(30)
+        self.stream_id = 0
+        self.stream_config = None  # WebCodecs decoder config for H.264/H.265 output
+        self.queue_size = 4
+        REGISTRY.gauge('oak_device_state', "OAK device state: 0 closed, 1 booting, 2 open and idle, 3 streaming",
+                       function=self.device_state)
         
     def setup_oak_pipeline(self):
         """Setup OAK camera pipeline"""
@@ -40,7 +128,7 @@ class OAKCameraBridge:
             cam_rgb = self.pipeline.create(dai.node.ColorCamera)
             xout = self.pipeline.create(dai.node.XLinkOut)
             
-            xout.setStreamName("rgb")
+            xout.setStreamName(self.stream_name)
             
             # Properties - optimized for WebRTC
             cam_rgb.setPreviewSize(1280, 720)  # 720p for better performance
@@ -49,16 +137,34 @@ class OAKCameraBridge:
             cam_rgb.setColorOrder(dai.ColorCameraProperties.ColorOrder.RGB)
             cam_rgb.setFps(30)
             
-            # Linking
-            cam_rgb.preview.link(xout.input)
+            if self.encoder == "jpeg":
+                # Linking
+                cam_rgb.preview.link(xout.input)
+            else:
+                # Encode on the device: only the compressed bitstream crosses USB
+                profile, _ = DEVICE_ENCODERS[self.encoder]
+                cam_rgb.setVideoSize(1280, 720)
+                video_encoder = self.pipeline.create(dai.node.VideoEncoder)
+                video_encoder.setDefaultProfilePreset(30, profile)
+                if self.encoder == "mjpeg":
+                    video_encoder.setQuality(85)
+                else:
+                    video_encoder.setBitrateKbps(self.bitrate_kbps)
+                    video_encoder.setKeyframeFrequency(30)  # New viewers start within a second
+                cam_rgb.video.link(video_encoder.input)
+                video_encoder.bitstream.link(xout.input)
             
-            logger.info("✅ OAK pipeline configured: 1280x720 @ 30fps")
+            logger.info(f"✅ OAK pipeline configured: 1280x720 @ 30fps ({self.encoder})")
             return True
             
         except Exception as e:
             logger.error(f"❌ Error setting up OAK pipeline: {e}")
             return False
     
+    @property
+    def stream_name(self):
+        return "rgb" if self.encoder == "jpeg" else "encoded"
+    
     def start_oak_device(self):
         """Start OAK device connection"""
         try:
@@ -67,10 +173,27 @@ class OAKCameraBridge:
                     return False
             
             logger.info("🔗 Connecting to OAK device...")
-            self.device = dai.Device(self.pipeline)
-            self.frame_queue = self.device.getOutputQueue(name="rgb", maxSize=4, blocking=False)
+            start = time.monotonic()
+            self.device = self.device_factory(self.pipeline)
+            self.boot_seconds = time.monotonic() - start
+            BOOT_SECONDS.observe(self.boot_seconds)
+            if self.encoder in ("h264", "h265"):
+                # Every packet is needed to decode the next: let the encoder wait rather than drop
+                self.queue_size = 30
+                self.frame_queue = self.device.getOutputQueue(name=self.stream_name, maxSize=self.queue_size, blocking=True)
+                self.stream_id += 1
+                self.stream_config = {
+                    "stream_id": self.stream_id,
+                    "codec": DEVICE_ENCODERS[self.encoder][1],
+                    "width": 1280,
+                    "height": 720,
+                    "fps": 30
+                }
+            else:
+                self.queue_size = 4
+                self.frame_queue = self.device.getOutputQueue(name=self.stream_name, maxSize=self.queue_size, blocking=False)
             
-            logger.info("✅ OAK device connected successfully")
+            logger.info(f"✅ OAK device connected successfully in {self.boot_seconds:.2f}s")
             return True
             
         except Exception as e:
@@ -81,6 +204,10 @@ class OAKCameraBridge:
         """Stop OAK device"""
         try:
             self.streaming = False
+            if self.frame_pipeline:
+                # Don't wait for the capture thread: closing the device unblocks its queue read
+                self.frame_pipeline.stop()
+                self.frame_pipeline = None
             if self.device:
                 self.device.close()
                 self.device = None
@@ -89,12 +216,141 @@ class OAKCameraBridge:
         except Exception as e:
             logger.error(f"❌ Error disconnecting OAK device: {e}")
     
-    async def stream_frames(self):
-        """Stream frames from OAK camera to connected clients"""
+    def device_state(self):
+        """DEVICE_CLOSED, DEVICE_BOOTING, DEVICE_IDLE or DEVICE_STREAMING"""
+        if self.streaming:
+            return DEVICE_STREAMING
+        if self.device is not None:
+            return DEVICE_IDLE
+        return DEVICE_BOOTING if self.booting else DEVICE_CLOSED
+    
+    async def open_device(self):
+        """Open the device on a worker thread unless it is open; True once it is
+
+        Clients arriving during a boot wait for that boot instead of starting another.
+        """
+        async with self.device_lock:
+            if self.device is None:
+                self.booting = True
+                try:
+                    await asyncio.to_thread(self.start_oak_device)
+                finally:
+                    self.booting = False
+            return self.device is not None
+    
+    async def close_device(self):
+        """Close the device on a worker thread, unless a client has arrived meanwhile"""
+        async with self.device_lock:
+            device = self.device
+            if device is None or self.clients:
+                return
+            self.stop_streaming()
+            self.device = None
+            self.frame_queue = None
+            try:
+                await asyncio.to_thread(device.close)
+                logger.info("🔶 OAK device disconnected")
+            except Exception as e:
+                logger.error(f"❌ Error disconnecting OAK device: {e}")
+    
+    def start_streaming(self, started_at, start):
+        """Start the frame pipeline on the open device
+
+        started_at: time.monotonic() when the client starting the stream arrived
+        start: 'cold' if that client waited for the device to boot, 'warm' otherwise
+        """
+        if start == "warm":
+            # Frames queued while nobody streamed are stale
+            for _ in range(self.queue_size):
+                if self.frame_queue.tryGet() is None:
+                    break
+        self.streaming = True
+        asyncio.create_task(self.stream_frames(started_at, start))
+    
+    def stop_streaming(self):
+        """Stop the frame pipeline; the device stays open"""
+        self.streaming = False
+        if self.frame_pipeline:
+            # The capture thread drops the frame it is waiting for once it gets it
+            self.frame_pipeline.stop()
+            self.frame_pipeline = None
+    
+    async def release_device(self):
+        """After the last client leaves: keep the device warm, let it linger, or close it"""
+        if self.always_warm:
+            logger.info("⏸️ No clients connected, keeping the OAK device warm")
+        elif self.linger > 0:
+            logger.info(f"⏸️ No clients connected, keeping the OAK device open for {self.linger:g}s")
+            self.linger_task = asyncio.create_task(self.close_after_linger())
+        else:
+            logger.info("⏹️ No clients connected, stopping OAK streaming")
+            await self.close_device()
+    
+    async def close_after_linger(self):
+        await asyncio.sleep(self.linger)
+        self.linger_task = None  # From here on a new client waits for the close instead of cancelling it
+        logger.info(f"⏹️ No clients for {self.linger:g}s, closing the OAK device")
+        await self.close_device()
+    
+    def cancel_linger(self):
+        if self.linger_task is not None:
+            self.linger_task.cancel()
+            self.linger_task = None
+            logger.info("♻️ Client arrived while the OAK device lingered, reusing it")
+    
+    def read_oak_frame(self):
+        """Block for the next camera frame (runs on the capture thread)"""
+        frame_queue = self.frame_queue
+        if frame_queue is None:
+            return None
+        in_rgb = frame_queue.get()
+        if in_rgb is None:
+            return None
+        # Convert to OpenCV format; the device timestamp is on the host's monotonic clock
+        return Captured(in_rgb.getCvFrame(), in_rgb.getTimestamp().total_seconds())
+    
+    def read_oak_packet(self):
+        """Block for the next device-encoded packet (runs on the capture thread)"""
+        frame_queue = self.frame_queue
+        if frame_queue is None:
+            return None
+        packet = frame_queue.get()
+        if packet is None:
+            return None
+        data = packet.getData().tobytes()
+        timestamp = packet.getTimestamp().total_seconds()
+        if self.encoder == "mjpeg":
+            return Captured(data, timestamp)
+        return Captured((data, timestamp, 1 / 30, is_annexb_keyframe(data, self.encoder), self.stream_id), timestamp)
+    
+    async def stream_frames(self, started_at=None, start="cold"):
+        """Stream frames from OAK camera to connected clients
+
+        started_at, start: when and how the stream was started, for time-to-first-frame
+        """
         if not self.device or not self.frame_queue:
             logger.error("❌ OAK device not connected")
             return
         
+        if self.encoder == "jpeg":
+            # Blocking queue reads and JPEG encoding run off the event loop
+            pipeline = FramePipeline(
+                self.read_oak_frame,
+                self.variant_encoder or jpeg_encoder(85),  # Good quality, reasonable size
+                workers=self.encode_workers,
+                use_processes=self.encode_processes
+            )
+        else:
+            # The device already encoded the frame; only the blocking queue read leaves the loop
+            pipeline = FramePipeline(
+                self.read_oak_packet,
+                mjpeg_frame if self.encoder == "mjpeg" else encode_packet,
+                workers=1
+            )
+        self.frame_pipeline = pipeline
+        pipeline.start()
+        self.pacer.reset()
+        
         try:
             logger.info("🎬 Starting OAK frame streaming...")
             
@@ -103,46 +359,43 @@ class OAKCameraBridge:
             
             while self.streaming and self.clients:
                 try:
-                    # Get frame from OAK camera
-                    in_rgb = self.frame_queue.get()
+                    item = await pipeline.get()
+                    if item is None:
+                        break
                     
-                    if in_rgb is None:
-                        await asyncio.sleep(0.001)
-                        continue
+                    if self.encoder == "jpeg":
+                        # Release the frame on its deadline (~30 FPS); a live camera
+                        # never needs catching up, so missed ticks are only counted
+                        await self.pacer.wait()
+                        frame_bytes, keyframe = item, True
+                    else:
+                        # The device encoder runs on the camera clock; holding packets back only adds latency
+                        frame_bytes, keyframe = item
                     
-                    # Convert to OpenCV format
-                    frame = in_rgb.getCvFrame()
                     frame_count += 1
                     
-                    # Encode frame as JPEG for web streaming
-                    encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 85]  # Good quality, reasonable size
-                    _, buffer = cv2.imencode('.jpg', frame, encode_param)
-                    frame_bytes = buffer.tobytes()
+                    # Hand the frame to every client's queue; slow clients drop stale frames
+                    if self.variant_encoder:
+                        self.broadcaster.publish_variants(frame_bytes, timing=pipeline.timing)
+                        # Only encode the layers and rungs clients currently need
+                        self.variant_encoder.active = self.broadcaster.active_variants()
+                    else:
+                        self.broadcaster.publish(frame_bytes, keyframe, pipeline.timing)
                     
-                    # Send to all connected clients
-                    if self.clients:
-                        disconnected_clients = set()
-                        for client in self.clients.copy():
-                            try:
-                                await client.send(frame_bytes)
-                            except websockets.exceptions.ConnectionClosed:
-                                disconnected_clients.add(client)
-                            except Exception as e:
-                                logger.warning(f"⚠️ Error sending frame to client: {e}")
-                                disconnected_clients.add(client)
-                        
-                        # Remove disconnected clients
-                        self.clients -= disconnected_clients
+                    if frame_count == 1 and started_at is not None:
+                        waited = time.monotonic() - started_at
+                        FIRST_FRAME_SECONDS.labels(start).observe(waited)
+                        boot = f", device boot {self.boot_seconds:.2f}s" if start == "cold" and self.boot_seconds else ""
+                        logger.info(f"⏱️ First frame {waited * 1000:.0f}ms after the client arrived ({start} start{boot})")
                     
                     # Report status every 5 seconds
                     current_time = time.time()
                     if current_time - last_report >= 5.0:
-                        logger.info(f"📊 Streaming: {frame_count} frames sent to {len(self.clients)} clients")
+                        pacing = f" ({self.pacer.summary()})" if self.encoder == "jpeg" else ""
+                        logger.info(f"📊 Streaming: {frame_count} frames published to {self.broadcaster.client_count} clients{pacing}, "
+                                    f"{self.latency.summary()}")
                         last_report = current_time
                     
-                    # Control frame rate
-                    await asyncio.sleep(0.033)  # ~30 FPS
-                    
                 except Exception as e:
                     logger.error(f"❌ Error in frame streaming: {e}")
                     await asyncio.sleep(0.1)
@@ -151,10 +404,15 @@ class OAKCameraBridge:
             
         except Exception as e:
             logger.error(f"❌ Critical error in frame streaming: {e}")
+        finally:
+            pipeline.stop()
+            if self.frame_pipeline is pipeline:
+                self.frame_pipeline = None
     
     async def handle_client(self, websocket, path=None):
         """Handle WebSocket client connections"""
         client_addr = websocket.remote_address
+        client_codec = codec_for_subprotocol(websocket.subprotocol, self.codec)
         logger.info(f"🔗 Client connected from {client_addr}")
         
         # Add client to set
@@ -163,7 +421,7 @@ class OAKCameraBridge:
         # Check if camera is available
         if not getattr(self, 'oak_available', True):
             try:
-                await websocket.send(json.dumps({
+                await websocket.send(self.codec.encode({
                     "type": "error",
                     "message": "No OAK camera available in container. Check USB device access.",
                     "details": "Run container with --device=/dev/bus/usb or --privileged"
@@ -179,56 +437,79 @@ class OAKCameraBridge:
                 self.clients.discard(websocket)
             return
         
+        # A client arriving while the device lingers keeps it open
+        self.cancel_linger()
+        
         # Start streaming if this is the first client
-        if len(self.clients) == 1 and not self.streaming:
-            logger.info("▶️ Starting OAK camera streaming for first client")
+        if not self.streaming:
+            arrived = time.monotonic()
+            start = "warm" if self.device is not None else "cold"
+            logger.info(f"▶️ Starting OAK camera streaming for first client ({start} device)")
             
-            # Start OAK device
-            if not self.start_oak_device():
+            # Boot the OAK device off the event loop; other clients keep being served meanwhile
+            if not await self.open_device():
                 try:
-                    await websocket.send(json.dumps({
+                    await websocket.send(self.codec.encode({
                         "type": "error",
                         "message": "Failed to start OAK camera"
                     }))
                 except:
                     pass
-                self.clients.remove(websocket)
+                self.clients.discard(websocket)
                 return
-            
-            # Start streaming
-            self.streaming = True
-            asyncio.create_task(self.stream_frames())
+        
+        if not self.streaming:
+            # Start streaming (unless a client that waited for the same boot already did)
+            self.start_streaming(arrived, start)
             
             # Send success message
             try:
-                await websocket.send(json.dumps({
+                await websocket.send(self.codec.encode({
                     "type": "connected",
                     "message": "OAK camera streaming started",
                     "resolution": "1280x720",
-                    "fps": 30
+                    "fps": 30,
+                    "codec": client_codec.wire,
+                    "encoder": self.encoder,
+                    "video": self.stream_config,
+                    "layers": describe_layers(self.layers or [], 1280, 720)
                 }))
             except:
                 pass
         else:
             # Send connection confirmation
             try:
-                await websocket.send(json.dumps({
+                await websocket.send(self.codec.encode({
                     "type": "connected", 
                     "message": "Connected to existing OAK stream",
                     "resolution": "1280x720",
-                    "fps": 30
+                    "fps": 30,
+                    "codec": client_codec.wire,
+                    "encoder": self.encoder,
+                    "video": self.stream_config,
+                    "layers": describe_layers(self.layers or [], 1280, 720)
                 }))
             except:
                 pass
         
+        # Frames flow through this client's own queue from here on
+        self.broadcaster.add_client(websocket)
+        
         try:
             # Keep connection alive and handle messages
             async for message in websocket:
                 try:
-                    data = json.loads(message)
+                    data = client_codec.decode(message)
                     if data.get('type') == 'ping':
-                        await websocket.send(json.dumps({"type": "pong"}))
-                except json.JSONDecodeError:
+                        await websocket.send(self.codec.encode({"type": "pong"}))
+                    elif data.get('type') == 'subscribe':
+                        await self.subscribe(websocket, data.get('layer'))
+                    elif data.get('type') == 'frame_timing':
+                        # Per-frame latency trailer appended to binary frames
+                        self.broadcaster.set_timing_trailer(websocket, bool(data.get('enabled', True)))
+                    elif data.get('type') == 'profiler':
+                        await websocket.send(self.codec.encode(profiler_command(data)))
+                except client_codec.DecodeError:
                     pass  # Ignore invalid JSON
                 except:
                     break
@@ -240,17 +521,44 @@ class OAKCameraBridge:
         finally:
             # Remove client
             self.clients.discard(websocket)
+            self.broadcaster.remove_client(websocket)
             logger.info(f"🔌 Client {client_addr} disconnected")
             
-            # Stop streaming if no clients left
-            if not self.clients and self.streaming:
-                logger.info("⏹️ No clients connected, stopping OAK streaming")
-                self.stop_oak_device()
+            # Stop streaming if no clients left; the device may stay open for the next client
+            if not self.clients and self.device is not None and self.linger_task is None:
+                self.stop_streaming()
+                await self.release_device()
     
-    async def start_server(self):
-        """Start the WebSocket server"""
+    async def subscribe(self, websocket, name):
+        """Switch a client to a simulcast layer"""
+        try:
+            layer = resolve_layer(self.layers or [], name, 1280, 720)
+        except KeyError:
+            await websocket.send(self.codec.encode({
+                "type": "error",
+                "message": f"Unknown layer: {name}"
+            }))
+            return
+        self.broadcaster.subscribe(websocket, layer)
+        size = next((entry["resolution"] for entry in describe_layers(self.layers or [], 1280, 720)
+                     if entry["name"] == layer), "1280x720")
+        logger.info(f"🎚️ Client {websocket.remote_address} subscribed to {name or 'source'} ({size})")
+        await websocket.send(self.codec.encode({
+            "type": "subscribed",
+            "layer": name or "source",
+            "resolution": size
+        }))
+    
+    async def start_server(self, profile=False, slow_callback=0.05):
+        """Start the WebSocket server
+
+        profile: start with the event loop profiler on
+        slow_callback: seconds the loop may be blocked before the profiler samples it
+        """
         logger.info(f"🚀 Starting OAK Camera WebSocket Bridge on port {self.port}")
-        logger.info("📡 Clients can connect to: ws://0.0.0.0:8766")
+        logger.info(f"📡 Clients can connect to: ws://0.0.0.0:{self.port}")
+        start_loop_lag_monitor()
+        install_profiler(profile, slow_callback)
         
         # Start WebSocket server
         async with websockets.serve(
@@ -259,51 +567,106 @@ class OAKCameraBridge:
             self.port,
             max_size=10**7,  # 10MB max message size for frames
             ping_timeout=20,
-            ping_interval=10
+            ping_interval=10,
+            subprotocols=supported_subprotocols(),
+            process_request=http_routes({"/latency": self.latency.snapshot, "/metrics": REGISTRY.render})
         ):
+            logger.info(f"📈 Metrics: http://0.0.0.0:{self.port}/metrics, frame latency: /latency")
             logger.info("✅ OAK Camera Bridge running... (Press Ctrl+C to stop)")
+            if self.always_warm and getattr(self, 'oak_available', True):
+                # Boot now so the first client does not wait for it
+                asyncio.create_task(self.open_device())
             await asyncio.Future()  # run forever
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description="OAK Camera WebSocket Bridge")
+    parser.add_argument("--port", type=int, default=8766, help="WebSocket server port")
+    parser.add_argument("--encode-workers", type=int, default=2, help="Frame encode pool size")
+    parser.add_argument("--encode-processes", action="store_true",
+                        help="Encode in worker processes instead of threads")
+    parser.add_argument("--encoder", choices=["jpeg", *DEVICE_ENCODERS], default="jpeg",
+                        help="jpeg: encode on the host; mjpeg/h264/h265: use the camera's hardware encoder")
+    parser.add_argument("--bitrate-kbps", type=int, default=4000, help="H.264/H.265 bitrate")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Adapt JPEG quality and resolution per client to its connection")
+    parser.add_argument("--simulcast", action="store_true",
+                        help="Offer several resolutions; clients pick one with a 'subscribe' message")
+    parser.add_argument("--layers", default="720p,360p,thumb",
+                        help="Simulcast layers (comma separated: 1080p, 720p, 360p, thumb)")
+    parser.add_argument("--linger", type=float, default=10.0,
+                        help="Seconds the device stays open after the last client leaves (0: close at once)")
+    parser.add_argument("--always-warm", action="store_true",
+                        help="Open the device at startup and keep it open without clients")
+    parser.add_argument("--mock-device", action="store_true",
+                        help="Use a simulated camera (oak_mock_device.py) instead of real hardware")
+    parser.add_argument("--mock-boot-seconds", type=float, default=0.0,
+                        help="Boot time the simulated camera takes to open")
+    add_profiler_arguments(parser)
+    args = parser.parse_args()
+    layers = None
+    if args.simulcast:
+        try:
+            layers = parse_layers(args.layers)
+        except ValueError as e:
+            parser.error(str(e))
+    
     print("🔶 OAK Camera WebSocket Bridge")
     print("=" * 40)
     
     # Check if OAK camera is available
     oak_available = False
-    try:
-        devices = dai.Device.getAllAvailableDevices()
-        if len(devices) == 0:
-            # Try direct connection
-            try:
-                with dai.Device() as device:
-                    print("✅ OAK camera detected (direct connection)")
-                    oak_available = True
-            except Exception as e:
-                print(f"⚠️  No OAK cameras found: {e}")
-                print("🔄 Starting bridge in 'no camera' mode - will keep running and retry connections")
-                oak_available = False
-        else:
-            print(f"✅ Found {len(devices)} OAK camera(s)")
-            for i, device in enumerate(devices):
-                print(f"  📷 Device {i}: {device.name} ({device.mxid})")
-            oak_available = True
+    device_factory = None
+    if args.mock_device:
+        from oak_mock_device import MockDevice
+        device_factory = functools.partial(MockDevice, encoder=args.encoder, boot_seconds=args.mock_boot_seconds)
+        print("🧪 Using mock OAK device")
+        oak_available = True
+    else:
+        try:
+            devices = dai.Device.getAllAvailableDevices()
+            if len(devices) == 0:
+                # Try direct connection
+                try:
+                    with dai.Device() as device:
+                        print("✅ OAK camera detected (direct connection)")
+                        oak_available = True
+                except Exception as e:
+                    print(f"⚠️  No OAK cameras found: {e}")
+                    print("🔄 Starting bridge in 'no camera' mode - will keep running and retry connections")
+                    oak_available = False
+            else:
+                print(f"✅ Found {len(devices)} OAK camera(s)")
+                for i, device in enumerate(devices):
+                    print(f"  📷 Device {i}: {device.name} ({device.mxid})")
+                oak_available = True
         
-    except Exception as e:
-        print(f"⚠️  Error detecting OAK cameras: {e}")
-        print("🔄 Starting bridge in 'no camera' mode - will keep running for Docker compatibility")
-        oak_available = False
+        except Exception as e:
+            print(f"⚠️  Error detecting OAK cameras: {e}")
+            print("🔄 Starting bridge in 'no camera' mode - will keep running for Docker compatibility")
+            oak_available = False
     
     # Create and start bridge (even without camera - important for Docker)
-    bridge = OAKCameraBridge(port=8766)
+    bridge = OAKCameraBridge(
+        port=args.port,
+        encode_workers=args.encode_workers,
+        encode_processes=args.encode_processes,
+        encoder=args.encoder,
+        bitrate_kbps=args.bitrate_kbps,
+        device_factory=device_factory,
+        adaptive=args.adaptive,
+        layers=layers,
+        linger=args.linger,
+        always_warm=args.always_warm
+    )
     bridge.oak_available = getattr(bridge, 'oak_available', oak_available)
     
-    print(f"🌐 Starting WebSocket server on port 8766...")
+    print(f"🌐 Starting WebSocket server on port {args.port}...")
     if not oak_available:
         print("📝 Note: Bridge will respond with 'no camera' messages until OAK camera is connected")
     
     try:
-        asyncio.run(bridge.start_server())
+        asyncio.run(bridge.start_server(args.profile, args.slow_callback_ms / 1000))
     except KeyboardInterrupt:
         print("\n🛑 Shutting down OAK Camera Bridge...")
         bridge.stop_oak_device()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Mock OAK Device
+
+Stands in for `dai.Device` so the OAK bridges can be exercised without a
+camera (CI, Docker without USB access, laptops):
+
+    python oak_camera_bridge.py --mock-device
+    python oak_camera_bridge.py --mock-device --encoder h264
+
+Output queues produce frames at the camera rate. In JPEG mode they are
+synthetic BGR preview frames, and in MJPEG mode real JPEG bitstreams. For
+H.264/H.265 the mock emits Annex B access units with the right NAL unit
+types and a keyframe every `keyframe_interval` frames. Their slice data is
+filler, so they exercise framing and keyframe handling but do not decode
+to a picture.
+"""
+
+import datetime
+import threading
+import time
+import cv2
+import numpy as np
+
+# NAL unit headers: (parameter sets, IDR slice, non-IDR slice)
+NAL_UNITS = {
+    'h264': ((b'\x67\x4d\x40\x1f', b'\x68\xee\x3c\x80'), b'\x65', b'\x41'),
+    'h265': ((b'\x40\x01', b'\x42\x01', b'\x44\x01'), b'\x26\x01', b'\x02\x01'),
+}
+START_CODE = b'\x00\x00\x00\x01'
+
+
+def synthetic_frame(width, height, index):
+    """Moving gradient with a frame counter, so motion is visible in a browser"""
+    x = np.linspace(0, 255, width, dtype=np.uint8)
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame[:, :, 0] = np.roll(x, index * 8)[None, :]
+    frame[:, :, 1] = 96
+    frame[:, :, 2] = np.linspace(0, 255, height, dtype=np.uint8)[:, None]
+    cv2.putText(frame, f"MOCK OAK {index}", (40, 80), cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
+    return frame
+
+
+class MockImgFrame:
+    """Preview frame, as returned by an XLinkOut queue fed by ColorCamera.preview"""
+
+    def __init__(self, frame, timestamp):
+        self.frame = frame
+        self.timestamp = timestamp
+
+    def getCvFrame(self):
+        return self.frame
+
+    def getData(self):
+        """Interleaved RGB bytes, as the preview produces with setInterleaved(True)"""
+        return np.ascontiguousarray(self.frame[:, :, ::-1]).reshape(-1)
+
+    def getWidth(self):
+        return self.frame.shape[1]
+
+    def getHeight(self):
+        return self.frame.shape[0]
+
+    def getTimestamp(self):
+        return self.timestamp
+
+
+class MockEncodedPacket:
+    """Bitstream packet, as returned by an XLinkOut queue fed by VideoEncoder.bitstream"""
+
+    def __init__(self, data, timestamp):
+        self.data = np.frombuffer(data, dtype=np.uint8)
+        self.timestamp = timestamp
+
+    def getData(self):
+        return self.data
+
+    def getTimestamp(self):
+        return self.timestamp
+
+
+class MockOutputQueue:
+    def __init__(self, device):
+        self.device = device
+        self.index = 0
+        self.next_time = None
+
+    def get(self):
+        """Block until the next frame is due; None once the device is closed"""
+        device = self.device
+        now = time.monotonic()
+        if self.next_time is None or now > self.next_time:
+            # Like the camera, frames come at fps from now on: an idle consumer gets no catch-up burst
+            self.next_time = now
+        delay = self.next_time - now
+        if delay > 0 and device.closed.wait(delay):
+            return None
+        if device.closed.is_set():
+            return None
+        self.next_time += 1.0 / device.fps
+        index = self.index
+        self.index += 1
+        # Like dai.Clock, timestamps are on the host's monotonic clock
+        timestamp = datetime.timedelta(seconds=time.monotonic())
+        return device.make_message(index, timestamp)
+
+    def tryGet(self):
+        if self.next_time is not None and time.monotonic() < self.next_time:
+            return None
+        return self.get()
+
+
+class MockDevice:
+    def __init__(self, pipeline=None, encoder="jpeg", width=1280, height=720, fps=30,
+                 keyframe_interval=30, boot_seconds=0.0):
+        """
+        pipeline: accepted for signature compatibility with dai.Device and ignored
+        encoder: 'jpeg' (preview frames), 'mjpeg', 'h264' or 'h265'
+        boot_seconds: how long opening blocks, like a real device uploading its firmware
+        """
+        if boot_seconds > 0:
+            time.sleep(boot_seconds)
+        self.encoder = encoder
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.keyframe_interval = keyframe_interval
+        self.closed = threading.Event()
+        self.queues = {}
+
+    def getOutputQueue(self, name, maxSize=4, blocking=False):
+        if name not in self.queues:
+            self.queues[name] = MockOutputQueue(self)
+        return self.queues[name]
+
+    def make_message(self, index, timestamp):
+        if self.encoder == "jpeg":
+            return MockImgFrame(synthetic_frame(self.width, self.height, index), timestamp)
+        if self.encoder == "mjpeg":
+            ok, buffer = cv2.imencode('.jpg', synthetic_frame(self.width, self.height, index))
+            return MockEncodedPacket(buffer.tobytes(), timestamp)
+        return MockEncodedPacket(self.access_unit(index), timestamp)
+
+    def access_unit(self, index):
+        parameter_sets, idr, non_idr = NAL_UNITS[self.encoder]
+        if index % self.keyframe_interval == 0:
+            units = list(parameter_sets) + [idr + b'\xaa' * 2000]
+        else:
+            units = [non_idr + b'\xaa' * 200]
+        return b''.join(START_CODE + unit for unit in units)
+
+    def close(self):
+        self.closed.set()
+
+    def isClosed(self):
+        return self.closed.is_set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -2,99 +2,234 @@
 """
 OAK Camera Bridge with Raw Frame Streaming
 Alternative version that sends raw frame data instead of JPEG
+
+The camera outputs interleaved RGB, so frames go out without host-side
+color conversion, and the header is sent as a separate fragment instead of
+being prepended to a copy of the pixels. --compress and --delta trade a
+little CPU for much less bandwidth on mostly static scenes (see
+raw_frame_codec.py for the wire format).
 """
 
 import asyncio
 import websockets
 import depthai as dai
-import cv2
 import json
-import numpy as np
 import logging
+import time
+import argparse
+import functools
+from frame_broadcaster import FrameBroadcaster
+from frame_pipeline import FramePipeline
+from frame_pacer import FramePacer
+from raw_frame_codec import RawFrameEncoder
+from metrics import REGISTRY, http_routes, start_loop_lag_monitor
+from loop_profiler import add_profiler_arguments, install_profiler, profiler_command
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
 
 class OAKRawFrameBridge:
-    def __init__(self, port=8767):  # Different port to avoid conflicts
+    def __init__(self, port=8767, compression=None, delta=False, tile=16, threshold=0,
+                 device_factory=None):
+        """
+        port: 8767 by default, to avoid conflicts with the JPEG bridge
+        compression: None, 'lz4' or 'zlib'
+        delta: send only the tiles that changed since the previous frame
+        device_factory: callable(pipeline) -> device, dai.Device by default
+                        (oak_mock_device.MockDevice for tests)
+        """
         self.port = port
         self.clients = set()
+        self.encoder = RawFrameEncoder(compression, delta, tile, threshold)
+        # Deltas depend on the frames before them: give them some slack before a client resyncs
+        self.broadcaster = FrameBroadcaster(queue_size=4 if delta else 1, on_disconnect=self.clients.discard)
+        self.device_factory = device_factory or dai.Device
+        REGISTRY.gauge('bridge_clients', "Connected WebSocket clients", function=lambda: len(self.clients))
         self.pipeline = None
         self.device = None
         self.streaming = False
         self.frame_queue = None
-        
+        self.frame_pipeline = None
+        self.pacer = FramePacer(30)
+
+    def setup_oak_pipeline(self):
+        """Camera pipeline producing interleaved RGB preview frames"""
+        self.pipeline = dai.Pipeline()
+        cam_rgb = self.pipeline.create(dai.node.ColorCamera)
+        xout = self.pipeline.create(dai.node.XLinkOut)
+        xout.setStreamName("rgb")
+        cam_rgb.setPreviewSize(1280, 720)
+        cam_rgb.setResolution(dai.ColorCameraProperties.SensorResolution.THE_1080_P)
+        # RGB888 interleaved is the wire format: the device does the conversion
+        cam_rgb.setInterleaved(True)
+        cam_rgb.setColorOrder(dai.ColorCameraProperties.ColorOrder.RGB)
+        cam_rgb.setFps(30)
+        cam_rgb.preview.link(xout.input)
+
+    def start_oak_device(self):
+        """Start OAK device connection"""
+        try:
+            if not self.pipeline:
+                self.setup_oak_pipeline()
+            logger.info("🔗 Connecting to OAK device...")
+            self.device = self.device_factory(self.pipeline)
+            self.frame_queue = self.device.getOutputQueue(name="rgb", maxSize=4, blocking=False)
+            logger.info("✅ OAK device connected successfully")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Error connecting to OAK device: {e}")
+            return False
+
+    def stop_oak_device(self):
+        """Stop OAK device"""
+        self.streaming = False
+        if self.frame_pipeline:
+            # Closing the device unblocks the capture thread's queue read
+            self.frame_pipeline.stop()
+            self.frame_pipeline = None
+        if self.device:
+            self.device.close()
+            self.device = None
+            self.frame_queue = None
+            logger.info("🔶 OAK device disconnected")
+
+    def read_raw_frame(self):
+        """Block for the next camera frame as (RGB data, width, height) (runs on the capture thread)"""
+        frame_queue = self.frame_queue
+        if frame_queue is None:
+            return None
+        in_rgb = frame_queue.get()
+        if in_rgb is None:
+            return None
+        return in_rgb.getData(), in_rgb.getWidth(), in_rgb.getHeight()
+
     async def stream_raw_frames(self):
         """Stream raw frame data to connected clients"""
-        while self.streaming and self.clients:
-            try:
-                # Get frame from OAK camera
-                in_rgb = self.frame_queue.get()
-                if in_rgb is None:
-                    await asyncio.sleep(0.001)
-                    continue
-                
-                # Get raw frame data
-                frame = in_rgb.getCvFrame()
-                
-                # Convert to format suitable for web (RGB)
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                
-                # Send raw frame data as binary
-                # Format: width(4) + height(4) + frame_data
-                height, width = frame_rgb.shape[:2]
-                frame_data = frame_rgb.tobytes()
-                
-                # Create header with dimensions
-                header = width.to_bytes(4, byteorder='little') + height.to_bytes(4, byteorder='little')
-                message = header + frame_data
-                
-                # Send to all connected clients
-                if self.clients:
-                    disconnected_clients = set()
-                    for client in self.clients.copy():
-                        try:
-                            await client.send(message)
-                        except websockets.exceptions.ConnectionClosed:
-                            disconnected_clients.add(client)
-                        except Exception as e:
-                            disconnected_clients.add(client)
-                    
-                    # Remove disconnected clients
-                    self.clients -= disconnected_clients
-                
-                # Control frame rate
-                await asyncio.sleep(0.033)  # ~30 FPS
-                
-            except Exception as e:
-                print(f"Error in frame streaming: {e}")
-                await asyncio.sleep(0.1)
+        # Compression and deltas run off the event loop; one worker keeps deltas in order
+        self.encoder.reset()
+        pipeline = FramePipeline(self.read_raw_frame, self.encoder, workers=1)
+        self.frame_pipeline = pipeline
+        pipeline.start()
+        self.pacer.reset()
+        last_report = time.time()
+
+        try:
+            while self.streaming and self.clients:
+                try:
+                    item = await pipeline.get()
+                    if item is None:
+                        break
+                    # Control frame rate: wait for the next ~30 FPS deadline
+                    await self.pacer.wait()
+                    message, keyframe = item
+                    # Hand the frame to every client's queue; slow clients drop stale frames
+                    self.broadcaster.publish(message, keyframe)
+
+                    current_time = time.time()
+                    if current_time - last_report >= 5.0:
+                        logger.info(f"📊 Streaming raw frames to {self.broadcaster.client_count} clients "
+                                    f"({self.pacer.summary()}, {self.encoder.stats()})")
+                        last_report = current_time
+                except Exception as e:
+                    logger.error(f"❌ Error in frame streaming: {e}")
+                    await asyncio.sleep(0.1)
+        finally:
+            pipeline.stop()
+            if self.frame_pipeline is pipeline:
+                self.frame_pipeline = None
 
     async def handle_client(self, websocket, path=None):
         """Handle WebSocket client connections"""
-        print(f"Raw frame client connected from {websocket.remote_address}")
+        logger.info(f"🔗 Raw frame client connected from {websocket.remote_address}")
         self.clients.add(websocket)
-        
+
+        # Start streaming if first client
+        if len(self.clients) == 1 and not self.streaming:
+            if not self.start_oak_device():
+                await websocket.send(json.dumps({
+                    "type": "error",
+                    "message": "Failed to start OAK camera"
+                }))
+                self.clients.discard(websocket)
+                return
+            self.streaming = True
+            asyncio.create_task(self.stream_raw_frames())
+
         # Send connection info
         await websocket.send(json.dumps({
             "type": "connected",
             "message": "Raw frame streaming",
             "format": "RGB888",
             "width": 1280,
-            "height": 720
+            "height": 720,
+            "encoding": self.encoder.describe()
         }))
-        
+        self.broadcaster.add_client(websocket)
+
         try:
-            # Start streaming if first client
-            if len(self.clients) == 1 and not self.streaming:
-                self.start_oak_device()
-                self.streaming = True
-                asyncio.create_task(self.stream_raw_frames())
-            
             # Keep connection alive
             async for message in websocket:
-                pass  # Handle client messages if needed
-                
+                try:
+                    data = json.loads(message)
+                except ValueError:
+                    continue
+                if isinstance(data, dict) and data.get('type') == 'profiler':
+                    await websocket.send(json.dumps(profiler_command(data)))
+
         except websockets.exceptions.ConnectionClosed:
             pass
         finally:
             self.clients.discard(websocket)
-            if not self.clients:
-                self.streaming = False
+            self.broadcaster.remove_client(websocket)
+            logger.info(f"🔌 Client {websocket.remote_address} disconnected")
+            if not self.clients and self.streaming:
+                self.stop_oak_device()
+
+    async def start_server(self, profile=False, slow_callback=0.05):
+        """Start the WebSocket server"""
+        logger.info(f"🚀 Starting OAK raw frame bridge on port {self.port}")
+        start_loop_lag_monitor()
+        install_profiler(profile, slow_callback)
+        async with websockets.serve(self.handle_client, "0.0.0.0", self.port, max_size=10**7,
+                                    process_request=http_routes({"/metrics": REGISTRY.render})):
+            await asyncio.Future()  # run forever
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OAK Camera Raw Frame Bridge")
+    parser.add_argument("--port", type=int, default=8767, help="WebSocket server port")
+    parser.add_argument("--compress", choices=["lz4", "zlib"],
+                        help="Lossless compression of each frame (lz4 needs the 'lz4' package)")
+    parser.add_argument("--delta", action="store_true",
+                        help="Send only the tiles that changed, with a full frame every second")
+    parser.add_argument("--tile", type=int, default=16, help="Delta tile size in pixels")
+    parser.add_argument("--threshold", type=int, default=0,
+                        help="Per-channel difference a delta ignores (0 keeps frames lossless)")
+    parser.add_argument("--mock-device", action="store_true",
+                        help="Use a simulated camera (oak_mock_device.py) instead of real hardware")
+    add_profiler_arguments(parser)
+    args = parser.parse_args()
+
+    device_factory = None
+    if args.mock_device:
+        from oak_mock_device import MockDevice
+        device_factory = functools.partial(MockDevice, encoder="jpeg")
+
+    bridge = OAKRawFrameBridge(
+        port=args.port,
+        compression=args.compress,
+        delta=args.delta,
+        tile=args.tile,
+        threshold=args.threshold,
+        device_factory=device_factory
+    )
+    try:
+        asyncio.run(bridge.start_server(args.profile, args.slow_callback_ms / 1000))
+    except KeyboardInterrupt:
+        print("\n🛑 Shutting down OAK raw frame bridge...")
+        bridge.stop_oak_device()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Compressed Video Passthrough
+
+Demuxes a video file with PyAV (optional `av` package) and forwards its
+existing H.264 / VP8 / VP9 / AV1 packets to clients, with no decoding and
+no re-encoding on the server. Browsers decode them with WebCodecs. The OAK
+bridge sends the bitstream of the camera's hardware encoder the same way.
+
+Clients first receive a text "stream_config" message (also embedded in the
+"connected" reply as "video"):
+
+    {"type": "stream_config", "stream_id": 3, "codec": "avc1.64001f",
+     "width": 1280, "height": 720, "fps": 25.0, "description": "<base64>"}
+
+which maps directly onto VideoDecoder.configure() (description is the avcC
+record for H.264 from MP4 files and omitted for Annex B streams and other
+codecs). Every binary frame is then one packet:
+
+    offset  size  field
+    0       4     magic b"VPKT"
+    4       1     flags (bit 0: keyframe)
+    5       1     reserved
+    6       2     stream_id (uint16 LE), matches stream_config
+    8       8     timestamp in microseconds (int64 LE)
+    16      4     duration in microseconds (uint32 LE)
+    20      ...   packet payload (EncodedVideoChunk data)
+
+Timestamps keep increasing across loops of the file and seeks, which
+restart at the keyframe at or before the target. A new stream_id is
+announced whenever the file changes, so clients can drop packets that
+belong to the previous stream.
+"""
+
+import base64
+import logging
+import struct
+
+try:
+    import av
+except ImportError:
+    av = None
+
+logger = logging.getLogger(__name__)
+
+PACKET_MAGIC = b'VPKT'
+PACKET_HEADER = struct.Struct('<4sBBHqI')
+FLAG_KEYFRAME = 0x01
+
+
+def passthrough_available():
+    return av is not None
+
+
+def webcodecs_codec(codec_name, extradata):
+    """WebCodecs codec string and decoder description; (None, None) if unsupported"""
+    if codec_name == 'h264':
+        # MP4/MKV carry an avcC record: version, profile, compatibility, level
+        if extradata and len(extradata) >= 4 and extradata[0] == 1:
+            return f"avc1.{extradata[1]:02x}{extradata[2]:02x}{extradata[3]:02x}", bytes(extradata)
+        return None, None
+    if codec_name == 'vp8':
+        return 'vp8', None
+    if codec_name == 'vp9':
+        return 'vp09.00.10.08', None
+    if codec_name == 'av1':
+        return 'av01.0.08M.08', None
+    return None, None
+
+
+def is_annexb_keyframe(data, codec):
+    """Whether an Annex B H.264/H.265 access unit starts with an IDR/IRAP picture"""
+    start = data.find(b'\x00\x00\x01')
+    while start != -1 and start + 3 < len(data):
+        header = data[start + 3]
+        if codec == 'h264':
+            nal_type = header & 0x1F
+            if 1 <= nal_type <= 5:  # First slice decides
+                return nal_type == 5
+        else:
+            nal_type = (header >> 1) & 0x3F
+            if nal_type < 32:
+                return 16 <= nal_type <= 23
+        start = data.find(b'\x00\x00\x01', start + 3)
+    return False
+
+
+def encode_packet(packet):
+    """Frame a demuxed packet for the wire; returns (bytes, keyframe)"""
+    payload, timestamp, duration, keyframe, stream_id = packet
+    header = PACKET_HEADER.pack(
+        PACKET_MAGIC,
+        FLAG_KEYFRAME if keyframe else 0,
+        0,
+        stream_id & 0xFFFF,
+        int(timestamp * 1_000_000),
+        max(0, int(duration * 1_000_000))
+    )
+    return header + payload, keyframe
+
+
+class PacketSource:
+    """Loops over the compressed packets of a video file's first video stream"""
+
+    def __init__(self, path, stream_id=0):
+        self.path = path
+        self.stream_id = stream_id
+        self.container = av.open(path)
+        try:
+            self.stream = self.container.streams.video[0]
+        except IndexError:
+            self.container.close()
+            raise ValueError(f"No video stream in {path}")
+        context = self.stream.codec_context
+        self.codec_name = context.name
+        self.codec, self.description = webcodecs_codec(self.codec_name, context.extradata)
+        self.width = context.width
+        self.height = context.height
+        rate = self.stream.average_rate or self.stream.guessed_rate
+        self.fps = float(rate) if rate else 30.0
+        self.time_base = self.stream.time_base
+        self.packets = self.container.demux(self.stream)
+        self.offset = 0.0    # Added to timestamps so they keep increasing across loops and seeks
+        self.loop_end = 0.0
+        self.rebase = False  # After a seek: continue the timeline from the next packet
+
+    @classmethod
+    def open(cls, path, stream_id=0):
+        """Passthrough source for a file, or None when the file cannot be passed through"""
+        if av is None:
+            logger.warning("⚠️ Passthrough needs the optional 'av' package (pip install av), falling back to JPEG")
+            return None
+        try:
+            source = cls(path, stream_id)
+        except Exception as e:
+            logger.warning(f"⚠️ Cannot demux {path} for passthrough ({e}), falling back to JPEG")
+            return None
+        if source.codec is None:
+            logger.warning(f"⚠️ {source.codec_name} cannot be passed through to WebCodecs, falling back to JPEG")
+            source.close()
+            return None
+        return source
+
+    def config(self):
+        """stream_config message body"""
+        config = {
+            "stream_id": self.stream_id,
+            "codec": self.codec,
+            "width": self.width,
+            "height": self.height,
+            "fps": self.fps
+        }
+        if self.description:
+            config["description"] = base64.b64encode(self.description).decode('ascii')
+        return config
+
+    def read_packet(self):
+        """Next packet as (payload, timestamp, duration, keyframe, stream_id); loops at end of file
+
+        Blocking; runs on the pipeline's capture thread.
+        """
+        for _ in range(2):
+            for packet in self.packets:
+                if packet.size == 0:
+                    continue  # Demuxer flush packet
+                pts = packet.pts if packet.pts is not None else packet.dts
+                timestamp = float(pts * self.time_base) if pts is not None else self.loop_end - self.offset
+                duration = float(packet.duration * self.time_base) if packet.duration else 1.0 / self.fps
+                if self.rebase:
+                    self.offset = self.loop_end - timestamp
+                    self.rebase = False
+                timestamp += self.offset
+                self.loop_end = max(self.loop_end, timestamp + duration)
+                return bytes(packet), timestamp, duration, packet.is_keyframe, self.stream_id
+            logger.info("🔄 Reached end of video, restarting from beginning.")
+            self.container.seek(0)
+            self.offset = self.loop_end
+            self.packets = self.container.demux(self.stream)
+        logger.error("❌ Could not read any packet from video file")
+        return None
+
+    def seek(self, seconds):
+        """Continue from the keyframe at or before a media time (blocking; capture thread)"""
+        target = int(seconds / self.time_base) + (self.stream.start_time or 0)
+        self.container.seek(target, stream=self.stream, backward=True, any_frame=False)
+        self.packets = self.container.demux(self.stream)
+        self.rebase = True
+
+    def close(self):
+        self.container.close()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Raw Frame Codec
+
+Wire formats of the raw frame bridge (oak_raw_bridge_example.py). Frames
+arrive from the camera as interleaved RGB, so no host-side color conversion
+or copy is needed. The header and the pixel data are handed to websockets
+as separate fragments of one message instead of being concatenated.
+
+Plain mode keeps the original layout:
+
+    width (uint32 LE) | height (uint32 LE) | RGB888 pixels
+
+With compression (--compress lz4|zlib) or tile deltas (--delta) every
+message starts with a 16 byte header instead:
+
+    offset  size  field
+    0       4     magic b"RAWD"
+    4       1     flags (bit 0: keyframe)
+    5       1     compression (0 none, 1 lz4 frame, 2 zlib)
+    6       2     tile size in pixels (uint16 LE)
+    8       2     width (uint16 LE)
+    10      2     height (uint16 LE)
+    12      4     body length before compression (uint32 LE)
+    16      ...   body
+
+A keyframe body is the whole RGB888 frame. A delta body is a bitmap of the
+tiles that changed (row-major, one bit per tile, least significant bit
+first) followed by the RGB888 pixels of those tiles, each tile row-major.
+Tiles whose pixels all differ from the client's copy by no more than the
+threshold are left out, so a mostly static scene costs a few kilobytes per
+frame. A keyframe is sent every `keyframe_interval` frames; a client that
+misses a delta waits for it (see FrameBroadcaster).
+"""
+
+import logging
+import struct
+import zlib
+import cv2
+import numpy as np
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+logger = logging.getLogger(__name__)
+
+RAW_HEADER = struct.Struct('<II')           # width, height
+DELTA_MAGIC = b'RAWD'
+DELTA_HEADER = struct.Struct('<4sBBHHHI')
+FLAG_KEYFRAME = 0x01
+COMPRESSION_IDS = {None: 0, 'lz4': 1, 'zlib': 2}
+
+
+def available_compression(name):
+    """Compression to use for a requested one; zlib stands in when lz4 is not installed"""
+    if name == 'lz4' and lz4 is None:
+        logger.warning("⚠️ lz4 compression needs the optional 'lz4' package (pip install lz4), using zlib")
+        return 'zlib'
+    return name
+
+
+class RawFrameEncoder:
+    """Frames interleaved RGB camera data for the wire; returns (message parts, keyframe)
+
+    Stateful when delta encoding: frames must be encoded one at a time, in order.
+    """
+
+    def __init__(self, compression=None, delta=False, tile=16, threshold=0, keyframe_interval=30):
+        """
+        compression: None, 'lz4' or 'zlib'
+        delta: send only the tiles that changed since the previous frame
+        tile: tile edge in pixels; frames whose size is not a multiple are sent whole
+        threshold: largest per-channel difference still treated as unchanged (0 is lossless)
+        """
+        self.compression = available_compression(compression)
+        self.delta = delta
+        self.tile = tile
+        self.threshold = threshold
+        self.keyframe_interval = keyframe_interval
+        self.reference = None  # The frame as clients have it after the last message
+        self.frames = 0
+        self.tiles_sent = 0
+        self.tiles_total = 0
+
+    def reset(self):
+        """Start a new stream: the next frame is a keyframe"""
+        self.reference = None
+        self.frames = 0
+
+    @property
+    def plain(self):
+        """Whether frames use the original width/height header"""
+        return self.compression is None and not self.delta
+
+    def describe(self):
+        """Encoding details for the connected message"""
+        if self.plain:
+            return {"header": "size"}
+        return {
+            "header": DELTA_MAGIC.decode('ascii'),
+            "compression": self.compression,
+            "delta": self.delta,
+            "tile": self.tile,
+            "keyframe_interval": self.keyframe_interval if self.delta else 1
+        }
+
+    def __call__(self, item):
+        data, width, height = item
+        if self.plain:
+            # Header and pixels go out as fragments of one message: the frame is never copied here
+            return [RAW_HEADER.pack(width, height), memoryview(data)], True
+
+        frame = np.asarray(data).reshape(height, width, 3)
+        tile = self.tile
+        keyframe = (
+            not self.delta
+            or self.reference is None
+            or self.reference.shape != frame.shape
+            or self.frames % self.keyframe_interval == 0
+            or width % tile or height % tile
+        )
+        self.frames += 1
+        if keyframe:
+            if self.delta:
+                self.reference = frame.copy()
+            parts = [memoryview(frame).cast('B')]
+        else:
+            parts = self._delta(frame, width, height)
+
+        length = sum(memoryview(part).nbytes for part in parts)
+        if self.compression:
+            body = parts[0] if len(parts) == 1 else b''.join(parts)
+            if self.compression == 'lz4':
+                parts = [lz4.frame.compress(body)]
+            else:
+                parts = [zlib.compress(body, 1)]
+        header = DELTA_HEADER.pack(
+            DELTA_MAGIC,
+            FLAG_KEYFRAME if keyframe else 0,
+            COMPRESSION_IDS[self.compression],
+            tile, width, height, length
+        )
+        return [header, *parts], keyframe
+
+    def _delta(self, frame, width, height):
+        tile = self.tile
+        rows, columns = height // tile, width // tile
+        difference = cv2.absdiff(frame, self.reference)
+        changed = difference.reshape(rows, tile, columns, tile * 3).max(axis=(1, 3)) > self.threshold
+        frame_tiles = frame.reshape(rows, tile, columns, tile, 3).swapaxes(1, 2)
+        pixels = frame_tiles[changed]  # Copies only the changed tiles
+        # Clients now hold these tiles: later deltas are measured against them
+        self.reference.reshape(rows, tile, columns, tile, 3).swapaxes(1, 2)[changed] = pixels
+        self.tiles_sent += len(pixels)
+        self.tiles_total += changed.size
+        bitmap = np.packbits(changed, bitorder='little')
+        return [bitmap.tobytes(), memoryview(np.ascontiguousarray(pixels)).cast('B')]
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'tiles_sent': self.tiles_sent,
+            'tiles_total': self.tiles_total
+        }
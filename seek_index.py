@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Keyframe Seek Index
+
+Where the keyframes of a video file are, so the video file bridge can seek
+by landing on the keyframe at or before the target and decoding forward
+only the rest of that GOP. Building an index demuxes the file once without
+decoding anything (needs the optional 'av' package, like packet
+passthrough); a long recording takes about a second. Indexes are kept in
+memory and saved as small JSON files in a cache directory, keyed by the
+file's path, mtime and size, so each file is only indexed once.
+
+Frame numbers follow OpenCV's CAP_PROP_POS_FRAMES: presentation time
+multiplied by the frame rate.
+"""
+
+import bisect
+import hashlib
+import json
+import logging
+import os
+
+try:
+    import av
+except ImportError:
+    av = None
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = '.seek.json'
+
+
+class SeekIndex:
+    def __init__(self, fps, frames, keyframes):
+        """
+        fps: frame rate frame numbers are counted in
+        frames: frames in the file
+        keyframes: sorted frame numbers of the keyframes
+        """
+        self.fps = fps
+        self.frames = frames
+        self.keyframes = keyframes or [0]
+
+    @property
+    def duration(self):
+        return self.frames / self.fps if self.fps else 0.0
+
+    def frame_at(self, seconds):
+        """Frame number shown at a media time, within the file"""
+        frame = int(round(seconds * self.fps)) if self.fps else 0
+        return min(max(0, frame), max(0, self.frames - 1))
+
+    def keyframe_before(self, frame):
+        """Last keyframe at or before a frame, where decoding toward it has to start"""
+        position = bisect.bisect_right(self.keyframes, frame)
+        return self.keyframes[position - 1] if position else self.keyframes[0]
+
+    def nearest_keyframe(self, frame):
+        """Keyframe closest to a frame, for seeks that need no decoding forward"""
+        position = bisect.bisect_left(self.keyframes, frame)
+        candidates = self.keyframes[max(0, position - 1):position + 1]
+        return min(candidates, key=lambda keyframe: abs(keyframe - frame))
+
+    def to_dict(self):
+        return {'version': INDEX_VERSION, 'fps': self.fps, 'frames': self.frames, 'keyframes': self.keyframes}
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != INDEX_VERSION:
+            raise ValueError("Unsupported seek index version")
+        return cls(float(data['fps']), int(data['frames']), [int(frame) for frame in data['keyframes']])
+
+
+def build_seek_index(path):
+    """Demux a file's first video stream into a SeekIndex; None without 'av' or on failure
+
+    Blocking; run it off the event loop.
+    """
+    if av is None:
+        return None
+    try:
+        with av.open(path) as container:
+            stream = container.streams.video[0]
+            rate = stream.average_rate or stream.guessed_rate
+            fps = float(rate) if rate else 30.0
+            time_base = stream.time_base
+            start = stream.start_time or 0
+            frames = 0
+            keyframes = set()
+            for packet in container.demux(stream):
+                if packet.size == 0:
+                    continue  # Demuxer flush packet
+                frames += 1
+                pts = packet.pts if packet.pts is not None else packet.dts
+                if packet.is_keyframe and pts is not None:
+                    keyframes.add(max(0, int(round(float((pts - start) * time_base) * fps))))
+    except Exception as e:
+        logger.warning(f"⚠️ Cannot index {path} for seeking: {e}")
+        return None
+    return SeekIndex(fps, frames, sorted(keyframes))
+
+
+class SeekIndexCache:
+    """Seek indexes by file, in memory and (optionally) on disk"""
+
+    def __init__(self, directory='.seek_index'):
+        self.directory = directory
+        self.indexes = {}
+
+    @staticmethod
+    def make_key(path):
+        """Key of a file's current contents; None if the file cannot be stat'ed"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+    def index_path(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:20]
+        return os.path.join(self.directory, digest + INDEX_SUFFIX)
+
+    def get(self, path):
+        """Index of a file, built and saved the first time it is asked for (blocking)"""
+        key = self.make_key(path)
+        if key is None:
+            return None
+        index = self.indexes.get(key)
+        if index is not None:
+            return index
+        if self.directory:
+            try:
+                with open(self.index_path(key), 'r', encoding='utf-8') as f:
+                    index = SeekIndex.from_dict(json.load(f))
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logger.warning(f"⚠️ Rebuilding unreadable seek index for {path}: {e}")
+        if index is None:
+            index = build_seek_index(path)
+            if index is None:
+                return None
+            logger.info(f"🧭 Indexed {path}: {index.frames} frames, {len(index.keyframes)} keyframes")
+            self.save(key, index)
+        self.indexes[key] = index
+        return index
+
+    def save(self, key, index):
+        if not self.directory:
+            return
+        path = self.index_path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            # Created on the first index saved, not when the bridge starts
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(index.to_dict(), f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not save seek index {path}: {e}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
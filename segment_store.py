@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped Segment Store
+
+A compact container of pre-encoded frames for the video file bridge: one
+contiguous run of payloads (JPEG by default) followed by an offset/timestamp
+index and a small JSON metadata block. Stores are built ahead of time with
+
+    python video_file_bridge.py build-store my_clip.mp4
+
+and sit next to the source file as `my_clip.mp4.wseg` (or in the directory
+given to both build-store and the bridge with --store-dir). Opening a stream then
+only maps the file: frames are sent as zero-copy slices of the map, and
+every bridge on the host shares the same page cache for the asset.
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import cv2
+
+from frame_pipeline import encode_jpeg
+
+logger = logging.getLogger(__name__)
+
+STORE_MAGIC = b'WSEG'
+STORE_VERSION = 1
+STORE_SUFFIX = '.wseg'
+INDEX_ENTRY = struct.Struct('<QId')   # payload offset, payload length, timestamp (s)
+FOOTER = struct.Struct('<QII4s')      # index offset, frame count, metadata length, magic
+
+
+def default_store_path(video_file, store_dir=None):
+    """Where the segment store for a video file lives: next to it, or by file name in store_dir"""
+    if store_dir:
+        return os.path.join(store_dir, os.path.basename(video_file) + STORE_SUFFIX)
+    return video_file + STORE_SUFFIX
+
+
+class SegmentStore:
+    """Read-only view of a segment store file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self.file.close()
+            raise
+        try:
+            self._read_index()
+        except Exception:
+            self.close()
+            raise
+
+    def _read_index(self):
+        if len(self.map) < FOOTER.size:
+            raise ValueError(f"Not a segment store: {self.path}")
+        index_offset, count, meta_len, magic = FOOTER.unpack_from(self.map, len(self.map) - FOOTER.size)
+        if magic != STORE_MAGIC:
+            raise ValueError(f"Not a segment store: {self.path}")
+        meta_offset = index_offset + count * INDEX_ENTRY.size
+        self.metadata = json.loads(bytes(self.map[meta_offset:meta_offset + meta_len]))
+        if self.metadata.get('version') != STORE_VERSION:
+            raise ValueError(f"Unsupported segment store version in {self.path}")
+        self.offsets = []
+        self.timestamps = []
+        for i in range(count):
+            offset, length, timestamp = INDEX_ENTRY.unpack_from(self.map, index_offset + i * INDEX_ENTRY.size)
+            self.offsets.append((offset, length))
+            self.timestamps.append(timestamp)
+        self.nbytes = index_offset
+        self.view = memoryview(self.map)
+
+    @classmethod
+    def open_for(cls, video_file, store_dir=None):
+        """Open the store built for a video file; None if there is none or it is stale
+
+        store_dir: look there first, then next to the file
+        """
+        paths = [default_store_path(video_file, store_dir)] if store_dir else []
+        paths.append(default_store_path(video_file))
+        path = next((path for path in paths if os.path.exists(path)), None)
+        if path is None:
+            return None
+        try:
+            store = cls(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Ignoring segment store {path}: {e}")
+            return None
+        if not len(store):
+            logger.warning(f"⚠️ Ignoring empty segment store {path}")
+            store.close()
+            return None
+        if not store.matches(video_file):
+            logger.info(f"📦 Segment store {path} is older than {video_file}, ignoring it")
+            store.close()
+            return None
+        return store
+
+    def matches(self, video_file):
+        """Whether the store was built from the current contents of a video file"""
+        try:
+            stat = os.stat(video_file)
+        except OSError:
+            return True  # Store without its source is still playable
+        return (self.metadata.get('source_mtime_ns') == stat.st_mtime_ns
+                and self.metadata.get('source_size') == stat.st_size)
+
+    @property
+    def codec(self):
+        return self.metadata.get('codec', 'jpeg')
+
+    @property
+    def width(self):
+        return self.metadata.get('width', 0)
+
+    @property
+    def height(self):
+        return self.metadata.get('height', 0)
+
+    @property
+    def fps(self):
+        return self.metadata.get('fps', 30.0)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def frame(self, index):
+        """Payload of a frame as a zero-copy slice of the map"""
+        offset, length = self.offsets[index]
+        return self.view[offset:offset + length]
+
+    def timestamp(self, index):
+        return self.timestamps[index]
+
+    def close(self):
+        if self.map is None:
+            return
+        self.view = None
+        try:
+            self.map.close()
+        except BufferError:
+            pass  # Frames still queued for sending; the map is released with them
+        self.map = None
+        self.file.close()
+
+
+def write_segment_store(path, frames, metadata):
+    """Write (payload, timestamp) pairs as a segment store; returns the frame count"""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    entries = []
+    offset = 0
+    try:
+        with open(temp_path, 'wb') as f:
+            for payload, timestamp in frames:
+                f.write(payload)
+                entries.append((offset, len(payload), timestamp))
+                offset += len(payload)
+            for entry in entries:
+                f.write(INDEX_ENTRY.pack(*entry))
+            meta = json.dumps(dict(metadata, version=STORE_VERSION)).encode('utf-8')
+            f.write(meta)
+            f.write(FOOTER.pack(offset, len(entries), len(meta), STORE_MAGIC))
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return len(entries)
+
+
+def build_segment_store(video_file, store_dir=None, quality=85):
+    """Decode a video file once and store its JPEG-encoded frames; returns the store path
+
+    store_dir: write the store there instead of next to the file (the bridge needs the same --store-dir)
+    """
+    output = default_store_path(video_file, store_dir)
+    if store_dir:
+        os.makedirs(store_dir, exist_ok=True)
+    capture = cv2.VideoCapture(video_file)
+    if not capture.isOpened():
+        raise ValueError(f"Cannot open video file: {video_file}")
+    stat = os.stat(video_file)
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    metadata = {
+        'source': os.path.basename(video_file),
+        'source_mtime_ns': stat.st_mtime_ns,
+        'source_size': stat.st_size,
+        'codec': 'jpeg',
+        'quality': quality,
+        'width': int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        'height': int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        'fps': fps
+    }
+
+    def frames():
+        index = 0
+        while True:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            timestamp = capture.get(cv2.CAP_PROP_POS_MSEC) / 1000.0 or index / fps
+            yield encode_jpeg(frame, quality), timestamp
+            index += 1
+
+    try:
+        count = write_segment_store(output, frames(), metadata)
+    finally:
+        capture.release()
+    logger.info(f"📦 Built segment store {output}: {count} frames")
+    return output
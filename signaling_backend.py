@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Signaling Backends
+
+Room membership and cross-node message relay for WebRTCSignalingServer.
+
+- InMemoryBackend: a single process owns every room (the default).
+- PubSubBackend: several signaling nodes share rooms through a
+  signaling_broker.py process, reached over TCP or a Unix socket.
+
+The server always delivers to its own local connections; a backend only
+tracks cluster-wide membership and forwards to the other nodes.
+"""
+
+import asyncio
+import json
+import logging
+import itertools
+import os
+import socket
+
+from signaling_broker import BUS_LINE_LIMIT, encode_line, parse_broker_url
+
+logger = logging.getLogger(__name__)
+
+
+class SignalingBackend:
+    """Interface every signaling backend implements"""
+
+    async def start(self, on_room, on_user):
+        """on_room(room, payload, exclude_user) / on_user(user_id, payload) receive relayed messages"""
+
+    async def join(self, room, user_id):
+        """Record membership; returns the room size"""
+        raise NotImplementedError
+
+    async def leave(self, room, user_id):
+        """Remove membership; returns how many members remain"""
+        raise NotImplementedError
+
+    def publish_room(self, room, payload, exclude_user=None):
+        """Relay a serialized room broadcast to members on other nodes"""
+
+    async def publish_user(self, room, user_id, payload):
+        """Relay a serialized message to a room member on another node; False if not found"""
+        return False
+
+    async def wait_closed(self):
+        """Return once the backend can no longer serve requests"""
+        await asyncio.Future()
+
+    async def close(self):
+        pass
+
+
+class InMemoryBackend(SignalingBackend):
+    """Single-process backend: every room member is local"""
+
+    def __init__(self):
+        self.rooms = {}  # room -> set of user_ids
+
+    async def join(self, room, user_id):
+        members = self.rooms.setdefault(room, set())
+        members.add(user_id)
+        return len(members)
+
+    async def leave(self, room, user_id):
+        members = self.rooms.get(room)
+        if members is None:
+            return 0
+        members.discard(user_id)
+        if not members:
+            del self.rooms[room]
+            return 0
+        return len(members)
+
+
+class PubSubBackend(SignalingBackend):
+    """Shares rooms with other nodes through a signaling broker"""
+
+    def __init__(self, url, node_id=None, request_timeout=5.0):
+        """
+        request_timeout: seconds to wait for the broker's reply to a join, leave or targeted message
+        """
+        self.url = url
+        self.node_id = node_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.request_timeout = request_timeout
+        self.connected = False
+        self.reader = None
+        self.writer = None
+        self.pending = {}
+        self.request_ids = itertools.count()
+        self.on_room = None
+        self.on_user = None
+        self.read_task = None
+
+    async def start(self, on_room, on_user):
+        self.on_room = on_room
+        self.on_user = on_user
+        kind, address = parse_broker_url(self.url)
+        if kind == "unix":
+            self.reader, self.writer = await asyncio.open_unix_connection(address, limit=BUS_LINE_LIMIT)
+        else:
+            self.reader, self.writer = await asyncio.open_connection(address[0], address[1], limit=BUS_LINE_LIMIT)
+        self.writer.write(encode_line({'op': 'hello', 'node': self.node_id}))
+        await self.writer.drain()
+        self.connected = True
+        self.read_task = asyncio.create_task(self.read_loop())
+        logger.info(f"🧩 Node {self.node_id} connected to signaling broker {self.url}")
+
+    async def read_loop(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                op = message.get('op')
+                if op == 'reply':
+                    future = self.pending.pop(message['req'], None)
+                    if future and not future.done():
+                        future.set_result(message)
+                elif op == 'deliver_room':
+                    asyncio.create_task(self.on_room(message['room'], message['payload'], message.get('exclude_user')))
+                elif op == 'deliver_user':
+                    asyncio.create_task(self.on_user(message['user'], message['payload']))
+        except Exception as e:
+            logger.error(f"❌ Broker link error on node {self.node_id}: {e}")
+        finally:
+            # Nothing reconnects: pending and later requests fail instead of waiting forever
+            self.connected = False
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Signaling broker went away"))
+            self.pending.clear()
+            logger.error(f"❌ Node {self.node_id} lost its signaling broker connection")
+
+    def publish(self, message):
+        self.writer.write(encode_line(message))
+
+    async def request(self, message):
+        """Send a request to the broker and wait for its reply
+
+        Raises ConnectionError once the broker link is gone and asyncio.TimeoutError
+        if the broker does not answer within request_timeout.
+        """
+        if not self.connected:
+            raise ConnectionError("Not connected to the signaling broker")
+        req = next(self.request_ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[req] = future
+        message['req'] = req
+        self.publish(message)
+        try:
+            return await asyncio.wait_for(future, self.request_timeout)
+        finally:
+            self.pending.pop(req, None)
+
+    async def join(self, room, user_id):
+        reply = await self.request({'op': 'join', 'room': room, 'user': user_id})
+        return reply['users']
+
+    async def leave(self, room, user_id):
+        reply = await self.request({'op': 'leave', 'room': room, 'user': user_id})
+        return reply['users']
+
+    def publish_room(self, room, payload, exclude_user=None):
+        self.publish({'op': 'room', 'room': room, 'exclude_user': exclude_user, 'payload': payload})
+
+    async def publish_user(self, room, user_id, payload):
+        reply = await self.request({'op': 'user', 'room': room, 'user': user_id, 'payload': payload})
+        return reply['ok']
+
+    async def wait_closed(self):
+        await self.read_task
+
+    async def close(self):
+        if self.read_task:
+            self.read_task.cancel()
+        if self.writer:
+            self.writer.close()
+
+
+def create_backend(name, broker_url=None, node_id=None):
+    """Build a backend from command line options"""
+    if name == "memory":
+        return InMemoryBackend()
+    if name == "pubsub":
+        if not broker_url:
+            raise ValueError("The pubsub backend needs a broker URL (e.g. tcp://127.0.0.1:8790)")
+        return PubSubBackend(broker_url, node_id=node_id)
+    raise ValueError(f"Unknown signaling backend: {name}")
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Signaling Pub/Sub Broker
+
+Small stand-alone broker that lets several signaling nodes share rooms. It
+keeps the room registry (room -> user -> node) and relays room broadcasts and
+targeted messages to the nodes that hold the recipients.
+
+Used over a Unix socket by the sharded server (signaling_cluster.py) and over
+TCP by independent websocket_server.py instances behind a load balancer:
+
+    python signaling_broker.py --port 8790
+    python websocket_server.py --backend pubsub --broker tcp://127.0.0.1:8790
+
+Protocol: one JSON object per line.
+    node -> broker: hello, join, leave, room, user
+    broker -> node: reply, deliver_room, deliver_user
+"""
+
+import asyncio
+import json
+import logging
+import os
+import argparse
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# SDP offers can be large; allow generous lines on the bus
+BUS_LINE_LIMIT = 16 * 1024 * 1024
+
+
+def encode_line(message):
+    return (json.dumps(message) + "\n").encode()
+
+
+def parse_broker_url(url):
+    """Split 'unix:/path' or 'tcp://host:port' into (kind, address)"""
+    if url.startswith("unix:"):
+        return "unix", url[len("unix:"):]
+    if url.startswith("tcp://"):
+        host, _, port = url[len("tcp://"):].rpartition(":")
+        return "tcp", (host or "127.0.0.1", int(port))
+    raise ValueError(f"Unsupported broker URL: {url}")
+
+
+class SignalingBroker:
+    """Shared room registry and cross-node relay"""
+
+    def __init__(self, url):
+        self.url = url
+        self.rooms = {}    # room -> {user_id: node_id}
+        self.nodes = {}    # node_id -> StreamWriter
+        self.server = None
+
+    async def start(self):
+        kind, address = parse_broker_url(self.url)
+        if kind == "unix":
+            self.server = await asyncio.start_unix_server(self.handle_node, path=address, limit=BUS_LINE_LIMIT)
+        else:
+            self.server = await asyncio.start_server(self.handle_node, address[0], address[1], limit=BUS_LINE_LIMIT)
+        logger.info(f"🧭 Signaling broker listening on {self.url}")
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        kind, address = parse_broker_url(self.url)
+        if kind == "unix" and os.path.exists(address):
+            os.unlink(address)
+
+    def send(self, node_id, message):
+        writer = self.nodes.get(node_id)
+        if writer and not writer.is_closing():
+            writer.write(encode_line(message))
+
+    def nodes_in_room(self, room, skip_node=None):
+        return {node for node in self.rooms.get(room, {}).values() if node != skip_node}
+
+    def remove_member(self, room, user_id):
+        """Drop a member and return how many remain"""
+        members = self.rooms.get(room)
+        if members is None:
+            return 0
+        members.pop(user_id, None)
+        if not members:
+            del self.rooms[room]
+            return 0
+        return len(members)
+
+    def handle_request(self, node_id, message):
+        op = message.get('op')
+
+        if op == 'join':
+            members = self.rooms.setdefault(message['room'], {})
+            members[message['user']] = node_id
+            self.send(node_id, {'op': 'reply', 'req': message['req'], 'users': len(members)})
+
+        elif op == 'leave':
+            remaining = self.remove_member(message['room'], message['user'])
+            self.send(node_id, {'op': 'reply', 'req': message['req'], 'users': remaining})
+
+        elif op == 'room':
+            for node in self.nodes_in_room(message['room'], skip_node=node_id):
+                self.send(node, {
+                    'op': 'deliver_room',
+                    'room': message['room'],
+                    'exclude_user': message.get('exclude_user'),
+                    'payload': message['payload']
+                })
+
+        elif op == 'user':
+            target_node = self.rooms.get(message['room'], {}).get(message['user'])
+            delivered = target_node is not None and target_node != node_id
+            if delivered:
+                self.send(target_node, {
+                    'op': 'deliver_user',
+                    'user': message['user'],
+                    'payload': message['payload']
+                })
+            self.send(node_id, {'op': 'reply', 'req': message['req'], 'ok': delivered})
+
+        else:
+            logger.warning(f"Unknown broker operation from node {node_id}: {op}")
+
+    def evict_node(self, node_id):
+        """Remove every member of a dead node and tell the rest of their rooms"""
+        for room in list(self.rooms):
+            gone = [user for user, node in self.rooms[room].items() if node == node_id]
+            for user_id in gone:
+                remaining = self.remove_member(room, user_id)
+                payload = json.dumps({'type': 'user_left', 'user_id': user_id, 'users': remaining})
+                for node in self.nodes_in_room(room):
+                    self.send(node, {'op': 'deliver_room', 'room': room, 'exclude_user': None, 'payload': payload})
+
+    async def handle_node(self, reader, writer):
+        node_id = None
+        try:
+            hello = json.loads(await reader.readline())
+            node_id = hello['node']
+            if node_id in self.nodes:
+                # A node reconnecting under the same id replaces its old link
+                self.evict_node(node_id)
+            self.nodes[node_id] = writer
+            logger.info(f"🧩 Node {node_id} joined the broker")
+
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.handle_request(node_id, json.loads(line))
+        except Exception as e:
+            logger.error(f"❌ Broker error for node {node_id}: {e}")
+        finally:
+            if node_id is not None and self.nodes.get(node_id) is writer:
+                del self.nodes[node_id]
+                self.evict_node(node_id)
+                logger.info(f"🧩 Node {node_id} left the broker")
+            writer.close()
+
+
+async def main(url):
+    """Run the broker until interrupted"""
+    broker = SignalingBroker(url)
+    await broker.start()
+    try:
+        await asyncio.Future()  # Run forever
+    finally:
+        await broker.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Signaling Pub/Sub Broker")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=8790, help="TCP port to listen on")
+    parser.add_argument("--unix", type=str, help="Listen on this Unix socket path instead of TCP")
+    args = parser.parse_args()
+
+    url = f"unix:{args.unix}" if args.unix else f"tcp://{args.host}:{args.port}"
+    print("🧭 Signaling Pub/Sub Broker")
+    print("=" * 40)
+    try:
+        asyncio.run(main(url))
+    except KeyboardInterrupt:
+        print("\n🛑 Shutting down signaling broker...")
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Sharded WebSocket Signaling Server
+
+Runs several WebRTCSignalingServer worker processes on the same port using
+SO_REUSEPORT, so the kernel spreads incoming connections across cores.
+
+The parent process hosts a SignalingBroker on a Unix socket and every worker
+uses a PubSubBackend connected to it. Workers record room membership there
+and relay room broadcasts and targeted messages for peers that landed on
+another shard, so `join_room`, `user_joined` and `user_left` behave exactly
+as with a single process.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import tempfile
+
+from signaling_backend import PubSubBackend
+from signaling_broker import SignalingBroker
+from signaling_codec import supported_subprotocols
+from metrics import REGISTRY, start_http_server, start_loop_lag_monitor
+from loop_profiler import install_profiler
+
+logger = logging.getLogger(__name__)
+
+
+async def run_worker(shard_id, bus_url, host, port, ice_batch_window, codec, metrics_port=None,
+                     profile=False, slow_callback=0.05):
+    """Serve signaling on a shared SO_REUSEPORT socket as one shard"""
+    import websockets
+    from websocket_server import WebRTCSignalingServer
+
+    backend = PubSubBackend(bus_url, node_id=f"shard-{shard_id}")
+    server = WebRTCSignalingServer(backend=backend, codec=codec)
+    server.enable_ice_batching(ice_batch_window)
+    await server.start_backend()
+    start_loop_lag_monitor()
+    install_profiler(profile, slow_callback)  # kill -USR1 <worker pid> toggles it
+    if metrics_port:
+        # Each shard has its own registry, so each needs its own port
+        await start_http_server(host, metrics_port + shard_id, {"/metrics": REGISTRY.render})
+
+    async with websockets.serve(
+        server.register_user,
+        host,
+        port,
+        ping_interval=20,
+        ping_timeout=10,
+        subprotocols=supported_subprotocols(),
+        reuse_port=True
+    ):
+        logger.info(f"✅ Shard {shard_id} (pid {os.getpid()}) serving ws://{host}:{port}")
+        await backend.wait_closed()  # Exit if the broker goes away
+
+
+def worker_process(shard_id, bus_url, host, port, ice_batch_window, codec, metrics_port=None,
+                   profile=False, slow_callback=0.05):
+    """Process entry point for one signaling shard"""
+    logging.basicConfig(level=logging.INFO)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The parent coordinates shutdown
+    try:
+        asyncio.run(run_worker(shard_id, bus_url, host, port, ice_batch_window, codec, metrics_port,
+                               profile, slow_callback))
+    except Exception as e:
+        logger.error(f"❌ Shard {shard_id} stopped: {e}")
+
+
+async def run_sharded(workers, host="0.0.0.0", port=8765, ice_batch_window=0, codec="auto", metrics_port=None,
+                      profile=False, slow_callback=0.05):
+    """Run the broker in this process and N signaling workers sharing one port"""
+    bus_dir = tempfile.mkdtemp(prefix="webrtc-signaling-")
+    broker = SignalingBroker(f"unix:{os.path.join(bus_dir, 'registry.sock')}")
+    await broker.start()
+
+    ctx = multiprocessing.get_context("spawn")
+    processes = []
+    for shard_id in range(workers):
+        proc = ctx.Process(
+            target=worker_process,
+            args=(shard_id, broker.url, host, port, ice_batch_window, codec, metrics_port, profile, slow_callback),
+            name=f"signaling-shard-{shard_id}",
+            daemon=True
+        )
+        proc.start()
+        processes.append(proc)
+
+    logger.info(f"✅ Sharded signaling server: {workers} workers on ws://{host}:{port}")
+    try:
+        while all(proc.is_alive() for proc in processes):
+            await asyncio.sleep(1.0)
+        logger.error("❌ A signaling shard exited, shutting down")
+    finally:
+        for proc in processes:
+            if proc.is_alive():
+                proc.terminate()
+        for proc in processes:
+            proc.join(timeout=5)
+        await broker.stop()
+        os.rmdir(bus_dir)
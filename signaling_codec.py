@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Signaling Codecs
+
+Serialization for signaling frames. The text codec is picked once at startup:
+orjson is used automatically when the optional `orjson` package is installed
+and falls back to the standard library otherwise.
+
+Clients may also negotiate a compact binary codec per connection through the
+WebSocket subprotocol "webrtc-signaling.msgpack" or "webrtc-signaling.cbor"
+(needs the optional `msgpack` / `cbor2` packages). Every codec carries the
+messages described in signaling_schema.py.
+
+`add_field` supports the relay fast path: it appends a top-level field to an
+already-encoded JSON object, so an SDP offer or ICE candidate can be
+forwarded without re-encoding its body.
+"""
+
+import json
+import logging
+
+from signaling_schema import SUBPROTOCOL_PREFIX, subprotocol_name
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+logger = logging.getLogger(__name__)
+
+
+class JsonCodec:
+    """Standard library JSON"""
+    name = "json"
+    wire = "json"  # Name of the format on the wire
+    binary = False
+    DecodeError = json.JSONDecodeError
+
+    def decode(self, message):
+        return json.loads(message)
+
+    def encode(self, data):
+        return json.dumps(data)
+
+
+class OrjsonCodec:
+    """orjson: same wire format, much faster parse/serialize"""
+    name = "orjson"
+    wire = "json"
+    binary = False
+
+    def __init__(self):
+        self.DecodeError = orjson.JSONDecodeError
+
+    def decode(self, message):
+        return orjson.loads(message)
+
+    def encode(self, data):
+        # Signaling frames are text frames, so hand back str rather than bytes
+        return orjson.dumps(data).decode("utf-8")
+
+
+class MsgpackCodec:
+    """MessagePack binary frames"""
+    name = "msgpack"
+    wire = "msgpack"
+    binary = True
+    DecodeError = ValueError
+
+    def decode(self, message):
+        return msgpack.unpackb(message, raw=False)
+
+    def encode(self, data):
+        return msgpack.packb(data, use_bin_type=True)
+
+
+class CborCodec:
+    """CBOR binary frames"""
+    name = "cbor"
+    wire = "cbor"
+    binary = True
+    DecodeError = ValueError
+
+    def decode(self, message):
+        return cbor2.loads(message)
+
+    def encode(self, data):
+        return cbor2.dumps(data)
+
+
+def binary_codecs():
+    """Binary codecs whose optional dependency is installed"""
+    codecs = []
+    if msgpack is not None:
+        codecs.append(MsgpackCodec())
+    if cbor2 is not None:
+        codecs.append(CborCodec())
+    return codecs
+
+
+def supported_subprotocols():
+    """Subprotocols to offer at the WebSocket handshake, most compact first"""
+    return [subprotocol_name(codec.name) for codec in binary_codecs()] + [subprotocol_name("json")]
+
+
+def codec_for_subprotocol(subprotocol, text_codec):
+    """Codec for a negotiated subprotocol; the text codec when none was negotiated"""
+    if subprotocol and subprotocol.startswith(SUBPROTOCOL_PREFIX):
+        name = subprotocol[len(SUBPROTOCOL_PREFIX):]
+        for codec in binary_codecs():
+            if codec.name == name:
+                return codec
+    return text_codec
+
+
+def get_codec(name="auto"):
+    """Pick the JSON codec for this process"""
+    if name in ("auto", "orjson") and orjson is not None:
+        return OrjsonCodec()
+    if name == "orjson":
+        logger.warning("orjson is not installed, falling back to the standard json codec")
+    return JsonCodec()
+
+
+def add_field(encoded, key, value):
+    """Append a top-level field to an encoded JSON object without re-encoding it
+
+    The new field is placed last so it overrides any field of the same name
+    sent by the client (JSON parsers keep the last duplicate key).
+    """
+    body = encoded.rstrip()
+    if not body.endswith("}"):
+        raise ValueError("Encoded message is not a JSON object")
+    field = f"{json.dumps(key)}:{json.dumps(value)}"
+    head = body[:-1].rstrip()
+    if head.endswith("{"):
+        return f"{head}{field}}}"
+    return f"{head},{field}}}"
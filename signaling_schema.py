@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Signaling Message Schema
+
+Single description of every control message exchanged with the signaling
+server and the video bridges. All codecs (JSON text, MessagePack, CBOR)
+carry exactly these messages; only the encoding on the wire differs.
+"""
+
+# WebSocket subprotocol names: "webrtc-signaling.<codec>"
+SUBPROTOCOL_PREFIX = "webrtc-signaling."
+
+# Client -> signaling server: message type -> required fields
+CLIENT_MESSAGES = {
+    'join_room': ('room',),
+    'leave_room': (),
+    'offer': ('offer',),
+    'answer': ('answer',),
+    'ice_candidate': ('candidate',),
+    'profiler': ('action',),
+}
+
+# Signaling server -> client: message type -> fields always present
+SERVER_MESSAGES = {
+    'connected': ('user_id', 'codec', 'codecs'),
+    'room_joined': ('room', 'users'),
+    'room_left': (),
+    'user_joined': ('user_id', 'users'),
+    'user_left': ('user_id', 'users'),
+    'offer': ('offer', 'from_user'),
+    'answer': ('answer', 'from_user'),
+    'ice_candidate': ('candidate', 'from_user'),
+    'ice_candidates': ('candidates', 'from_user'),
+    'error': ('message',),
+    'profiler': ('report',),
+}
+
+# Relayed message types and the opaque payload field each one carries
+RELAY_FIELDS = {
+    'offer': 'offer',
+    'answer': 'answer',
+    'ice_candidate': 'candidate',
+}
+
+# Client -> video bridge control messages
+BRIDGE_CLIENT_MESSAGES = {
+    'ping': (),
+    'list_files': (),
+    'change_file': ('file',),
+    'get_current_file': (),
+    'seek': (),
+    'subscribe': (),
+    'frame_timing': (),
+    'profiler': ('action',),
+}
+
+
+def subprotocol_name(codec_name):
+    return SUBPROTOCOL_PREFIX + codec_name
+
+
+def missing_fields(message, schema=CLIENT_MESSAGES):
+    """Required fields absent from a decoded message (empty if valid or unknown type)"""
+    required = schema.get(message.get('type'), ())
+    return [field for field in required if field not in message]
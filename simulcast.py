@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Simulcast Resolution Layers
+
+The bridges can offer a frame in several resolutions (1080p, 720p, 360p,
+thumbnail). A client picks one with a control message:
+
+    {"type": "subscribe", "layer": "thumb"}
+
+Frames are encoded as variants keyed by (layer, quality rung): the layer is
+the client's subscription (None for the source resolution) and the rung
+comes from the adaptive quality controller (always 0 without --adaptive).
+VariantEncoder produces only the variants some client currently needs, so a
+layer costs nothing once its last subscriber has left, and a dashboard of
+thumbnails never pays for full-size encodes.
+"""
+
+import cv2
+
+from adaptive_quality import QualityRung
+from frame_pipeline import encode_jpeg
+
+
+class SimulcastLayer:
+    def __init__(self, name, width, height):
+        self.name = name
+        self.width = width
+        self.height = height
+
+    def size_for(self, width, height):
+        """Layer size for a source size, keeping its aspect ratio and never upscaling"""
+        scale = min(self.width / width, self.height / height, 1.0)
+        return max(2, int(width * scale) // 2 * 2), max(2, int(height * scale) // 2 * 2)
+
+
+DEFAULT_LAYERS = [
+    SimulcastLayer("1080p", 1920, 1080),
+    SimulcastLayer("720p", 1280, 720),
+    SimulcastLayer("360p", 640, 360),
+    SimulcastLayer("thumb", 320, 180),
+]
+
+
+def parse_layers(spec):
+    """Layers from a comma separated list of names, e.g. "720p,360p,thumb" """
+    known = {layer.name: layer for layer in DEFAULT_LAYERS}
+    layers = []
+    for name in spec.split(','):
+        name = name.strip()
+        if name not in known:
+            raise ValueError(f"Unknown simulcast layer: {name} (choose from {', '.join(known)})")
+        layers.append(known[name])
+    return layers
+
+
+def describe_layers(layers, width, height):
+    """Layer list for clients, with the size each layer has for this source"""
+    return [
+        {"name": layer.name, "resolution": "%dx%d" % layer.size_for(width, height)}
+        for layer in layers
+    ]
+
+
+def resolve_layer(layers, name, width, height):
+    """Variant layer for a subscription: None when it is the source resolution
+
+    Raises KeyError for an unknown layer name.
+    """
+    if name in (None, "source"):
+        return None
+    for layer in layers:
+        if layer.name == name:
+            return None if layer.size_for(width, height) == (width, height) else name
+    raise KeyError(name)
+
+
+class VariantEncoder:
+    """Encodes a frame into the currently active (layer, rung) variants (picklable for process pools)"""
+
+    def __init__(self, layers=None, ladder=None, quality=85):
+        self.layers = {layer.name: layer for layer in layers or ()}
+        self.ladder = ladder or [QualityRung("default", quality, 1.0)]
+        self.active = {(None, 0)}  # Variants to produce; updated by the streaming loop
+
+    def __call__(self, frame):
+        height, width = frame.shape[:2]
+        layer_frames = {}
+        variants = {}
+        for layer_name, rung_index in self.active:
+            layer_frame = layer_frames.get(layer_name)
+            if layer_frame is None:
+                # Resize once per layer, shared by every quality rung of it
+                size = self.layers[layer_name].size_for(width, height) if layer_name else (width, height)
+                layer_frame = _resize(frame, size)
+                layer_frames[layer_name] = layer_frame
+            rung = self.ladder[rung_index]
+            layer_height, layer_width = layer_frame.shape[:2]
+            scaled = _resize(layer_frame, rung.resolution(layer_width, layer_height))
+            variants[(layer_name, rung_index)] = encode_jpeg(scaled, rung.quality)
+        return variants
+
+
+def _resize(frame, size):
+    height, width = frame.shape[:2]
+    if size == (width, height):
+        return frame
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Adaptive Quality Controller Tests
+"""
+
+from adaptive_quality import DEFAULT_LADDER, QualityRung, RungController
+
+INTERVAL = 1 / 30
+SLOW = INTERVAL          # Sends take a whole frame interval
+FAST = 0.1 * INTERVAL    # Plenty of headroom
+
+
+def feed(controller, seconds, frames):
+    for _ in range(frames):
+        controller.sent(seconds)
+
+
+def test_slow_sends_step_down():
+    controller = RungController(len(DEFAULT_LADDER), frame_interval=INTERVAL, settle=2)
+    feed(controller, SLOW, 1)
+    assert controller.rung == 1
+    # Changes wait for the new size to take effect
+    feed(controller, SLOW, 2)
+    assert controller.rung == 1
+    feed(controller, SLOW, 20)
+    assert controller.rung == len(DEFAULT_LADDER) - 1
+
+
+def test_dropped_frame_steps_down():
+    controller = RungController(len(DEFAULT_LADDER), frame_interval=INTERVAL)
+    controller.dropped()
+    assert controller.rung == 1
+    controller.dropped()  # Still settling
+    assert controller.rung == 1
+
+
+def test_headroom_steps_up_slowly():
+    controller = RungController(len(DEFAULT_LADDER), frame_interval=INTERVAL, up_after=10, settle=0)
+    controller.dropped()
+    assert controller.rung == 1
+    feed(controller, FAST, 9)
+    assert controller.rung == 1
+    feed(controller, FAST, 1)
+    assert controller.rung == 0
+
+
+def test_failed_step_up_doubles_the_wait():
+    controller = RungController(len(DEFAULT_LADDER), frame_interval=INTERVAL, up_after=10, settle=0)
+    controller.dropped()
+    feed(controller, FAST, 10)
+    assert controller.rung == 0
+    controller.dropped()  # The better rung did not hold
+    assert controller.rung == 1
+    assert controller.probe_wait == 20
+    feed(controller, FAST, 19)
+    assert controller.rung == 1
+    feed(controller, FAST, 1)
+    assert controller.rung == 0
+
+
+def test_rung_resolution_is_even():
+    assert QualityRung("third", 45, 0.33).resolution(1280, 720) == (422, 236)
+    assert QualityRung("tiny", 45, 0.001).resolution(1280, 720) == (2, 2)
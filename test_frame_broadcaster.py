@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Frame Broadcaster Queue Tests
+
+Checks what a client that falls behind is sent: JPEG frames drop the
+oldest, compressed runs are never sent without their keyframe.
+"""
+
+from frame_broadcaster import ClientChannel
+
+
+class FakeWebSocket:
+    remote_address = ("127.0.0.1", 50000)
+
+
+def queued(channel):
+    return [frame for frame, _, _ in channel.queue]
+
+
+def test_full_queue_keeps_latest_jpeg_frames():
+    """Every frame is a keyframe: only the oldest is dropped"""
+    channel = ClientChannel(FakeWebSocket(), queue_size=3)
+    for name in ("f0", "f1", "f2", "f3"):
+        channel.offer(name)
+    assert queued(channel) == ["f1", "f2", "f3"]
+    assert channel.frames_dropped == 1
+
+
+def test_keyframe_on_full_queue_drops_the_run_it_replaces():
+    """[K0, d1, d2] + K3 must not become [d1, d2, K3]: d1 and d2 need K0"""
+    channel = ClientChannel(FakeWebSocket(), queue_size=3)
+    channel.offer("K0", keyframe=True)
+    channel.offer("d1", keyframe=False)
+    channel.offer("d2", keyframe=False)
+    channel.offer("K3", keyframe=True)
+    assert queued(channel) == ["K3"]
+    assert channel.frames_dropped == 3
+    channel.offer("d4", keyframe=False)
+    assert queued(channel) == ["K3", "d4"]
+
+
+def test_delta_on_full_queue_resyncs_on_next_keyframe():
+    channel = ClientChannel(FakeWebSocket(), queue_size=2)
+    channel.offer("K0", keyframe=True)
+    channel.offer("d1", keyframe=False)
+    channel.offer("d2", keyframe=False)
+    assert queued(channel) == []
+    channel.offer("d3", keyframe=False)
+    assert queued(channel) == []
+    channel.offer("K4", keyframe=True)
+    assert queued(channel) == ["K4"]
+
+
+def test_stream_starts_at_a_keyframe():
+    channel = ClientChannel(FakeWebSocket(), queue_size=4)
+    channel.offer("d0", keyframe=False)
+    channel.offer("K1", keyframe=True)
+    channel.offer("d2", keyframe=False)
+    assert queued(channel) == ["K1", "d2"]
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Frame Pacer Tests
+"""
+
+import asyncio
+import time
+
+from frame_pacer import FramePacer
+
+
+def test_frames_are_released_on_absolute_deadlines():
+    async def run():
+        pacer = FramePacer(50)
+        start = time.monotonic()
+        for _ in range(10):
+            assert await pacer.wait() == 0
+            time.sleep(0.005)  # Work inside the frame does not push later deadlines back
+        return time.monotonic() - start
+
+    elapsed = asyncio.run(run())
+    # Ten frames at 50 fps: the tenth is released 9 intervals after the first, plus its own work
+    assert 0.18 <= elapsed < 0.26
+
+
+def test_missed_ticks_are_skipped_not_accumulated():
+    async def run():
+        pacer = FramePacer(100)
+        await pacer.wait()
+        time.sleep(0.055)  # Stall for more than five frames
+        missed = await pacer.wait()
+        before = time.monotonic()
+        await pacer.wait()
+        return missed, time.monotonic() - before, pacer.skipped
+
+    missed, next_wait, skipped = asyncio.run(run())
+    assert 4 <= missed <= 6
+    assert skipped == missed
+    # Back on the timeline: the next frame is at most one interval away
+    assert next_wait <= 0.015
+
+
+def test_invalid_fps_falls_back_to_30():
+    pacer = FramePacer(0)
+    assert pacer.fps == 30.0
+    pacer.set_fps(25)
+    assert abs(pacer.interval - 0.04) < 1e-9
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+OAK Bridge Smoke Tests
+
+Runs oak_camera_bridge against oak_mock_device.MockDevice: no camera needed.
+"""
+
+import asyncio
+import functools
+import json
+
+import websockets
+
+from oak_camera_bridge import OAKCameraBridge
+from oak_mock_device import MockDevice
+from packet_passthrough import FLAG_KEYFRAME, PACKET_HEADER, PACKET_MAGIC
+
+
+async def serve(bridge):
+    server = await websockets.serve(bridge.handle_client, "127.0.0.1", 0, max_size=10**7)
+    return server, f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+
+
+async def connect(url):
+    """Open a client and read its connected message"""
+    websocket = await websockets.connect(url, max_size=10**7)
+    connected = json.loads(await asyncio.wait_for(websocket.recv(), 5))
+    assert connected["type"] == "connected"
+    return websocket, connected
+
+
+async def binary_frames(websocket, count):
+    frames = []
+    while len(frames) < count:
+        message = await asyncio.wait_for(websocket.recv(), 5)
+        if isinstance(message, bytes):
+            frames.append(message)
+    return frames
+
+
+async def wait_for(condition, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition not reached"
+        await asyncio.sleep(0.02)
+
+
+def make_bridge(encoder, **options):
+    return OAKCameraBridge(port=0, encoder=encoder, device_factory=functools.partial(MockDevice, encoder=encoder),
+                           **options)
+
+
+def test_jpeg_frames_arrive_and_device_closes():
+    async def run():
+        bridge = make_bridge("jpeg", linger=0)
+        server, url = await serve(bridge)
+        try:
+            websocket, connected = await connect(url)
+            assert connected["encoder"] == "jpeg"
+            for frame in await binary_frames(websocket, 3):
+                assert frame[:2] == b'\xff\xd8'  # JPEG start of image
+            await websocket.close()
+            # Without linger the device closes with the last client
+            await wait_for(lambda: bridge.device is None and not bridge.streaming)
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    asyncio.run(run())
+
+
+def test_h264_warm_start_begins_with_a_keyframe():
+    async def run():
+        bridge = make_bridge("h264", linger=0.5)
+        server, url = await serve(bridge)
+        try:
+            websocket, connected = await connect(url)
+            assert connected["video"]["codec"].startswith("avc1.")
+            packets = await binary_frames(websocket, 5)
+            for packet in packets:
+                assert packet[:4] == PACKET_MAGIC
+            assert PACKET_HEADER.unpack_from(packets[0])[1] & FLAG_KEYFRAME
+            assert not PACKET_HEADER.unpack_from(packets[1])[1] & FLAG_KEYFRAME
+            await websocket.close()
+            await wait_for(lambda: not bridge.streaming)
+
+            # The device lingers: the next client starts warm, on a keyframe
+            assert bridge.device is not None
+            websocket, _ = await connect(url)
+            assert bridge.linger_task is None
+            packet = (await binary_frames(websocket, 1))[0]
+            assert PACKET_HEADER.unpack_from(packet)[1] & FLAG_KEYFRAME
+            await websocket.close()
+
+            # Once the linger runs out the device is closed
+            await wait_for(lambda: not bridge.streaming)
+            assert bridge.device is not None
+            await wait_for(lambda: bridge.device is None, timeout=2.0)
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    asyncio.run(run())
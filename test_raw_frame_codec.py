@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Raw Frame Codec Tests
+
+Decodes what RawFrameEncoder sends the way a client does and checks the
+client ends up with the camera's frame.
+"""
+
+import zlib
+
+import numpy as np
+
+from raw_frame_codec import DELTA_HEADER, DELTA_MAGIC, FLAG_KEYFRAME, RAW_HEADER, RawFrameEncoder
+
+WIDTH, HEIGHT, TILE = 64, 32, 16
+
+
+def camera_frame(seed):
+    return np.random.default_rng(seed).integers(0, 256, (HEIGHT, WIDTH, 3), dtype=np.uint8)
+
+
+def apply_message(parts, picture):
+    """Client side: update `picture` from one message; returns whether it was a keyframe"""
+    message = b''.join(bytes(part) for part in parts)
+    magic, flags, compression, tile, width, height, length = DELTA_HEADER.unpack_from(message)
+    assert magic == DELTA_MAGIC
+    body = message[DELTA_HEADER.size:]
+    if compression == 2:
+        body = zlib.decompress(body)
+    assert len(body) == length
+    if flags & FLAG_KEYFRAME:
+        picture[:] = np.frombuffer(body, np.uint8).reshape(height, width, 3)
+        return True
+    rows, columns = height // tile, width // tile
+    bitmap_size = (rows * columns + 7) // 8
+    changed = np.unpackbits(np.frombuffer(body[:bitmap_size], np.uint8), bitorder='little')[:rows * columns]
+    pixels = np.frombuffer(body[bitmap_size:], np.uint8).reshape(-1, tile, tile, 3)
+    tiles = picture.reshape(rows, tile, columns, tile, 3).swapaxes(1, 2)
+    tiles[changed.reshape(rows, columns).astype(bool)] = pixels
+    return False
+
+
+def test_plain_frames_are_header_and_pixels():
+    encoder = RawFrameEncoder()
+    frame = camera_frame(0)
+    parts, keyframe = encoder((frame.tobytes(), WIDTH, HEIGHT))
+    assert keyframe
+    assert RAW_HEADER.unpack(parts[0]) == (WIDTH, HEIGHT)
+    assert bytes(parts[1]) == frame.tobytes()
+
+
+def test_deltas_rebuild_the_camera_frame():
+    encoder = RawFrameEncoder(delta=True, tile=TILE, keyframe_interval=4)
+    picture = np.zeros((HEIGHT, WIDTH, 3), np.uint8)
+    frame = camera_frame(1)
+    keyframes = []
+    for index in range(6):
+        frame = frame.copy()
+        frame[:TILE, :TILE] = index  # One tile changes per frame
+        parts, keyframe = encoder((frame, WIDTH, HEIGHT))
+        keyframes.append(apply_message(parts, picture))
+        assert keyframe == keyframes[-1]
+        assert np.array_equal(picture, frame)
+    assert keyframes == [True, False, False, False, True, False]
+    # Only the changed tile went out in each delta
+    assert encoder.tiles_sent == 3 + 1
+    assert encoder.tiles_total == 4 * (HEIGHT // TILE) * (WIDTH // TILE)
+
+
+def test_compressed_delta_round_trip():
+    encoder = RawFrameEncoder(compression='zlib', delta=True, tile=TILE)
+    picture = np.zeros((HEIGHT, WIDTH, 3), np.uint8)
+    first, second = camera_frame(2), camera_frame(3)
+    for frame in (first, second):
+        parts, _ = encoder((frame, WIDTH, HEIGHT))
+        apply_message(parts, picture)
+    assert np.array_equal(picture, second)
+
+
+def test_reset_starts_with_a_keyframe():
+    encoder = RawFrameEncoder(delta=True, tile=TILE)
+    encoder((camera_frame(4), WIDTH, HEIGHT))
+    encoder.reset()
+    _, keyframe = encoder((camera_frame(5), WIDTH, HEIGHT))
+    assert keyframe
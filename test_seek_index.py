@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Seek Index Tests
+"""
+
+import json
+import os
+
+import pytest
+
+from seek_index import SeekIndex, SeekIndexCache
+
+
+def make_index():
+    return SeekIndex(25.0, 300, [0, 50, 100, 250])
+
+
+def test_keyframe_before():
+    index = make_index()
+    assert index.keyframe_before(0) == 0
+    assert index.keyframe_before(49) == 0
+    assert index.keyframe_before(50) == 50
+    assert index.keyframe_before(299) == 250
+
+
+def test_nearest_keyframe():
+    index = make_index()
+    assert index.nearest_keyframe(60) == 50
+    assert index.nearest_keyframe(90) == 100
+    assert index.nearest_keyframe(200) == 250
+    assert index.nearest_keyframe(1000) == 250
+
+
+def test_frame_at_stays_within_the_file():
+    index = make_index()
+    assert index.frame_at(2.0) == 50
+    assert index.frame_at(-1) == 0
+    assert index.frame_at(60) == 299
+    assert index.duration == 12.0
+
+
+def test_dict_round_trip_and_version_check():
+    data = json.loads(json.dumps(make_index().to_dict()))
+    index = SeekIndex.from_dict(data)
+    assert (index.fps, index.frames, index.keyframes) == (25.0, 300, [0, 50, 100, 250])
+    with pytest.raises(ValueError):
+        SeekIndex.from_dict({**data, 'version': 0})
+
+
+def test_cache_directory_is_created_on_first_save(tmp_path):
+    directory = tmp_path / "indexes"
+    cache = SeekIndexCache(str(directory))
+    assert not directory.exists()
+    video = tmp_path / "clip.mp4"
+    video.write_bytes(b"not really a video")
+    key = cache.make_key(str(video))
+    cache.save(key, make_index())
+    with open(cache.index_path(key), encoding='utf-8') as f:
+        assert SeekIndex.from_dict(json.load(f)).keyframes == [0, 50, 100, 250]
+    # A saved index is used instead of probing the file again
+    assert cache.get(str(video)).frames == 300
+    assert os.listdir(directory) == [os.path.basename(cache.index_path(key))]
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Signaling Codec Tests
+"""
+
+import json
+
+import pytest
+
+from signaling_codec import JsonCodec, add_field
+
+
+def test_add_field_appends_without_touching_the_body():
+    raw = '{"type": "offer", "offer": {"sdp": "v=0\\r\\n", "type": "offer"}}'
+    relayed = add_field(raw, 'from_user', 'abc123')
+    assert relayed.startswith(raw[:-1])
+    assert json.loads(relayed) == {
+        'type': 'offer',
+        'offer': {'sdp': 'v=0\r\n', 'type': 'offer'},
+        'from_user': 'abc123'
+    }
+
+
+def test_add_field_to_empty_object_and_trailing_whitespace():
+    assert json.loads(add_field('{}', 'a', 1)) == {'a': 1}
+    assert json.loads(add_field('{"a": 1} \n', 'b', [2])) == {'a': 1, 'b': [2]}
+
+
+def test_add_field_rejects_non_objects():
+    with pytest.raises(ValueError):
+        add_field('[1, 2]', 'a', 1)
+
+
+def test_json_codec_round_trip():
+    codec = JsonCodec()
+    message = {'type': 'ice_candidate', 'candidate': {'candidate': 'candidate:1 1 udp 1 1.2.3.4 5 typ host'}}
+    assert codec.decode(codec.encode(message)) == message
+    with pytest.raises(codec.DecodeError):
+        codec.decode('{not json')
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Video Catalog
+
+Metadata of the video files a bridge can stream, for 'list_files'.
+Opening a file with cv2.VideoCapture to read its size, frame rate and
+duration can take tens of milliseconds, so it never happens on the event
+loop: a background task stats the media directory and probes only the files
+that are new or whose mtime or size changed, one at a time on a worker
+thread. 'list_files' is answered from memory, a page at a time:
+
+    {"type": "list_files", "offset": 0, "limit": 50}
+    -> {"type": "file_list", "files": [...], "total": 312, "offset": 0, "scanning": false}
+
+Files found but not probed yet are listed with "pending": true. Probe
+results are saved to a JSON file in the media directory (written to a
+temporary file and renamed), so a restarted bridge lists everything at once
+and re-probes only what changed while it was down.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+import cv2
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm', '.m4v')
+CATALOG_FILE = '.video_catalog.json'
+CATALOG_VERSION = 1
+
+PROBE_SECONDS = REGISTRY.histogram('video_catalog_probe_seconds', "Time to read one video file's metadata")
+
+
+def probe_video(path):
+    """Width, height, fps and duration of a video file (blocks: run off the event loop)"""
+    capture = cv2.VideoCapture(path)
+    try:
+        if not capture.isOpened():
+            return {'error': 'Cannot read video file'}
+        width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        duration = capture.get(cv2.CAP_PROP_FRAME_COUNT) / fps if fps > 0 else 0
+        return {
+            'width': width,
+            'height': height,
+            'fps': round(fps, 2),
+            'duration': round(duration, 1)
+        }
+    finally:
+        capture.release()
+
+
+def scan_directory(directory):
+    """{name: (mtime_ns, size)} of the video files directly in a directory"""
+    files = {}
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not entry.name.lower().endswith(VIDEO_EXTENSIONS):
+                    continue
+                try:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        files[entry.name] = (stat.st_mtime_ns, stat.st_size)
+                except OSError:
+                    pass  # Removed while scanning
+    except OSError as e:
+        logger.warning(f"⚠️ Cannot scan media directory {directory}: {e}")
+    return files
+
+
+class VideoCatalog:
+    def __init__(self, directory='.', catalog_file=CATALOG_FILE, rescan_interval=30.0):
+        """
+        directory: media directory whose video files are listed
+        catalog_file: where probe results are saved, relative to the directory (None: not saved)
+        rescan_interval: seconds between checks for added, changed and removed files
+        """
+        self.directory = directory
+        self.path = os.path.join(directory, catalog_file) if catalog_file else None
+        self.rescan_interval = rescan_interval
+        self.entries = {}  # Name -> {'mtime_ns', 'size', 'info'}; info is None until probed
+        self.names = []    # Sorted names, the order pages are served in
+        self.scanning = False
+        self.last_scan = None
+        self.task = None
+        self.load()
+        REGISTRY.gauge('video_catalog_files', "Video files in the catalog", function=lambda: len(self.entries))
+
+    def load(self):
+        """Read the saved probe results; entries are checked against the files on the next scan"""
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            if saved.get('version') != CATALOG_VERSION:
+                return
+            self.entries = {
+                name: {'mtime_ns': entry['mtime_ns'], 'size': entry['size'], 'info': entry['info']}
+                for name, entry in saved['files'].items()
+            }
+            self.names = sorted(self.entries)
+            logger.info(f"🗂️ Loaded {len(self.entries)} catalog entries from {self.path}")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            logger.warning(f"⚠️ Ignoring unreadable video catalog {self.path}: {e}")
+
+    def save(self):
+        """Write the probed entries (blocks: run off the event loop)"""
+        if not self.path:
+            return
+        files = {name: entry for name, entry in list(self.entries.items()) if entry['info'] is not None}
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': CATALOG_VERSION, 'files': files}, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not save video catalog {self.path}: {e}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def start(self):
+        """Keep the catalog up to date in the background; call from the event loop"""
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+        return self.task
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"❌ Video catalog scan failed: {e}")
+            await asyncio.sleep(self.rescan_interval)
+
+    async def refresh(self):
+        """Pick up added, changed and removed files, probing only what changed"""
+        self.scanning = True
+        try:
+            files = await asyncio.to_thread(scan_directory, self.directory)
+            changed = False
+            for name in [name for name in self.entries if name not in files]:
+                del self.entries[name]
+                changed = True
+            stale = []
+            for name, (mtime_ns, size) in files.items():
+                entry = self.entries.get(name)
+                if entry is None or entry['mtime_ns'] != mtime_ns or entry['size'] != size:
+                    self.entries[name] = {'mtime_ns': mtime_ns, 'size': size, 'info': None}
+                    stale.append(name)
+                elif entry['info'] is None:
+                    stale.append(name)
+            if stale or changed:
+                self.names = sorted(self.entries)
+
+            if stale:
+                logger.info(f"🗂️ Probing {len(stale)} new or changed video files in {self.directory}")
+            started = time.monotonic()
+            for index, name in enumerate(sorted(stale)):
+                entry = self.entries.get(name)
+                if entry is None:
+                    continue
+                start = time.monotonic()
+                info = await asyncio.to_thread(probe_video, os.path.join(self.directory, name))
+                PROBE_SECONDS.observe(time.monotonic() - start)
+                # The file may have been replaced while it was probed; the next scan catches that
+                if self.entries.get(name) is entry:
+                    entry['info'] = info
+                if (index + 1) % 50 == 0:
+                    await asyncio.to_thread(self.save)  # Keep progress on long first scans
+            if stale:
+                logger.info(f"🗂️ Probed {len(stale)} video files in {time.monotonic() - started:.1f}s")
+            if stale or changed:
+                await asyncio.to_thread(self.save)
+            self.last_scan = time.time()
+        finally:
+            self.scanning = False
+
+    def describe(self, name):
+        """A file's listing as sent to clients"""
+        entry = self.entries[name]
+        listing = {'name': name, 'size_mb': round(entry['size'] / (1024 * 1024), 1)}
+        if entry['info'] is None:
+            listing['pending'] = True
+        else:
+            listing.update(entry['info'])
+        return listing
+
+    def page(self, offset=0, limit=None):
+        """One page of the listing, sorted by name; limit None for all files from offset"""
+        names = self.names
+        offset = max(0, offset)
+        end = len(names) if limit is None else offset + max(0, limit)
+        return {
+            "files": [self.describe(name) for name in names[offset:end] if name in self.entries],
+            "total": len(names),
+            "offset": offset,
+            "scanning": self.scanning
+        }
+
+    def resolve(self, name):
+        """Path of a listed file name; other names are used as given"""
+        if name in self.entries:
+            return os.path.join(self.directory, name)
+        return name
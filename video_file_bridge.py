@@ -2,283 +2,806 @@
 """
 Video File WebSocket Bridge
 
-Streams a video file to WebSocket clients for WebRTC integration.
+Streams video files to WebSocket clients for WebRTC integration.
+
+Every file being watched has its own channel: one decode/encode pipeline
+and broadcaster, shared by all of the file's viewers. New clients join the
+channel of the --video-file given on the command line (if any); a
+'change_file' message moves only the client that sent it to the channel of
+another file, opening that channel if nobody watches the file yet. A
+channel is torn down when its last viewer leaves, so one bridge serves many
+clips at once and never decodes a file twice.
+
+{"type": "seek", "time": seconds} (or "frame": n) moves a channel: the
+reader lands on the keyframe at or before the target (see seek_index.py)
+and decodes forward to it. At the end of the file a second capture that is
+already holding the first frame takes over, so loops do not stall.
 """
 
 import asyncio
 import websockets
 import cv2
-import json
 import logging
 import time
 import argparse
-import glob
 import os
+import threading
+from frame_broadcaster import FrameBroadcaster
+from frame_pipeline import FramePipeline, FrameRing, jpeg_encoder
+from frame_pacer import FramePacer
+from frame_timing import Captured, FrameTiming, LatencyTracker
+from metrics import REGISTRY, http_routes, start_loop_lag_monitor
+from loop_profiler import add_profiler_arguments, install_profiler, profiler_command
+from frame_cache import FrameCache
+from video_catalog import VideoCatalog
+from seek_index import SeekIndexCache
+from segment_store import SegmentStore, build_segment_store
+from packet_passthrough import PacketSource, encode_packet
+from adaptive_quality import DEFAULT_LADDER, RungController
+from simulcast import VariantEncoder, describe_layers, parse_layers, resolve_layer
+from signaling_codec import get_codec, codec_for_subprotocol, supported_subprotocols
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class VideoFileBridge:
-    def __init__(self, port=8768, video_file=None):
-        self.port = port
+
+class FileChannel:
+    """One file's stream: source, pipeline and broadcaster shared by the file's viewers"""
+
+    def __init__(self, bridge, video_file):
+        self.bridge = bridge
+        self.video_file = video_file
         self.clients = set()
+        # Simulcast layers and per-client quality ladder for JPEG frames; what gets encoded depends on this file's viewers
+        self.variant_encoder = None
+        if bridge.adaptive or bridge.layers:
+            self.variant_encoder = VariantEncoder(bridge.layers, DEFAULT_LADDER if bridge.adaptive else None,
+                                                  bridge.jpeg_quality)
+        controller_factory = None
+        if bridge.adaptive:
+            controller_factory = lambda: RungController(len(DEFAULT_LADDER), frame_interval=1 / (self.fps or 30))
+        # Compressed packets need some slack: a dropped packet costs a wait for the next keyframe
+        self.broadcaster = FrameBroadcaster(queue_size=8 if bridge.passthrough else 1,
+                                            on_disconnect=self.clients.discard,
+                                            controller_factory=controller_factory,
+                                            latency=bridge.latency)
         self.streaming = False
-        self.video_file = video_file
         self.video_capture = None
-        self.current_video_info = None
+        self.segment_store = None  # Pre-encoded frames for the file, when built
+        self.packet_source = None
+        self.stream_config = None  # WebCodecs decoder config of the passthrough stream
+        self.stream_id = 0
+        if bridge.passthrough:
+            bridge.stream_id += 1
+            self.stream_id = bridge.stream_id
+        self.width = 0
+        self.height = 0
+        self.fps = 0
+        self.frame_pipeline = None
+        self.ring = None  # Preallocated decode buffers of the running pipeline
+        self.pacer = FramePacer(30)
+        self.frames_read = 0
+        self.loop_frames = None  # Frames in one pass over the file, known after the first loop
+        self.frame_count = 0  # Frames in the file as reported by the container
+        self.seek_index = None  # Keyframe positions, loaded in the background
+        self.seek_target = None  # (frame, pipeline generation) the reader jumps to before its next read
+        self.seeks = 0
+        self.spare = None  # (capture, first frame, its PTS) ready to take over at the end of the file
+        self.spare_lock = threading.Lock()
+        self.closed = False
+        self.last_report = time.time()
+
+    async def open(self):
+        """Open the file off the event loop; False if it cannot be played"""
+        if await asyncio.to_thread(self.setup_video_source):
+            return True
+        await asyncio.to_thread(self.stop_video_source)
+        return False
+
+    async def close(self):
+        """Stop streaming and release the source off the event loop"""
+        self.streaming = False
+        pipeline = self.frame_pipeline
+        if pipeline:
+            # Only signal the capture thread here; stop_video_source waits for it
+            pipeline.stop()
+        await asyncio.to_thread(self.stop_video_source, pipeline)
 
     def setup_video_source(self):
-        """Setup video source from a file"""
-        if not self.video_file:
-            logger.error("❌ No video file specified.")
-            return False
-        
+        """Setup video source from a file (blocking: opens captures and containers)"""
+        bridge = self.bridge
         try:
+            # Passthrough forwards the file's own packets: no decode, no encode
+            if bridge.passthrough:
+                self.packet_source = PacketSource.open(self.video_file, self.stream_id)
+                if self.packet_source is not None:
+                    source = self.packet_source
+                    self.width, self.height, self.fps = source.width, source.height, source.fps
+                    self.stream_config = source.config()
+                    logger.info(f"🎞️ Passing through {source.codec} packets: "
+                                f"{self.width}x{self.height} @ {self.fps:.2f} FPS")
+                    return True
+                self.stream_config = None
+
+            # A prebuilt segment store needs no decoding at all (it only holds the source resolution)
+            if not bridge.layers:
+                self.segment_store = SegmentStore.open_for(self.video_file, bridge.store_dir)
+            if self.segment_store is not None:
+                store = self.segment_store
+                self.width, self.height, self.fps = store.width, store.height, store.fps
+                self.frame_count = len(store)
+                logger.info(f"📦 Using segment store {store.path}: {len(store)} frames, "
+                            f"{self.width}x{self.height} @ {self.fps:.2f} FPS")
+                return True
+
             logger.info(f"🔶 Opening video file: {self.video_file}")
             self.video_capture = cv2.VideoCapture(self.video_file)
             if not self.video_capture.isOpened():
                 logger.error(f"❌ Error opening video file: {self.video_file}")
+                self.video_capture = None
                 return False
-            
+
             # Get video properties
             self.width = int(self.video_capture.get(cv2.CAP_PROP_FRAME_WIDTH))
             self.height = int(self.video_capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
             self.fps = self.video_capture.get(cv2.CAP_PROP_FPS)
-            
+            self.frame_count = int(self.video_capture.get(cv2.CAP_PROP_FRAME_COUNT))
+            self.frames_read = 0
+            self.loop_frames = None
+            self.prepare_spare()
+
             logger.info(f"✅ Video file opened successfully: {self.width}x{self.height} @ {self.fps:.2f} FPS")
             return True
-            
+
         except Exception as e:
             logger.error(f"❌ Error setting up video source: {e}")
             return False
 
-    def stop_video_source(self):
-        """Stop video source"""
+    def start(self):
+        """Start streaming to the channel's clients"""
+        self.streaming = True
+        asyncio.create_task(self.stream_frames())
+
+    def stop_video_source(self, pipeline=None):
+        """Stop video source (blocking: waits for the capture thread and releases the capture)
+
+        pipeline: the pipeline close() stopped; the stream may have let go of it since
+        """
         self.streaming = False
+        with self.spare_lock:
+            self.closed = True
+            spare, self.spare = self.spare, None
+        if spare is not None:
+            spare[0].release()
+        pipeline = pipeline or self.frame_pipeline
+        self.frame_pipeline = None
+        if pipeline:
+            # The capture thread must be out of read() before the capture is released
+            pipeline.stop()
+            pipeline.join()
         if self.video_capture:
             self.video_capture.release()
             self.video_capture = None
-            logger.info("🔶 Video source stopped")
+            logger.info(f"🔶 Video source stopped: {self.video_file}")
+        if self.segment_store is not None:
+            self.segment_store.close()
+            self.segment_store = None
+            logger.info("🔶 Segment store closed")
+        if self.packet_source is not None:
+            self.packet_source.close()
+            self.packet_source = None
+            logger.info("🔶 Packet source closed")
 
-    def get_available_video_files(self):
-        """Get list of available video files"""
-        video_extensions = ['*.mp4', '*.avi', '*.mov', '*.mkv', '*.webm', '*.m4v']
-        video_files = []
-        
-        for extension in video_extensions:
-            video_files.extend(glob.glob(extension))
-        
-        # Get file info
-        file_info = []
-        for file_path in sorted(video_files):
-            try:
-                size_mb = os.path.getsize(file_path) / (1024 * 1024)
-                # Try to get video info
-                temp_cap = cv2.VideoCapture(file_path)
-                if temp_cap.isOpened():
-                    width = int(temp_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                    height = int(temp_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                    fps = temp_cap.get(cv2.CAP_PROP_FPS)
-                    duration = temp_cap.get(cv2.CAP_PROP_FRAME_COUNT) / fps if fps > 0 else 0
-                    temp_cap.release()
-                    
-                    file_info.append({
-                        'name': file_path,
-                        'size_mb': round(size_mb, 1),
-                        'width': width,
-                        'height': height,
-                        'fps': round(fps, 2),
-                        'duration': round(duration, 1)
-                    })
-                else:
-                    file_info.append({
-                        'name': file_path,
-                        'size_mb': round(size_mb, 1),
-                        'error': 'Cannot read video file'
-                    })
-            except Exception as e:
-                file_info.append({
-                    'name': file_path,
-                    'error': str(e)
-                })
-        
-        return file_info
+    @property
+    def video_source(self):
+        """The open packet source, segment store or capture for the file"""
+        if self.packet_source is not None:
+            return self.packet_source
+        if self.segment_store is not None:
+            return self.segment_store
+        return self.video_capture
 
-    def change_video_file(self, new_video_file):
-        """Change the current video file"""
-        if self.streaming:
-            self.stop_video_source()
-        
-        self.video_file = new_video_file
-        logger.info(f"📄 Changed video file to: {new_video_file}")
-        
-        # If there are connected clients, restart streaming with new file
-        if self.clients:
-            return self.setup_video_source()
-        return True
+    def add_client(self, websocket):
+        """Start sending the file to a client"""
+        self.clients.add(websocket)
+        self.broadcaster.add_client(websocket)
+
+    def remove_client(self, websocket):
+        """Stop sending the file to a client; returns its broadcaster channel"""
+        self.clients.discard(websocket)
+        return self.broadcaster.remove_client(websocket)
+
+    def read_video_frame(self):
+        """Read the next frame, looping at end of file (runs on the capture thread)"""
+        capture = self.video_capture
+        if capture is None:
+            return None
+        pending = self.seek_target
+        generation = None
+        if pending is not None:
+            self.seek_target = None
+            target, generation = pending
+            self.seek_capture(capture, target)
+        ring = self.ring
+        ret, frame = ring.read(capture) if ring else capture.read()
+        if not ret:
+            if self.loop_frames is None:
+                self.loop_frames = self.frames_read
+            with self.spare_lock:
+                spare, self.spare = self.spare, None
+            if spare is not None:
+                # Gapless loop: the spare capture already holds the first frame; this one is rewound off this thread
+                logger.info("🔄 Reached end of video, continuing with the prepared first frame.")
+                self.video_capture, frame, position = spare
+                self.prepare_spare(release=capture)
+                self.frames_read = 1
+                return Captured(frame, media_time=position, generation=generation)
+            logger.info("🔄 Reached end of video, restarting from beginning.")
+            capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = ring.read(capture) if ring else capture.read()
+            if not ret:
+                logger.error("❌ Could not read any frame from video file")
+                return None
+            self.frames_read = 0
+        self.frames_read += 1
+        # Captured when decoded; the PTS places it on the media timeline
+        return Captured(frame, media_time=capture.get(cv2.CAP_PROP_POS_MSEC) / 1000.0, generation=generation)
+
+    def seek_capture(self, capture, target):
+        """Position a capture so its next read returns frame `target` (capture thread)
+
+        Lands on the keyframe at or before the target and decodes forward only the rest
+        of that GOP; grab() decodes without converting the skipped frames.
+        """
+        index = self.seek_index
+        start = index.keyframe_before(target) if index else target
+        capture.set(cv2.CAP_PROP_POS_FRAMES, start)
+        for _ in range(target - start):
+            if not capture.grab():
+                break
+        self.frames_read = target
+
+    def prepare_spare(self, release=None):
+        """Open a second capture at the first frame on a helper thread, for a gapless loop
+
+        release: capture the stream just moved off, released on the same thread
+        """
+        def prepare():
+            if release is not None:
+                release.release()
+            capture = cv2.VideoCapture(self.video_file)
+            ret, frame = capture.read() if capture.isOpened() else (False, None)
+            with self.spare_lock:
+                if ret and not self.closed and self.spare is None:
+                    self.spare = (capture, frame, capture.get(cv2.CAP_PROP_POS_MSEC) / 1000.0)
+                    return
+            capture.release()
+
+        threading.Thread(target=prepare, name="spare-capture", daemon=True).start()
+
+    def read_packet(self):
+        """Next passthrough packet, after any pending seek (runs on the capture thread)"""
+        source = self.packet_source
+        if source is None:
+            return None
+        pending = self.seek_target
+        if pending is None:
+            return source.read_packet()
+        self.seek_target = None
+        target, generation = pending
+        source.seek(target / self.fps)
+        packet = source.read_packet()
+        # Tagged with the seek's flush so the pipeline keeps the packet it lands on
+        return Captured(packet, generation=generation) if packet is not None else None
+
+    async def load_seek_index(self):
+        """Build or load the file's keyframe index off the event loop"""
+        self.seek_index = await asyncio.to_thread(self.bridge.seek_indexes.get, self.video_file)
+        if self.seek_index is not None and not self.frame_count:
+            self.frame_count = self.seek_index.frames
+
+    def seek(self, seconds=None, frame=None, exact=True):
+        """Move the stream to a media time or frame number; every viewer of the file follows
+
+        exact: show exactly that frame; False lands on the nearest keyframe, which needs no decoding forward
+        Returns the frame the stream continues from.
+        """
+        index = self.seek_index
+        if frame is None:
+            frame = int(round(float(seconds) * (self.fps or 30)))
+        frame = max(0, int(frame))
+        if self.frame_count:
+            frame = min(frame, self.frame_count - 1)
+        if index is not None:
+            if not exact:
+                frame = index.nearest_keyframe(frame)
+            elif self.packet_source is not None:
+                # Packets are decoded by the clients: they can only start at a keyframe
+                frame = index.keyframe_before(frame)
+        # Frames already read from the old position are not sent; the reader's first frame from the new one is
+        generation = self.frame_pipeline.flush() if self.frame_pipeline else None
+        self.seek_target = (frame, generation)
+        self.seeks += 1
+        logger.info(f"⏩ Seeking {self.video_file} to frame {frame}")
+        return frame
+
+    def publish_frame(self, frame, keyframe=True, timing=None):
+        """Hand a frame, or its {(layer, rung): frame} variants, to every viewer's queue; slow clients drop stale frames"""
+        if isinstance(frame, dict):
+            self.broadcaster.publish_variants(frame, keyframe, timing)
+        else:
+            self.broadcaster.publish(frame, keyframe, timing)
+
+        current_time = time.time()
+        if current_time - self.last_report >= 5.0:
+            logger.info(f"📊 Streaming {self.video_file}: {self.broadcaster.frames_published} frames published "
+                        f"to {self.broadcaster.client_count} clients "
+                        f"({self.pacer.summary()}, {self.bridge.latency.summary()})")
+            self.last_report = current_time
 
     async def stream_frames(self):
-        """Stream frames from video file to connected clients"""
-        if not self.video_capture:
+        """Stream frames from the video file to the channel's clients"""
+        source = self.video_source
+        if source is None:
             logger.error("❌ Video source not ready")
             return
-        
+
+        pacer = FramePacer(self.fps)
+        self.pacer = pacer
+        if source is self.packet_source:
+            try:
+                await self.stream_packets(source, pacer)
+            except Exception as e:
+                logger.error(f"❌ Critical error in packet streaming: {e}")
+            return
+
+        clips = None
+        cache_keys = None
+        frame_cache = self.bridge.frame_cache
+        if self.segment_store is not None:
+            clips = [self.segment_store]
+        elif frame_cache and not self.bridge.layers:
+            # One cache entry per encoded variant; the cache is only used when every one is there
+            variants = self.encoded_variants()
+            cache_keys = await self.cache_io(lambda: [
+                FrameCache.make_key(self.video_file, quality, resolution)
+                for quality, resolution in variants
+            ])
+            clips = await self.cache_io(lambda: [frame_cache.get(key) for key in cache_keys])
+            if None in clips:
+                for clip in clips:
+                    if clip is not None:
+                        clip.close()
+                clips = None
+
+        try:
+            logger.info(f"🎬 Starting video frame streaming: {self.video_file}")
+
+            if clips is None:
+                clips = await self.stream_encoded(source, pacer, cache_keys)
+            if clips is not None:
+                await self.stream_cached(source, pacer, clips)
+
+            logger.info(f"🛑 Frame streaming stopped: {self.video_file}")
+
+        except Exception as e:
+            logger.error(f"❌ Critical error in frame streaming: {e}")
+        finally:
+            # A segment store is the source itself and closes with it; cache clips are per stream
+            for clip in clips or ():
+                if clip is not source:
+                    clip.close()
+
+    async def cache_io(self, call):
+        """Run a frame cache call; in disk mode it reads or writes files, so it runs off the event loop"""
+        frame_cache = self.bridge.frame_cache
+        if frame_cache is not None and frame_cache.directory:
+            return await asyncio.to_thread(call)
+        return call()
+
+    def encoded_variants(self):
+        """(quality, resolution) of each variant a live-encoded frame is produced in"""
+        if self.variant_encoder:
+            return [(rung.quality, rung.resolution(self.width, self.height)) for rung in self.variant_encoder.ladder]
+        return [(self.bridge.jpeg_quality, (self.width, self.height))]
+
+    async def stream_encoded(self, source, pacer, cache_keys=None):
+        """Decode and encode frames live; returns the cached clips once the first loop is recorded"""
+        bridge = self.bridge
+        encoder = self.variant_encoder
+        # Decode and JPEG encode run off the event loop
+        pipeline = FramePipeline(
+            self.read_video_frame,
+            encoder or jpeg_encoder(bridge.jpeg_quality),
+            workers=bridge.encode_workers,
+            use_processes=bridge.encode_processes,
+            max_pending=bridge.read_ahead,
+            name="video_file"
+        )
+        # Frames are decoded ahead into reused buffers; the loop below only ever dequeues
+        self.ring = FrameRing(pipeline.max_pending + pipeline.workers + 1, (self.height, self.width, 3))
+        self.frame_pipeline = pipeline
+        recorders = None
+        if cache_keys and None not in cache_keys:
+            recorders = await self.cache_io(lambda: [bridge.frame_cache.recorder(key) for key in cache_keys])
+        if encoder:
+            # Record every rung during the first loop; afterwards only the variants clients need
+            encoder.active = {(None, rung) for rung in range(len(encoder.ladder))} if recorders else {(None, 0)}
+        seeks = self.seeks
+        pipeline.start()
+
         try:
-            logger.info("🎬 Starting video frame streaming...")
-            
-            frame_count = 0
-            last_report = time.time()
-            
             while self.streaming and self.clients:
                 try:
-                    ret, frame = self.video_capture.read()
-                    if not ret:
-                        logger.info("🔄 Reached end of video, restarting from beginning.")
-                        self.video_capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                        continue
-                    
-                    frame_count += 1
-                    
-                    # Encode frame as JPEG for web streaming
-                    encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 85]
-                    _, buffer = cv2.imencode('.jpg', frame, encode_param)
-                    frame_bytes = buffer.tobytes()
-                    
-                    # Send to all connected clients
-                    if self.clients:
-                        disconnected_clients = set()
-                        for client in self.clients.copy():
-                            try:
-                                await client.send(frame_bytes)
-                            except websockets.exceptions.ConnectionClosed:
-                                disconnected_clients.add(client)
-                            except Exception as e:
-                                logger.warning(f"⚠️ Error sending frame to client: {e}")
-                                disconnected_clients.add(client)
-                        
-                        self.clients -= disconnected_clients
-                    
-                    current_time = time.time()
-                    if current_time - last_report >= 5.0:
-                        logger.info(f"📊 Streaming: {frame_count} frames sent to {len(self.clients)} clients")
-                        last_report = current_time
-                    
-                    # Control frame rate
-                    await asyncio.sleep(1 / self.fps)
-                    
+                    # On each deadline take the next frame read ahead; waiting here is an underrun
+                    missed = await pacer.wait()
+                    if missed and recorders is None:
+                        # Stay on the media timeline: the frames for missed ticks are dropped.
+                        # While the first loop is being recorded every frame is kept instead.
+                        pipeline.skip(missed)
+                    frame = await pipeline.get()
+                    if frame is None:
+                        break
+
+                    self.publish_frame(frame, timing=pipeline.timing)
+
+                    if recorders is not None:
+                        variants = frame if encoder else {(None, 0): frame}
+                        if self.seeks != seeks or not await self.cache_io(lambda: all(
+                                recorder.add(variants[(None, i)]) for i, recorder in enumerate(recorders))):
+                            await self.cache_io(lambda: [recorder.abort() for recorder in recorders])
+                            recorders = None
+                        elif self.loop_frames is not None and len(recorders[0]) >= self.loop_frames:
+                            clips = await self.cache_io(lambda: [recorder.finish() for recorder in recorders])
+                            recorders = None
+                            if None not in clips and self.streaming:
+                                size = sum(clip.nbytes for clip in clips) / (1024 * 1024)
+                                logger.info(f"💾 Cached {len(clips[0])} encoded frames x {len(clips)} variants "
+                                            f"({size:.1f} MB), later loops skip decode and encode")
+                                return clips
+                            for clip in clips:
+                                if clip is not None:
+                                    clip.close()
+
+                    if encoder and recorders is None:
+                        # Only encode the layers and rungs clients currently need
+                        encoder.active = self.broadcaster.active_variants()
+
                 except Exception as e:
                     logger.error(f"❌ Error in frame streaming: {e}")
                     await asyncio.sleep(0.1)
-            
-            logger.info("🛑 Frame streaming stopped")
-            
-        except Exception as e:
-            logger.error(f"❌ Critical error in frame streaming: {e}")
+        finally:
+            pipeline.stop()
+            if self.frame_pipeline is pipeline:
+                self.frame_pipeline = None
+                self.ring = None
+            if recorders:
+                await self.cache_io(lambda: [recorder.abort() for recorder in recorders])
+        return None
+
+    async def stream_packets(self, source, pacer):
+        """Forward the file's compressed packets on their frame deadlines"""
+        # Clients (re)configure their decoder before this stream's first keyframe arrives
+        websockets.broadcast(self.clients, self.bridge.codec.encode({"type": "stream_config", **source.config()}))
+
+        # Demuxing still blocks on file I/O, so it stays on the capture thread
+        pipeline = FramePipeline(self.read_packet, encode_packet, workers=1,
+                                 max_pending=self.bridge.read_ahead, name="video_file")
+        self.frame_pipeline = pipeline
+        pipeline.start()
+        logger.info(f"🎬 Starting compressed packet passthrough: {self.video_file}")
+
+        try:
+            while self.streaming and self.clients:
+                # Every packet is needed to decode the ones after it, so missed ticks are not skipped
+                await pacer.wait()
+                packet = await pipeline.get()
+                if packet is None:
+                    break
+                data, keyframe = packet
+                self.publish_frame(data, keyframe, pipeline.timing)
+            logger.info("🛑 Packet passthrough stopped")
+        finally:
+            pipeline.stop()
+            if self.frame_pipeline is pipeline:
+                self.frame_pipeline = None
+
+    async def stream_cached(self, source, pacer, clips):
+        """Loop over pre-encoded frames from the cache or a segment store
+
+        clips: one clip per encoded variant (quality rung), all the same length
+        """
+        frames = len(clips[0])
+        logger.info(f"💾 Playing {frames} pre-encoded frames")
+        index = 0
+        # Closing the channel closes the source this stream was started for
+        while self.streaming and self.clients:
+            missed = await pacer.wait()
+            if not self.streaming:
+                break
+            pending = self.seek_target
+            if pending is not None:
+                # Every cached frame is a keyframe: seeks are instant
+                self.seek_target = None
+                index = pending[0] % frames
+            else:
+                index = (index + missed) % frames
+            # Pre-encoded: capture, decode and encode all collapse into "now"
+            timing = FrameTiming.now(index, media_time=index / self.fps)
+            if len(clips) > 1:
+                variants = self.broadcaster.active_variants()
+                read = lambda: {(None, rung): clips[rung].frame(index) for _, rung in variants}
+            else:
+                read = lambda: clips[0].frame(index)
+            # A segment store is memory-mapped and closes with the channel: it is read here, cache clips off the loop
+            frame = read() if source in clips else await self.cache_io(read)
+            if not self.streaming:
+                break
+            self.publish_frame(frame, timing=timing)
+            index = (index + 1) % frames
+
+    def available_layers(self):
+        """Simulcast layers of the stream (none for compressed passthrough)"""
+        return (self.bridge.layers or []) if self.packet_source is None else []
+
+    def describe(self):
+        """Stream details for the connected and file_changed messages"""
+        return {
+            "file": self.video_file,
+            "resolution": f"{self.width}x{self.height}",
+            "fps": self.fps,
+            "video": self.stream_config,
+            "layers": describe_layers(self.available_layers(), self.width, self.height),
+            "duration": round(self.frame_count / self.fps, 3) if self.frame_count and self.fps else None
+        }
+
+
+class VideoFileBridge:
+    def __init__(self, port=8768, video_file=None, encode_workers=2, encode_processes=False,
+                 frame_cache=None, passthrough=False, adaptive=False, layers=None, media_dir='.',
+                 index_dir='.seek_index', store_dir=None, read_ahead=8):
+        self.port = port
+        self.clients = set()
+        self.jpeg_quality = 85
+        self.layers = layers  # Simulcast layers offered by every channel
+        self.adaptive = adaptive  # Per-client quality ladder
+        self.latency = LatencyTracker()  # Decode-to-send latency per stage over all channels, served at /latency
+        REGISTRY.register(self.latency.histogram)
+        REGISTRY.gauge('bridge_clients', "Connected WebSocket clients", function=lambda: len(self.clients))
+        REGISTRY.gauge('bridge_file_channels', "Files being streamed", function=lambda: len(self.channels))
+        self.codec = get_codec()  # Control replies are always text; binary frames carry video
+        self.video_file = video_file  # File new clients start with
+        self.channels = {}  # Real path -> FileChannel
+        self.opening = {}  # Real path -> task opening its channel, awaited by every client joining meanwhile
+        self.client_channels = {}  # WebSocket -> FileChannel it is watching
+        self.passthrough = passthrough  # Forward compressed packets instead of JPEG frames
+        self.stream_id = 0
+        self.encode_workers = encode_workers
+        self.encode_processes = encode_processes
+        self.read_ahead = max(read_ahead, encode_workers + 1)  # Frames decoded and encoded ahead of the pacing loop
+        self.frame_cache = frame_cache  # Optional FrameCache of encoded loops, shared by all channels
+        self.catalog = VideoCatalog(media_dir)  # Probed in the background, listed from memory
+        self.seek_indexes = SeekIndexCache(index_dir)  # Keyframe positions per file, built once
+        self.store_dir = store_dir  # Segment stores built with build-store --store-dir
+
+    async def join_channel(self, websocket, video_file):
+        """Move a client to a file's channel, opening the channel if nobody watches the file yet
+
+        Returns the channel, or None if the file cannot be opened (the client keeps its current one).
+        """
+        key = os.path.realpath(video_file)
+        current = self.client_channels.get(websocket)
+        if current is not None and current is self.channels.get(key):
+            return current
+
+        # Opening a file blocks on disk: it runs off the event loop, once however many clients ask for it
+        channel = self.channels.get(key)
+        while channel is None:
+            opening = self.opening.get(key)
+            if opening is None:
+                opening = self.opening[key] = asyncio.create_task(self.open_channel(key, video_file))
+            if await asyncio.shield(opening) is None:
+                return None
+            # The channel may have been closed again before this client got to it
+            channel = self.channels.get(key)
+
+        previous, emptied = self.detach(websocket)
+        channel.add_client(websocket)
+        self.client_channels[websocket] = channel
+        if previous is not None:
+            # The client keeps its timing trailer and, where the new file offers it, its layer
+            channel.broadcaster.set_timing_trailer(websocket, previous.timing_trailer)
+            if previous.layer:
+                try:
+                    channel.broadcaster.subscribe(websocket, resolve_layer(
+                        channel.available_layers(), previous.layer, channel.width, channel.height))
+                except KeyError:
+                    pass
+        if not channel.streaming:
+            channel.start()
+        logger.info(f"📄 Client {websocket.remote_address} is watching {video_file} "
+                    f"({len(channel.clients)} viewers)")
+        if emptied is not None:
+            await emptied.close()
+        return channel
+
+    async def open_channel(self, key, video_file):
+        """Open a file's channel and register it; None if the file cannot be opened"""
+        try:
+            channel = FileChannel(self, video_file)
+            if not await channel.open():
+                return None
+        finally:
+            del self.opening[key]
+        self.channels[key] = channel
+        if channel.segment_store is None:
+            asyncio.create_task(channel.load_seek_index())
+        logger.info(f"📺 Opened channel for {video_file} ({len(self.channels)} open)")
+        return channel
+
+    def detach(self, websocket):
+        """Take a client out of its channel
+
+        Returns (its broadcaster channel, the FileChannel if it was the last viewer and must be closed);
+        either is None if it does not apply.
+        """
+        channel = self.client_channels.pop(websocket, None)
+        if channel is None:
+            return None, None
+        delivery = channel.remove_client(websocket)
+        if channel.clients:
+            return delivery, None
+        logger.info(f"⏹️ No clients watching {channel.video_file}, closing its channel")
+        channel.streaming = False
+        key = os.path.realpath(channel.video_file)
+        if self.channels.get(key) is channel:
+            del self.channels[key]
+        return delivery, channel
+
+    async def leave_channel(self, websocket):
+        """Take a client out of its channel, closing the channel if it was the last viewer
+
+        Returns the client's broadcaster channel, or None if it was not watching anything.
+        """
+        delivery, emptied = self.detach(websocket)
+        if emptied is not None:
+            await emptied.close()
+        return delivery
+
+    def close_channels(self):
+        """Stop every channel"""
+        for channel in list(self.channels.values()):
+            channel.stop_video_source()
+        self.channels.clear()
+        self.client_channels.clear()
+
+    def get_available_video_files(self, offset=0, limit=None):
+        """A page of the video files in the media directory, from the catalog"""
+        return self.catalog.page(offset, limit)
 
     async def handle_client(self, websocket, path=None):
         """Handle WebSocket client connections"""
         client_addr = websocket.remote_address
+        client_codec = codec_for_subprotocol(websocket.subprotocol, self.codec)
         logger.info(f"🔗 Client connected from {client_addr}")
         
         self.clients.add(websocket)
         
-        if len(self.clients) == 1 and not self.streaming:
-            logger.info("▶️ Starting video streaming for first client")
-            
-            if not self.setup_video_source():
+        # New clients start on the default file; without one they pick a file with 'change_file'
+        channel = None
+        if self.video_file:
+            channel = await self.join_channel(websocket, self.video_file)
+            if channel is None:
                 try:
-                    await websocket.send(json.dumps({
+                    await websocket.send(self.codec.encode({
                         "type": "error",
                         "message": "Failed to start video source"
                     }))
                 except:
                     pass
-                self.clients.remove(websocket)
+                self.clients.discard(websocket)
                 return
-            
-            self.streaming = True
-            asyncio.create_task(self.stream_frames())
-            
-            try:
-                await websocket.send(json.dumps({
+        
+        try:
+            if channel is None:
+                await websocket.send(self.codec.encode({
                     "type": "connected",
-                    "message": "Video file streaming started",
-                    "resolution": f"{self.width}x{self.height}",
-                    "fps": self.fps
+                    "message": "Connected, no video file selected",
+                    "codec": client_codec.wire
                 }))
-            except:
-                pass
-        else:
-            try:
-                await websocket.send(json.dumps({
-                    "type": "connected", 
-                    "message": "Connected to existing video stream",
-                    "resolution": f"{self.width}x{self.height}",
-                    "fps": self.fps
+            else:
+                await websocket.send(self.codec.encode({
+                    "type": "connected",
+                    "message": ("Video file streaming started" if len(channel.clients) == 1
+                                else "Connected to existing video stream"),
+                    "codec": client_codec.wire,
+                    **channel.describe()
                 }))
-            except:
-                pass
+        except:
+            pass
         
         try:
             async for message in websocket:
                 try:
-                    data = json.loads(message)
+                    data = client_codec.decode(message)
                     message_type = data.get('type')
                     
                     if message_type == 'ping':
-                        await websocket.send(json.dumps({"type": "pong"}))
+                        await websocket.send(self.codec.encode({"type": "pong"}))
                     
                     elif message_type == 'list_files':
-                        # Send list of available video files
-                        files = self.get_available_video_files()
-                        await websocket.send(json.dumps({
+                        # Send a page of the available video files (all of them without a limit)
+                        try:
+                            offset = int(data.get('offset', 0))
+                            limit = int(data['limit']) if data.get('limit') is not None else None
+                        except (TypeError, ValueError):
+                            await websocket.send(self.codec.encode({
+                                "type": "error",
+                                "message": "Invalid offset or limit"
+                            }))
+                            continue
+                        await websocket.send(self.codec.encode({
                             "type": "file_list",
-                            "files": files
+                            **self.get_available_video_files(offset, limit)
                         }))
                     
                     elif message_type == 'change_file':
-                        # Change current video file
+                        # Switch this client to another file; other viewers keep theirs
                         new_file = data.get('file')
                         if new_file:
-                            success = self.change_video_file(new_file)
-                            if success:
-                                # Restart streaming if we have the video source
-                                if self.video_capture and not self.streaming:
-                                    self.streaming = True
-                                    asyncio.create_task(self.stream_frames())
-                                
-                                # Send success response with video info
-                                await websocket.send(json.dumps({
+                            channel = await self.join_channel(websocket, self.catalog.resolve(new_file))
+                            if channel is not None:
+                                await websocket.send(self.codec.encode({
                                     "type": "file_changed",
                                     "success": True,
-                                    "file": new_file,
-                                    "resolution": f"{self.width}x{self.height}" if hasattr(self, 'width') else "Unknown",
-                                    "fps": getattr(self, 'fps', 0)
+                                    **channel.describe()
                                 }))
                             else:
-                                await websocket.send(json.dumps({
+                                await websocket.send(self.codec.encode({
                                     "type": "file_changed", 
                                     "success": False,
                                     "error": f"Failed to load video file: {new_file}"
                                 }))
                         else:
-                            await websocket.send(json.dumps({
+                            await websocket.send(self.codec.encode({
                                 "type": "error",
                                 "message": "No file specified"
                             }))
                     
+                    elif message_type == 'seek':
+                        await self.seek(websocket, data)
+                    
+                    elif message_type == 'subscribe':
+                        await self.subscribe(websocket, data.get('layer'))
+                    
+                    elif message_type == 'frame_timing':
+                        # Per-frame latency trailer appended to binary frames
+                        channel = self.client_channels.get(websocket)
+                        if channel is not None:
+                            channel.broadcaster.set_timing_trailer(websocket, bool(data.get('enabled', True)))
+                    
+                    elif message_type == 'profiler':
+                        await websocket.send(self.codec.encode(profiler_command(data)))
+                    
                     elif message_type == 'get_current_file':
                         # Send current file info
-                        await websocket.send(json.dumps({
+                        channel = self.client_channels.get(websocket)
+                        await websocket.send(self.codec.encode({
                             "type": "current_file",
-                            "file": self.video_file,
-                            "resolution": f"{self.width}x{self.height}" if hasattr(self, 'width') else "Unknown",
-                            "fps": getattr(self, 'fps', 0),
-                            "streaming": self.streaming
+                            "file": channel.video_file if channel else None,
+                            "resolution": f"{channel.width}x{channel.height}" if channel else "Unknown",
+                            "fps": channel.fps if channel else 0,
+                            "streaming": channel.streaming if channel else False,
+                            "viewers": len(channel.clients) if channel else 0,
+                            "channels": len(self.channels),
+                            "pacing": channel.pacer.stats() if channel else None,
+                            "read_ahead": channel.frame_pipeline.stats() if channel and channel.frame_pipeline else None,
+                            "latency": self.latency.snapshot(),
+                            "cache": self.frame_cache.stats() if self.frame_cache else None
                         }))
                         
-                except json.JSONDecodeError:
+                except client_codec.DecodeError:
                     pass
                 except Exception as e:
                     logger.warning(f"⚠️ Error processing message: {e}")
@@ -290,14 +813,71 @@ class VideoFileBridge:
             logger.warning(f"⚠️ Client connection error: {e}")
         finally:
             self.clients.discard(websocket)
+            await self.leave_channel(websocket)
             logger.info(f"🔌 Client {client_addr} disconnected")
-            
-            if not self.clients and self.streaming:
-                logger.info("⏹️ No clients connected, stopping video streaming")
-                self.stop_video_source()
 
-    async def start_server(self):
-        """Start the WebSocket server"""
+    async def seek(self, websocket, data):
+        """Move the client's file to {"time": seconds} or {"frame": n}; all viewers of the file follow"""
+        channel = self.client_channels.get(websocket)
+        if channel is None:
+            await websocket.send(self.codec.encode({
+                "type": "error",
+                "message": "No video file selected"
+            }))
+            return
+        try:
+            if data.get('frame') is not None:
+                frame = channel.seek(frame=int(data['frame']), exact=data.get('exact', True))
+            else:
+                frame = channel.seek(seconds=float(data['time']), exact=data.get('exact', True))
+        except (KeyError, TypeError, ValueError):
+            await websocket.send(self.codec.encode({
+                "type": "error",
+                "message": "Seek needs a time in seconds or a frame number"
+            }))
+            return
+        # Every viewer's stream jumps, so every viewer hears about it
+        websockets.broadcast(channel.clients, self.codec.encode({
+            "type": "seeked",
+            "file": channel.video_file,
+            "frame": frame,
+            "time": round(frame / channel.fps, 3) if channel.fps else 0
+        }))
+
+    async def subscribe(self, websocket, name):
+        """Switch a client to a simulcast layer of its file"""
+        channel = self.client_channels.get(websocket)
+        if channel is None:
+            await websocket.send(self.codec.encode({
+                "type": "error",
+                "message": "No video file selected"
+            }))
+            return
+        width, height = channel.width, channel.height
+        try:
+            layer = resolve_layer(channel.available_layers(), name, width, height)
+        except KeyError:
+            await websocket.send(self.codec.encode({
+                "type": "error",
+                "message": f"Unknown layer: {name}"
+            }))
+            return
+        channel.broadcaster.subscribe(websocket, layer)
+        size = next((entry["resolution"] for entry in describe_layers(channel.available_layers(), width, height)
+                     if entry["name"] == layer), f"{width}x{height}")
+        logger.info(f"🎚️ Client {websocket.remote_address} subscribed to {name or 'source'} ({size})")
+        await websocket.send(self.codec.encode({
+            "type": "subscribed",
+            "layer": name or "source",
+            "resolution": size
+        }))
+
+    async def start_server(self, profile=False, slow_callback=0.05):
+        """Start the WebSocket server
+
+        profile: start with the event loop profiler on
+        slow_callback: seconds the loop may be blocked before the profiler samples it
+        """
         logger.info(f"🚀 Starting Video File WebSocket Bridge on port {self.port}")
         logger.info(f"📡 Clients can connect to: ws://0.0.0.0:{self.port}")
         
@@ -310,14 +890,20 @@ class VideoFileBridge:
         else:
             logger.info("📄 No video file specified - waiting for dynamic selection")
         
+        start_loop_lag_monitor()
+        install_profiler(profile, slow_callback)
+        self.catalog.start()
         async with websockets.serve(
             self.handle_client,
             "0.0.0.0",
             self.port,
             max_size=10**7,
             ping_timeout=20,
-            ping_interval=10
+            ping_interval=10,
+            subprotocols=supported_subprotocols(),
+            process_request=http_routes({"/latency": self.latency.snapshot, "/metrics": REGISTRY.render})
         ):
+            logger.info(f"📈 Metrics: http://0.0.0.0:{self.port}/metrics, frame latency: /latency")
             logger.info("✅ Video File Bridge running... (Press Ctrl+C to stop)")
             try:
                 await asyncio.Future()
@@ -330,18 +916,86 @@ def main():
     parser = argparse.ArgumentParser(description="Video File WebSocket Bridge")
     parser.add_argument("--port", type=int, default=8768, help="WebSocket server port")
     parser.add_argument("--video-file", type=str, help="Path to the video file to stream (optional)")
+    parser.add_argument("--media-dir", type=str, default=".",
+                        help="Directory whose video files clients can list and switch to")
+    parser.add_argument("--encode-workers", type=int, default=2, help="Frame encode pool size")
+    parser.add_argument("--encode-processes", action="store_true",
+                        help="Encode in worker processes instead of threads")
+    parser.add_argument("--cache", choices=["memory", "disk", "off"], default="memory",
+                        help="Cache encoded frames so looping playback skips decode and encode")
+    parser.add_argument("--cache-mb", type=int, default=256, help="Frame cache budget in MB")
+    parser.add_argument("--cache-dir", type=str, default=".frame_cache",
+                        help="Frame cache directory for --cache disk")
+    parser.add_argument("--read-ahead", type=int, default=8,
+                        help="Frames decoded and encoded ahead of playback, to absorb decode and disk hiccups")
+    parser.add_argument("--index-dir", type=str, default=".seek_index",
+                        help="Directory for the keyframe indexes used to seek (needs 'av'), created on first use; "
+                             "'' keeps them in memory only")
+    parser.add_argument("--store-dir", type=str,
+                        help="Directory of segment stores, written there by build-store and looked up there "
+                             "before next to each video file (give it before build-store)")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Adapt JPEG quality and resolution per client to its connection")
+    parser.add_argument("--simulcast", action="store_true",
+                        help="Offer several resolutions; clients pick one with a 'subscribe' message")
+    parser.add_argument("--layers", default="1080p,720p,360p,thumb",
+                        help="Simulcast layers (comma separated: 1080p, 720p, 360p, thumb)")
+    parser.add_argument("--passthrough", action="store_true",
+                        help="Forward the file's compressed packets for WebCodecs instead of JPEG (needs 'av')")
+    
+    subparsers = parser.add_subparsers(dest="command")
+    build_parser = subparsers.add_parser("build-store", help="Pre-encode a video file into a segment store")
+    build_parser.add_argument("video", help="Video file to encode")
+    build_parser.add_argument("--quality", type=int, default=85, help="JPEG quality")
+    add_profiler_arguments(parser)
     args = parser.parse_args()
+    
+    if args.command == "build-store":
+        try:
+            path = build_segment_store(args.video, store_dir=args.store_dir, quality=args.quality)
+        except (OSError, ValueError) as e:
+            print(f"❌ Could not build segment store: {e}")
+            raise SystemExit(1)
+        print(f"📦 Segment store written to {path}")
+        return
+
+    layers = None
+    if args.simulcast:
+        try:
+            layers = parse_layers(args.layers)
+        except ValueError as e:
+            parser.error(str(e))
 
     print("📹 Video File WebSocket Bridge")
     print("=" * 40)
     
-    bridge = VideoFileBridge(port=args.port, video_file=args.video_file)
+    frame_cache = None
+    if args.cache != "off":
+        frame_cache = FrameCache(
+            max_bytes=args.cache_mb * 1024 * 1024,
+            directory=args.cache_dir if args.cache == "disk" else None
+        )
+    
+    bridge = VideoFileBridge(
+        port=args.port,
+        video_file=args.video_file,
+        encode_workers=args.encode_workers,
+        encode_processes=args.encode_processes,
+        frame_cache=frame_cache,
+        media_dir=args.media_dir,
+        index_dir=args.index_dir,
+        store_dir=args.store_dir,
+        read_ahead=args.read_ahead,
+        passthrough=args.passthrough,
+        adaptive=args.adaptive,
+        layers=layers
+    )
     
     try:
-        asyncio.run(bridge.start_server())
+        asyncio.run(bridge.start_server(args.profile, args.slow_callback_ms / 1000))
     except KeyboardInterrupt:
         print("\n🛑 Shutting down Video File Bridge...")
-        bridge.stop_video_source()
+        bridge.close_channels()
 
 if __name__ == "__main__":
     main()
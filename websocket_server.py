@@ -6,37 +6,84 @@ Standalone WebSocket server for WebRTC signaling without Flask.
 Run this separately from the HTTP server.
 """
 
-import json
 import uuid
+import time
 import asyncio
+import argparse
 import websockets
 from websockets.exceptions import ConnectionClosed
 import logging
+from broadcast_engine import BroadcastEngine
+from ice_batcher import IceCandidateBatcher
+from signaling_backend import InMemoryBackend, create_backend
+from signaling_codec import get_codec, add_field, codec_for_subprotocol, supported_subprotocols
+from signaling_schema import RELAY_FIELDS, missing_fields
+from metrics import REGISTRY, http_routes, start_loop_lag_monitor
+from loop_profiler import add_profiler_arguments, install_profiler, profiler_command
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+CONNECTIONS_OPENED = REGISTRY.counter('signaling_connections_opened', "WebSocket connections accepted")
+MESSAGES = REGISTRY.counter('signaling_messages', "Signaling messages received, by type", ('type',))
+RELAY_SECONDS = REGISTRY.histogram('signaling_relay_seconds',
+                                   "Time from receiving an offer, answer or ICE candidate to its delivery")
+
 class WebRTCSignalingServer:
-    def __init__(self):
+    def __init__(self, send_timeout=5.0, backend=None, codec="auto"):
         self.rooms = {}
         self.connections = {}
+        self.users = {}  # user_id -> websocket, for O(1) targeted delivery
+        self.broadcaster = BroadcastEngine(send_timeout=send_timeout)
+        self.ice_batcher = None
+        self.backend = backend or InMemoryBackend()  # Room membership and cross-node relay
+        self.codec = get_codec(codec)  # Text codec; binary codecs are negotiated per connection
+        self.handlers = {
+            'join_room': self.handle_join_room,
+            'leave_room': self.handle_leave_room,
+            'offer': self.handle_offer,
+            'answer': self.handle_answer,
+            'ice_candidate': self.handle_ice_candidate,
+            'profiler': self.handle_profiler
+        }
+        REGISTRY.gauge('signaling_connections', "Open WebSocket connections", function=lambda: len(self.connections))
+        REGISTRY.gauge('signaling_rooms', "Rooms with members on this node", function=lambda: len(self.rooms))
+    
+    async def start_backend(self):
+        """Connect the backend and route messages relayed from other nodes"""
+        await self.backend.start(self.deliver_remote_room, self.deliver_remote_user)
+    
+    def enable_ice_batching(self, window):
+        """Coalesce ICE candidates per sender into ice_candidates frames (window in seconds)"""
+        if window and window > 0:
+            self.ice_batcher = IceCandidateBatcher(window, self.flush_ice_batch)
+            logger.info(f"ICE candidate batching enabled ({window * 1000:.0f}ms window)")
+        else:
+            self.ice_batcher = None
     
     async def register_user(self, websocket):
         """Register a new WebSocket connection"""
         user_id = str(uuid.uuid4())[:8]
+        codec = codec_for_subprotocol(websocket.subprotocol, self.codec)
         self.connections[websocket] = {
             'user_id': user_id,
             'room': None,
-            'websocket': websocket
+            'websocket': websocket,
+            'codec': codec,
+            'dropped': False
         }
-        logger.info(f"User connected: {user_id}")
+        self.users[user_id] = websocket
+        CONNECTIONS_OPENED.inc()
+        logger.info(f"User connected: {user_id} (codec: {codec.name})")
         
         # Send welcome message
-        await websocket.send(json.dumps({
+        await self.send_message(websocket, {
             'type': 'connected',
-            'user_id': user_id
-        }))
+            'user_id': user_id,
+            'codec': codec.wire,
+            'codecs': supported_subprotocols()
+        })
         
         try:
             async for message in websocket:
@@ -55,15 +102,24 @@ class WebRTCSignalingServer:
             user_id = user['user_id']
             room = user['room']
             
+            if self.ice_batcher:
+                self.ice_batcher.discard_sender(websocket)
+            
             # Leave room if in one
             if room and room in self.rooms:
                 self.rooms[room].discard(websocket)
+                try:
+                    remaining = await self.track_leave(room, user_id)
+                except (ConnectionError, asyncio.TimeoutError) as e:
+                    # The connection is going away regardless; report the members this node knows of
+                    logger.error(f"Could not record {user_id} leaving {room}: {e!r}")
+                    remaining = len(self.rooms[room])
                 
                 # Notify others in room
                 await self.broadcast_to_room(room, {
                     'type': 'user_left',
                     'user_id': user_id,
-                    'users': len(self.rooms[room])
+                    'users': remaining
                 }, exclude=websocket)
                 
                 # Clean up empty rooms
@@ -72,31 +128,40 @@ class WebRTCSignalingServer:
                     logger.info(f"Room {room} cleaned up (empty)")
             
             del self.connections[websocket]
+            self.users.pop(user_id, None)
             logger.info(f"User disconnected: {user_id}")
     
     async def handle_message(self, websocket, message):
         """Handle incoming WebSocket messages"""
+        user = self.connections.get(websocket)
+        if user is None or user['dropped']:
+            return  # A send to it failed; unregister_user is taking it out of its room
+        codec = user['codec']
+        received = time.monotonic()
         try:
-            data = json.loads(message)
+            data = codec.decode(message)
             message_type = data.get('type')
             
             logger.debug(f"Received message: {message_type}")
             
-            if message_type == 'join_room':
-                await self.handle_join_room(websocket, data)
-            elif message_type == 'leave_room':
-                await self.handle_leave_room(websocket, data)
-            elif message_type == 'offer':
-                await self.handle_offer(websocket, data)
-            elif message_type == 'answer':
-                await self.handle_answer(websocket, data)
-            elif message_type == 'ice_candidate':
-                await self.handle_ice_candidate(websocket, data)
-            else:
+            handler = self.handlers.get(message_type)
+            # Only known types become label values, so clients cannot create unbounded series
+            MESSAGES.labels(message_type if handler else 'unknown').inc()
+            missing = missing_fields(data)
+            if handler is None:
                 logger.warning(f"Unknown message type: {message_type}")
+            elif missing:
+                logger.warning(f"Ignoring {message_type} without {', '.join(missing)}")
+            elif message_type in RELAY_FIELDS:
+                # Only text frames can be forwarded untouched on the fast path
+                await handler(websocket, data, raw=message if isinstance(message, str) else None)
+                RELAY_SECONDS.observe(time.monotonic() - received)
+            else:
+                await handler(websocket, data)
         
-        except json.JSONDecodeError:
-            logger.error("Invalid JSON received")
+        except codec.DecodeError:
+            MESSAGES.labels('invalid').inc()
+            logger.error(f"Invalid {codec.name} message received")
         except Exception as e:
             logger.error(f"Error handling message: {e}")
     
@@ -108,6 +173,7 @@ class WebRTCSignalingServer:
         # Leave current room if any
         if user['room'] and user['room'] in self.rooms:
             self.rooms[user['room']].discard(websocket)
+            await self.track_leave(user['room'], user['user_id'])
         
         # Join new room
         user['room'] = room_name
@@ -115,22 +181,23 @@ class WebRTCSignalingServer:
             self.rooms[room_name] = set()
         
         self.rooms[room_name].add(websocket)
+        users = await self.track_join(room_name, user['user_id'])
         
         # Notify user
-        await websocket.send(json.dumps({
+        await self.send_message(websocket, {
             'type': 'room_joined',
             'room': room_name,
-            'users': len(self.rooms[room_name])
-        }))
+            'users': users
+        })
         
         # Notify others in room
         await self.broadcast_to_room(room_name, {
             'type': 'user_joined',
             'user_id': user['user_id'],
-            'users': len(self.rooms[room_name])
+            'users': users
         }, exclude=websocket)
         
-        logger.info(f"User {user['user_id']} joined room {room_name} ({len(self.rooms[room_name])} users)")
+        logger.info(f"User {user['user_id']} joined room {room_name} ({users} users)")
     
     async def handle_leave_room(self, websocket, data):
         """Handle room leave request"""
@@ -140,12 +207,13 @@ class WebRTCSignalingServer:
         if room_name and room_name in self.rooms:
             self.rooms[room_name].discard(websocket)
             user['room'] = None
+            remaining = await self.track_leave(room_name, user['user_id'])
             
             # Notify others
             await self.broadcast_to_room(room_name, {
                 'type': 'user_left',
                 'user_id': user['user_id'],
-                'users': len(self.rooms[room_name])
+                'users': remaining
             })
             
             # Clean up empty rooms
@@ -154,73 +222,226 @@ class WebRTCSignalingServer:
                 logger.info(f"Room {room_name} cleaned up (empty)")
             
             # Notify user
-            await websocket.send(json.dumps({
+            await self.send_message(websocket, {
                 'type': 'room_left'
-            }))
+            })
             
             logger.info(f"User {user['user_id']} left room {room_name}")
     
-    async def handle_offer(self, websocket, data):
-        """Forward WebRTC offer to other users in room"""
+    async def handle_profiler(self, websocket, data):
+        """Admin control of the event loop profiler (needs WEBRTC_ADMIN_TOKEN)"""
+        await self.send_message(websocket, profiler_command(data))
+    
+    async def track_join(self, room_name, user_id):
+        """Record room membership; returns the room size across all nodes"""
+        return await self.backend.join(room_name, user_id)
+    
+    async def track_leave(self, room_name, user_id):
+        """Remove room membership; returns how many members remain across all nodes"""
+        return await self.backend.leave(room_name, user_id)
+    
+    async def handle_offer(self, websocket, data, raw=None):
+        """Forward WebRTC offer to one peer (to_user) or the rest of the room"""
         user = self.connections[websocket]
         room_name = user['room']
         
         if room_name:
-            await self.broadcast_to_room(room_name, {
-                'type': 'offer',
-                'offer': data['offer'],
-                'from_user': user['user_id']
-            }, exclude=websocket)
+            if self.ice_batcher:
+                # Never let batched candidates overtake a new session description
+                await self.ice_batcher.flush_sender(websocket)
+            
+            await self.relay_to_peers(websocket, self.build_relay(user, data, raw), to_user=data.get('to_user'))
             
             logger.info(f"Forwarded offer from {user['user_id']} in room {room_name}")
     
-    async def handle_answer(self, websocket, data):
-        """Forward WebRTC answer to other users in room"""
+    async def handle_answer(self, websocket, data, raw=None):
+        """Forward WebRTC answer to one peer (to_user) or the rest of the room"""
         user = self.connections[websocket]
         room_name = user['room']
         
         if room_name:
-            await self.broadcast_to_room(room_name, {
-                'type': 'answer',
-                'answer': data['answer'],
-                'from_user': user['user_id']
-            }, exclude=websocket)
+            if self.ice_batcher:
+                # Never let batched candidates overtake a new session description
+                await self.ice_batcher.flush_sender(websocket)
+            
+            await self.relay_to_peers(websocket, self.build_relay(user, data, raw), to_user=data.get('to_user'))
             
             logger.info(f"Forwarded answer from {user['user_id']} in room {room_name}")
     
-    async def handle_ice_candidate(self, websocket, data):
-        """Forward ICE candidate to other users in room"""
+    async def handle_ice_candidate(self, websocket, data, raw=None):
+        """Forward ICE candidate to one peer (to_user) or the rest of the room"""
         user = self.connections[websocket]
         room_name = user['room']
         
         if room_name:
-            await self.broadcast_to_room(room_name, {
-                'type': 'ice_candidate',
-                'candidate': data['candidate'],
-                'from_user': user['user_id']
-            }, exclude=websocket)
+            if self.ice_batcher:
+                await self.ice_batcher.add(websocket, data.get('to_user'), data['candidate'])
+                return
+            
+            await self.relay_to_peers(websocket, self.build_relay(user, data, raw), to_user=data.get('to_user'))
             
             logger.debug(f"Forwarded ICE candidate from {user['user_id']} in room {room_name}")
     
+    def build_relay(self, user, data, raw=None):
+        """Build the forwarded frame for an offer, answer or ICE candidate
+        
+        Peers get type, the payload field, to_user (when given) and the
+        server-assigned from_user, whichever path builds the frame.
+        Fast path: when the original text frame holds nothing else, the sender
+        id is appended to it directly, so the SDP/candidate body is never
+        re-encoded. Any other frame is rebuilt from those fields.
+        """
+        field = RELAY_FIELDS[data['type']]
+        if isinstance(raw, str) and data.keys() <= {'type', field, 'to_user'}:
+            return add_field(raw, 'from_user', user['user_id'])
+        
+        relay = {
+            'type': data['type'],
+            field: data[field],
+            'from_user': user['user_id']
+        }
+        if 'to_user' in data:
+            relay['to_user'] = data['to_user']
+        return relay
+    
+    async def flush_ice_batch(self, websocket, to_user, candidates, end_of_candidates):
+        """Forward a coalesced batch of ICE candidates from one sender"""
+        user = self.connections.get(websocket)
+        if not user or not user['room']:
+            return
+        
+        message = {
+            'type': 'ice_candidates',
+            'candidates': candidates,
+            'from_user': user['user_id']
+        }
+        if end_of_candidates:
+            message['end_of_candidates'] = True
+        
+        await self.relay_to_peers(websocket, message, to_user=to_user)
+        logger.debug(f"Forwarded {len(candidates)} batched ICE candidates from {user['user_id']} in room {user['room']}")
+    
+    async def relay_to_peers(self, websocket, message, to_user=None):
+        """Relay a signaling message (dict or encoded frame) to one peer if targeted, else to the whole room"""
+        user = self.connections[websocket]
+        room_name = user['room']
+        
+        if not to_user:
+            await self.broadcast_to_room(room_name, message, exclude=websocket)
+            return True
+        
+        target = self.users.get(to_user)
+        target_user = self.connections.get(target) if target else None
+        if target_user and target_user['room'] == room_name and target is not websocket:
+            return await self.send_to_user(to_user, message)
+        
+        if target is None:
+            # The peer may be connected to another node
+            payload = message if isinstance(message, str) else self.codec.encode(message)
+            if await self.backend.publish_user(room_name, to_user, payload):
+                return True
+        
+        logger.warning(f"Cannot relay message from {user['user_id']}: user {to_user} not in room {room_name}")
+        try:
+            await self.send_message(websocket, {
+                'type': 'error',
+                'message': f"User {to_user} not found in room",
+                'to_user': to_user
+            })
+        except ConnectionClosed:
+            pass
+        return False
+    
+    async def send_message(self, websocket, message):
+        """Encode a message with the connection's negotiated codec and send it"""
+        codec = self.connections[websocket]['codec']
+        await websocket.send(codec.encode(message))
+    
+    def encode_for(self, codec, message, payload):
+        """Wire frame for one codec; payload is the canonical text encoding"""
+        if not codec.binary:
+            return payload
+        if isinstance(message, str):
+            message = self.codec.decode(message)
+        return codec.encode(message)
+    
+    async def send_to_user(self, user_id, message):
+        """Send message to a single user by id"""
+        ws = self.users.get(user_id)
+        if ws is None or ws not in self.connections or self.connections[ws]['dropped']:
+            return False
+        
+        payload = message if isinstance(message, str) else self.codec.encode(message)
+        frame = self.encode_for(self.connections[ws]['codec'], message, payload)
+        report = await self.broadcaster.send([ws], frame)
+        if report.failed:
+            self.drop_connection(ws)
+            return False
+        if report.timed_out:
+            logger.warning(f"Send to user {user_id} timed out")
+            return False
+        return True
+    
+    def drop_connection(self, ws):
+        """Close a websocket whose connection has failed
+
+        Its handler then runs unregister_user, so the backend forgets the user and the
+        room hears user_left exactly as for any other disconnect.
+        """
+        user = self.connections.get(ws)
+        if user and not user['dropped']:
+            user['dropped'] = True
+            asyncio.create_task(ws.close())
+    
     async def broadcast_to_room(self, room_name, message, exclude=None):
-        """Send message to all users in a room"""
+        """Send message to all users in a room concurrently"""
+        # Serialize once, then fan out to every recipient at the same time
+        payload = message if isinstance(message, str) else self.codec.encode(message)
+        
+        exclude_user = self.connections[exclude]['user_id'] if exclude in self.connections else None
+        self.backend.publish_room(room_name, payload, exclude_user)
+        
+        return await self.deliver_local_room(room_name, payload, exclude, message)
+    
+    async def deliver_local_room(self, room_name, payload, exclude=None, message=None):
+        """Send a serialized message to the room members connected to this process"""
         if room_name in self.rooms:
-            disconnected = []
-            for ws in self.rooms[room_name]:
-                if ws != exclude:
-                    try:
-                        await ws.send(json.dumps(message))
-                    except ConnectionClosed:
-                        disconnected.append(ws)
-                    except Exception as e:
-                        logger.error(f"Error sending message to user: {e}")
-                        disconnected.append(ws)
+            recipients = [ws for ws in self.rooms[room_name]
+                          if ws != exclude and ws in self.connections and not self.connections[ws]['dropped']]
+            if not recipients:
+                return None
+            
+            # One encoding per wire codec in use, not per recipient
+            groups = {}
+            for ws in recipients:
+                codec = self.connections[ws]['codec']
+                groups.setdefault(codec.wire, (codec, []))[1].append(ws)
+            batches = [
+                (members, self.encode_for(codec, payload if message is None else message, payload))
+                for codec, members in groups.values()
+            ]
+            
+            report = await self.broadcaster.send_batches(batches)
+            logger.debug(f"Broadcast to room {room_name}: {report.summary()}")
             
-            # Clean up disconnected websockets
-            for ws in disconnected:
-                self.rooms[room_name].discard(ws)
-                if ws in self.connections:
-                    del self.connections[ws]
+            for ws in report.timed_out:
+                user = self.connections.get(ws)
+                logger.warning(f"Send to user {user['user_id'] if user else '?'} timed out in room {room_name}")
+            
+            # Disconnected websockets leave the room through unregister_user
+            for ws in report.failed:
+                self.drop_connection(ws)
+            
+            return report
+    
+    async def deliver_remote_room(self, room_name, payload, exclude_user=None):
+        """Deliver a room broadcast relayed from another node"""
+        exclude = self.users.get(exclude_user) if exclude_user else None
+        await self.deliver_local_room(room_name, payload, exclude)
+    
+    async def deliver_remote_user(self, user_id, payload):
+        """Deliver a targeted message relayed from another node"""
+        await self.send_to_user(user_id, payload)
 
 # Global signaling server instance
 signaling_server = WebRTCSignalingServer()
@@ -229,30 +450,72 @@ async def websocket_handler(websocket):
     """WebSocket connection handler"""
     await signaling_server.register_user(websocket)
 
-async def main():
+async def main(host="0.0.0.0", port=8765, profile=False, slow_callback=0.05):
     """Main WebSocket server"""
     
     print("🔗 Starting Pure WebSocket Signaling Server...")
-    print("📡 WebSocket URL: ws://localhost:8765")
+    print(f"📡 WebSocket URL: ws://localhost:{port}")
     print("🎥 Features: Room-based WebRTC signaling")
-    print("🧪 Test with: websocat ws://localhost:8765")
+    print(f"🧪 Test with: websocat ws://localhost:{port}")
     print("🔧 Press Ctrl+C to stop")
     print("")
     
     try:
+        await signaling_server.start_backend()
+        start_loop_lag_monitor()
+        install_profiler(profile, slow_callback)
         async with websockets.serve(
             websocket_handler, 
-            "0.0.0.0", 
-            8765,
+            host, 
+            port,
             ping_interval=20,  # Keep connections alive
-            ping_timeout=10
+            ping_timeout=10,
+            subprotocols=supported_subprotocols(),
+            process_request=http_routes({"/metrics": REGISTRY.render})
         ):
-            logger.info("✅ WebSocket server started on ws://0.0.0.0:8765")
-            await asyncio.Future()  # Run forever
+            logger.info(f"✅ WebSocket server started on ws://{host}:{port}")
+            logger.info(f"📈 Metrics: http://{host}:{port}/metrics")
+            # Runs until stopped, or until a pubsub backend loses its broker: like a shard, exit then
+            await signaling_server.backend.wait_closed()
+            logger.error("❌ Signaling backend connection lost, shutting down")
+            raise SystemExit(1)
     except KeyboardInterrupt:
         logger.info("🛑 Server stopped by user")
     except Exception as e:
         logger.error(f"❌ Server error: {e}")
 
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="WebRTC WebSocket Signaling Server")
+    parser.add_argument("--host", type=str, default="0.0.0.0", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="WebSocket server port")
+    parser.add_argument("--ice-batch-ms", type=float, default=0,
+                        help="Coalesce ICE candidates per sender for this many ms (0 = off, try 10-50)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Run N worker processes sharing the port via SO_REUSEPORT (Linux)")
+    parser.add_argument("--backend", choices=["memory", "pubsub"], default="memory",
+                        help="Room backend: in-process (memory) or shared through a signaling broker (pubsub)")
+    parser.add_argument("--broker", type=str, default="tcp://127.0.0.1:8790",
+                        help="Broker URL for the pubsub backend (tcp://host:port or unix:/path)")
+    parser.add_argument("--codec", choices=["auto", "json", "orjson"], default="auto",
+                        help="JSON codec for signaling frames (auto uses orjson when installed)")
+    parser.add_argument("--node-id", type=str, help="Node name reported to the broker (default: hostname-pid)")
+    parser.add_argument("--metrics-port", type=int,
+                        help="With --workers: worker N serves /metrics on this port + N (the shared port cannot tell shards apart)")
+    add_profiler_arguments(parser)
+    return parser.parse_args()
+
 if __name__ == '__main__':
-    asyncio.run(main())
+    args = parse_args()
+    if args.workers > 1:
+        from signaling_cluster import run_sharded
+        try:
+            asyncio.run(run_sharded(args.workers, args.host, args.port, args.ice_batch_ms / 1000.0, args.codec,
+                                    args.metrics_port, args.profile, args.slow_callback_ms / 1000.0))
+        except KeyboardInterrupt:
+            logger.info("🛑 Sharded server stopped by user")
+    else:
+        signaling_server.backend = create_backend(args.backend, args.broker, args.node_id)
+        signaling_server.codec = get_codec(args.codec)
+        signaling_server.enable_ice_batching(args.ice_batch_ms / 1000.0)
+        asyncio.run(main(args.host, args.port, args.profile, args.slow_callback_ms / 1000.0))